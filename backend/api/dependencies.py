@@ -0,0 +1,42 @@
+from functools import lru_cache
+from utils.text_processor import TextProcessor
+from utils.image_processor import ImageProcessor
+from utils.explainability import TextExplainer, ImageExplainer, TokenAttributionExplainer, ComprehensiveExplainer
+from utils.stub_models import stub_models_enabled, stub_text_processor_from_env, stub_image_processor_from_env
+
+# Processors load their models once per process and are shared across requests.
+# With STUB_MODELS=1 the models are replaced by synthetic latency for load testing.
+
+@lru_cache(maxsize=None)
+def get_text_processor() -> TextProcessor:
+    if stub_models_enabled():
+        return stub_text_processor_from_env()
+    return TextProcessor()
+
+@lru_cache(maxsize=None)
+def get_image_processor() -> ImageProcessor:
+    if stub_models_enabled():
+        return stub_image_processor_from_env()
+    return ImageProcessor()
+
+@lru_cache(maxsize=None)
+def get_text_explainer() -> TextExplainer:
+    return TextExplainer()
+
+@lru_cache(maxsize=None)
+def get_image_explainer() -> ImageExplainer:
+    return ImageExplainer()
+
+@lru_cache(maxsize=None)
+def get_token_explainer() -> TokenAttributionExplainer:
+    return TokenAttributionExplainer(get_text_processor())
+
+@lru_cache(maxsize=None)
+def get_comprehensive_explainer() -> ComprehensiveExplainer:
+    return ComprehensiveExplainer(get_text_explainer(), get_image_explainer())
+
+def preload_models(modalities=("text", "image")):
+    """Load the processors for the given modalities now instead of on first request"""
+    loaders = {"text": get_text_processor, "image": get_image_processor}
+    for modality in modalities:
+        loaders[modality]()
@@ -1,104 +1,416 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, UploadFile, File, Form
 from pydantic import BaseModel
 from typing import Optional, List, Dict
+import asyncio
+import io
 import json
-from datetime import datetime
+import time
+from datetime import datetime, timezone
+from api.dependencies import get_text_processor, get_image_processor, get_comprehensive_explainer
+from utils.analytics_store import get_analytics_store
+from utils.compute import get_inference_scheduler
+from utils.article_extractor import get_article_ingestor
+from utils.fetcher import FetchError, fetch_image
 
 router = APIRouter()
 
-class AnalysisRequest(BaseModel):
-    text: Optional[str] = None
-    image_url: Optional[str] = None
-    analysis_type: str = "comprehensive"  # "text", "image", "comprehensive"
-
 class AnalysisResponse(BaseModel):
     overall_score: float
+    is_manipulated: bool
     text_analysis: Optional[Dict] = None
     image_analysis: Optional[Dict] = None
+    cross_modal_insights: List[str] = []
     recommendations: List[str]
+    decided_by: Optional[str] = None
+    skipped: List[str] = []
+    timings: Dict
     processing_time: float
     timestamp: datetime
 
+class AnalysisRequest(BaseModel):
+    text: Optional[str] = None
+    image_url: Optional[str] = None
+    analysis_type: str = "comprehensive"  # "text", "image", "comprehensive"
+    early_exit: bool = True
+    early_exit_threshold: float = 0.85
+
+class ArticleRequest(BaseModel):
+    url: str
+    max_images: int = 3
+    analyze_images: bool = True
+
+class ArticleResponse(AnalysisResponse):
+    url: str
+    final_url: str
+    title: Optional[str] = None
+    truncated: bool = False
+    from_cache: bool = False
+    images: List[Dict] = []
+
+def _analyze_text(text: str, submitted: float) -> Dict:
+    """Predict and explain text on the text inference pool"""
+    started = time.perf_counter()
+    processor = get_text_processor()
+    context = processor.create_context(text)
+    result = processor.predict(text, context=context)
+    explanation = get_comprehensive_explainer().text_explainer.explain(text, result, context=context)
+    return {"result": result, "explanation": explanation,
+            "queued_ms": (started - submitted) * 1000, "processing_ms": (time.perf_counter() - started) * 1000}
+
+def _analyze_image(image_file, submitted: float) -> Dict:
+    """Predict and explain an image on the image inference pool"""
+    started = time.perf_counter()
+    result = get_image_processor().predict(image_file)
+    explanation = get_comprehensive_explainer().image_explainer.explain(image_file, result)
+    return {"result": result, "explanation": explanation,
+            "queued_ms": (started - submitted) * 1000, "processing_ms": (time.perf_counter() - started) * 1000}
+
+def _is_decisive(modality: str, result: Dict, threshold: float) -> bool:
+    """A confident manipulation verdict in one modality settles the overall verdict"""
+    flagged = result["is_fake"] if modality == "text" else result["is_deepfake"]
+    return flagged and result["confidence"] >= threshold
+
+def _consume_exception(task: asyncio.Future):
+    # A modality abandoned after early exit or another modality's error is never awaited again
+    if not task.cancelled():
+        task.exception()
+
+async def _comprehensive(text: Optional[str], image_file, image_url: Optional[str], early_exit: bool,
+                         early_exit_threshold: float) -> AnalysisResponse:
+    """Run text and image analysis concurrently and combine them into one verdict"""
+    try:
+        start_time = time.perf_counter()
+        scheduler = get_inference_scheduler()
+        
+        tasks = {}
+        if text:
+            tasks["text"] = asyncio.ensure_future(scheduler.run_text(_analyze_text, text, time.perf_counter()))
+        if image_file is not None:
+            tasks["image"] = asyncio.ensure_future(scheduler.run_image(_analyze_image, image_file, time.perf_counter()))
+        elif image_url:
+            async def fetch_and_analyze():
+                fetched_file, fetched = await fetch_image(image_url)
+                outcome = await scheduler.run_image(_analyze_image, fetched_file, time.perf_counter())
+                outcome["fetch_ms"] = fetched["fetch_ms"]
+                return outcome
+            tasks["image"] = asyncio.ensure_future(fetch_and_analyze())
+        modalities = {task: modality for modality, task in tasks.items()}
+        for task in tasks.values():
+            task.add_done_callback(_consume_exception)
+        
+        outcomes: Dict[str, Dict] = {}
+        decided_by = None
+        pending = set(tasks.values())
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    modality = modalities[task]
+                    outcomes[modality] = task.result()
+                    outcomes[modality]["total_ms"] = (time.perf_counter() - start_time) * 1000
+                    if early_exit and decided_by is None and _is_decisive(modality, outcomes[modality]["result"], early_exit_threshold):
+                        decided_by = modality
+                if decided_by is not None and pending:
+                    break
+        finally:
+            # Queued work is dropped; work already running finishes in the background
+            for task in pending:
+                task.cancel()
+        
+        skipped = [modality for modality in tasks if modality not in outcomes]
+        text_outcome = outcomes.get("text")
+        image_outcome = outcomes.get("image")
+        text_result = text_outcome["result"] if text_outcome else None
+        image_result = image_outcome["result"] if image_outcome else None
+        
+        store = get_analytics_store()
+        if text_result:
+            store.record("text", text_result["is_fake"], text_result["confidence"], text_result["processing_time"])
+        if image_result:
+            store.record("image", image_result["is_deepfake"], image_result["confidence"],
+                         image_result["processing_time"], image_result["face_count"])
+        
+        explanation = get_comprehensive_explainer().combine(
+            text_outcome["explanation"] if text_outcome else None,
+            image_outcome["explanation"] if image_outcome else None,
+            text_result, image_result
+        )
+        
+        is_manipulated = bool((text_result and text_result["is_fake"]) or (image_result and image_result["is_deepfake"]))
+        processing_time = time.perf_counter() - start_time
+        timings = {
+            modality: {key: outcome[key] for key in ("fetch_ms", "queued_ms", "processing_ms", "total_ms") if key in outcome}
+            for modality, outcome in outcomes.items()
+        }
+        timings["total_ms"] = processing_time * 1000
+        
+        return AnalysisResponse(
+            overall_score=explanation["overall_score"],
+            is_manipulated=is_manipulated,
+            text_analysis={
+                "is_fake": text_result["is_fake"],
+                "confidence": text_result["confidence"],
+                "fake_score": text_result["fake_score"],
+                "features": text_result["features"],
+                "explanation": explanation["text_analysis"]
+            } if text_result else None,
+            image_analysis={
+                "is_deepfake": image_result["is_deepfake"],
+                "confidence": image_result["confidence"],
+                "deepfake_score": image_result["deepfake_score"],
+                "face_detected": image_result["face_detected"],
+                "face_count": image_result["face_count"],
+                "explanation": explanation["image_analysis"]
+            } if image_result else None,
+            cross_modal_insights=explanation["cross_modal_insights"],
+            recommendations=explanation["recommendations"],
+            decided_by=decided_by,
+            skipped=skipped,
+            timings=timings,
+            processing_time=processing_time,
+            timestamp=datetime.now()
+        )
+    
+    except FetchError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error in analysis: {str(e)}")
+
 @router.post("/comprehensive", response_model=AnalysisResponse)
 async def comprehensive_analysis(request: AnalysisRequest):
     """
     Perform comprehensive analysis of both text and image content
+
+    The image is fetched from ``image_url``; the fetch overlaps with text
+    analysis. ``analysis_type`` restricts the analysis to ``text`` or
+    ``image``. Text and image run concurrently on their inference pools, so
+    latency is that of the slower modality rather than the sum. With
+    ``early_exit``, a modality that flags manipulation with at least
+    ``early_exit_threshold`` confidence decides the verdict and the other
+    modality is skipped if it has not finished (or started) yet. Use
+    ``/comprehensive/upload`` to send the image itself.
+    """
+    if request.analysis_type not in ("text", "image", "comprehensive"):
+        raise HTTPException(status_code=400, detail="analysis_type must be text, image or comprehensive")
+    text = request.text if request.analysis_type != "image" else None
+    image_url = request.image_url if request.analysis_type != "text" else None
+    if not text and not image_url:
+        raise HTTPException(status_code=400, detail="Provide text, an image URL, or both")
+    return await _comprehensive(text, None, image_url, request.early_exit, request.early_exit_threshold)
+
+@router.post("/comprehensive/upload", response_model=AnalysisResponse)
+async def comprehensive_analysis_upload(
+    text: Optional[str] = Form(None),
+    image: Optional[UploadFile] = File(None),
+    image_url: Optional[str] = Form(None),
+    early_exit: bool = Form(True),
+    early_exit_threshold: float = Form(0.85)
+):
+    """
+    Comprehensive analysis of multipart text and an uploaded (or linked) image
+
+    Same as ``/comprehensive``. The upload is read into memory first, since
+    image analysis abandoned by an early exit may still be running after the
+    request's temporary file is closed.
+    """
+    if not text and image is None and not image_url:
+        raise HTTPException(status_code=400, detail="Provide text, an image, or both")
+    if image is not None and not image.content_type.startswith('image/'):
+        raise HTTPException(status_code=400, detail="File must be an image")
+    image_file = io.BytesIO(await image.read()) if image is not None else None
+    return await _comprehensive(text, image_file, image_url, early_exit, early_exit_threshold)
+
+@router.post("/article", response_model=ArticleResponse)
+async def analyze_article(request: ArticleRequest):
+    """
+    Analyze a news article by URL
+
+    The page is fetched with the pooled URL client and parsed as it streams,
+    so oversized pages are cut off by size, time and extracted-text limits.
+    Extracted content is cached per URL. The article text and each lead
+    image run concurrently on their inference pools; an image that cannot be
+    fetched or analyzed is reported in ``images`` without failing the
+    request, and the most suspicious image feeds the combined verdict.
     """
     try:
-        # This would integrate both text and image analysis
-        # For now, return mock data
-        return AnalysisResponse(
-            overall_score=0.75,
+        start_time = time.perf_counter()
+        article = await get_article_ingestor().extract(request.url)
+        extract_ms = (time.perf_counter() - start_time) * 1000
+        image_urls = article["images"][:max(0, request.max_images)] if request.analyze_images else []
+        if not article["text"] and not image_urls:
+            raise HTTPException(status_code=422, detail="No article text or images found at this URL")
+        
+        scheduler = get_inference_scheduler()
+        
+        async def analyze_image_url(image_url: str) -> Dict:
+            image_file, fetched = await fetch_image(image_url)
+            outcome = await scheduler.run_image(_analyze_image, image_file, time.perf_counter())
+            outcome["fetch_ms"] = fetched["fetch_ms"]
+            return outcome
+        
+        text_task = asyncio.ensure_future(scheduler.run_text(_analyze_text, article["text"], time.perf_counter())) if article["text"] else None
+        image_outcomes = await asyncio.gather(*(analyze_image_url(url) for url in image_urls), return_exceptions=True)
+        text_outcome = await text_task if text_task is not None else None
+        
+        images = []
+        image_outcome = None
+        for image_url, outcome in zip(image_urls, image_outcomes):
+            if isinstance(outcome, BaseException):
+                images.append({"url": image_url, "error": str(outcome)})
+                continue
+            result = outcome["result"]
+            images.append({
+                "url": image_url,
+                "is_deepfake": result["is_deepfake"],
+                "confidence": result["confidence"],
+                "deepfake_score": result["deepfake_score"],
+                "face_count": result["face_count"],
+                "timings": {key: outcome[key] for key in ("fetch_ms", "queued_ms", "processing_ms")}
+            })
+            if image_outcome is None or result["deepfake_score"] > image_outcome["result"]["deepfake_score"]:
+                image_outcome = outcome
+        
+        text_result = text_outcome["result"] if text_outcome else None
+        image_result = image_outcome["result"] if image_outcome else None
+        if text_result is None and image_result is None:
+            raise HTTPException(status_code=502, detail="None of the article images could be analyzed")
+        
+        store = get_analytics_store()
+        if text_result:
+            store.record("text", text_result["is_fake"], text_result["confidence"], text_result["processing_time"])
+        for outcome in image_outcomes:
+            if not isinstance(outcome, BaseException):
+                result = outcome["result"]
+                store.record("image", result["is_deepfake"], result["confidence"],
+                             result["processing_time"], result["face_count"])
+        
+        explanation = get_comprehensive_explainer().combine(
+            text_outcome["explanation"] if text_outcome else None,
+            image_outcome["explanation"] if image_outcome else None,
+            text_result, image_result
+        )
+        
+        is_manipulated = bool((text_result and text_result["is_fake"]) or (image_result and image_result["is_deepfake"]))
+        processing_time = time.perf_counter() - start_time
+        timings = {"extract_ms": extract_ms, "fetch_ms": article["fetch_ms"], "total_ms": processing_time * 1000}
+        if text_outcome:
+            timings["text"] = {key: text_outcome[key] for key in ("queued_ms", "processing_ms")}
+        
+        return ArticleResponse(
+            url=request.url,
+            final_url=article["final_url"],
+            title=article["title"],
+            truncated=article["truncated"],
+            from_cache=article["from_cache"],
+            images=images,
+            overall_score=explanation["overall_score"],
+            is_manipulated=is_manipulated,
             text_analysis={
-                "is_fake": False,
-                "confidence": 0.8,
-                "key_features": ["credible_source", "factual_language"]
-            } if request.text else None,
+                "is_fake": text_result["is_fake"],
+                "confidence": text_result["confidence"],
+                "fake_score": text_result["fake_score"],
+                "features": text_result["features"],
+                "explanation": explanation["text_analysis"]
+            } if text_result else None,
             image_analysis={
-                "is_deepfake": False,
-                "confidence": 0.7,
-                "face_detected": True
-            } if request.image_url else None,
-            recommendations=[
-                "Content appears to be authentic",
-                "Consider fact-checking with multiple sources",
-                "Verify image sources independently"
-            ],
-            processing_time=2.5,
+                "is_deepfake": image_result["is_deepfake"],
+                "confidence": image_result["confidence"],
+                "deepfake_score": image_result["deepfake_score"],
+                "face_detected": image_result["face_detected"],
+                "face_count": image_result["face_count"],
+                "explanation": explanation["image_analysis"]
+            } if image_result else None,
+            cross_modal_insights=explanation["cross_modal_insights"],
+            recommendations=explanation["recommendations"],
+            timings=timings,
+            processing_time=processing_time,
             timestamp=datetime.now()
         )
     
+    except HTTPException:
+        raise
+    except FetchError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error in analysis: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error in article analysis: {str(e)}")
+
+def _combine(buckets: List[Dict]) -> Dict:
+    """Merge per-kind rollup rows of one bucket into text/image counters"""
+    combined = {"total": 0, "fake": 0, "deepfake": 0}
+    for row in buckets:
+        combined["total"] += row["total"]
+        combined["fake" if row["kind"] == "text" else "deepfake"] += row["flagged"]
+    return combined
+
+def _series_by_bucket(granularity: str, count: int) -> List[Dict]:
+    """Rollup series of both kinds grouped by bucket start time"""
+    grouped: Dict[int, List[Dict]] = {}
+    for row in get_analytics_store().series(granularity, count):
+        grouped.setdefault(row["bucket"], []).append(row)
+    return [dict(_combine(rows), bucket=bucket) for bucket, rows in sorted(grouped.items())]
 
+# Analytics handlers are plain functions so FastAPI runs their SQLite reads in its threadpool
 @router.get("/dashboard")
-async def get_dashboard_data():
+def get_dashboard_data():
     """
     Get dashboard statistics and analytics
     """
+    store = get_analytics_store()
+    totals = store.totals()
+    empty = {"total": 0, "flagged": 0, "faces": 0, "average_confidence": 0.0, "average_processing_time": 0.0}
+    text = totals.get("text", empty)
+    image = totals.get("image", empty)
+    total = text["total"] + image["total"]
+    
+    def weighted(key: str) -> float:
+        return (text[key] * text["total"] + image[key] * image["total"]) / total if total else 0.0
+    
     return {
-        "total_analyses": 1250,
-        "fake_detected": 180,
-        "deepfake_detected": 45,
-        "accuracy_rate": 0.92,
-        "average_processing_time": 2.3,
+        "total_analyses": total,
+        "text_analyses": text["total"],
+        "image_analyses": image["total"],
+        "fake_detected": text["flagged"],
+        "deepfake_detected": image["flagged"],
+        "average_confidence": weighted("average_confidence"),
+        "average_processing_time": weighted("average_processing_time"),
+        "confidence_histogram": store.confidence_histogram(),
         "recent_analyses": [
             {
-                "id": "1",
-                "type": "text",
-                "result": "real",
-                "confidence": 0.85,
-                "timestamp": "2024-01-15T10:30:00Z"
-            },
-            {
-                "id": "2",
-                "type": "image",
-                "result": "deepfake",
-                "confidence": 0.78,
-                "timestamp": "2024-01-15T10:25:00Z"
+                "id": str(event["id"]),
+                "type": event["kind"],
+                "result": ("fake" if event["kind"] == "text" else "deepfake") if event["flagged"] else "real",
+                "confidence": event["confidence"],
+                "timestamp": datetime.fromtimestamp(event["ts"], tz=timezone.utc).isoformat()
             }
-        ],
-        "top_features": [
-            "source_credibility",
-            "factual_consistency",
-            "image_artifacts",
-            "face_alignment"
+            for event in store.recent_events(10)
         ]
     }
 
 @router.get("/trends")
-async def get_analysis_trends():
+def get_analysis_trends():
     """
     Get analysis trends over time
     """
+    daily = _series_by_bucket("day", 28)
+    
+    # Weekly stats are summed from the daily buckets (ISO weeks)
+    weekly: Dict[str, Dict] = {}
+    for day in daily:
+        year, week, _ = datetime.fromtimestamp(day["bucket"], tz=timezone.utc).isocalendar()
+        stats = weekly.setdefault(f"{year}-W{week:02d}", {"total": 0, "fake": 0, "deepfake": 0})
+        for key in stats:
+            stats[key] += day[key]
+    
     return {
-        "daily_stats": [
-            {"date": "2024-01-15", "total": 45, "fake": 8, "deepfake": 2},
-            {"date": "2024-01-14", "total": 52, "fake": 12, "deepfake": 3},
-            {"date": "2024-01-13", "total": 38, "fake": 6, "deepfake": 1}
+        "hourly_stats": [
+            {"hour": datetime.fromtimestamp(row.pop("bucket"), tz=timezone.utc).isoformat(), **row}
+            for row in _series_by_bucket("hour", 24)
         ],
+        "daily_stats": [
+            {"date": datetime.fromtimestamp(row.pop("bucket"), tz=timezone.utc).date().isoformat(), **row}
+            for row in daily[-7:]
+        ][::-1],
         "weekly_stats": [
-            {"week": "2024-W02", "total": 320, "fake": 45, "deepfake": 12},
-            {"week": "2024-W01", "total": 298, "fake": 38, "deepfake": 8}
+            {"week": week, **stats} for week, stats in sorted(weekly.items(), reverse=True)
         ]
-    } 
\ No newline at end of file
+    }
@@ -0,0 +1,50 @@
+import asyncio
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, Response
+from utils.visualization_store import IMAGE_FORMATS, get_visualization_store
+
+router = APIRouter()
+
+# Visualization ids are content hashes, so a given URL never changes
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+@router.get("/{visualization_id}")
+async def get_visualization(
+    request: Request,
+    visualization_id: str,
+    wait: float = Query(0.0, ge=0.0, le=10.0, description="Seconds to wait for a pending render"),
+    format: Optional[str] = Query(None, pattern="^(png|jpeg|webp)$", description="Image encoding"),
+    max_size: Optional[int] = Query(None, ge=16, le=4096, description="Longest side in pixels"),
+    quality: Optional[int] = Query(None, ge=10, le=100, description="JPEG/WebP quality")
+):
+    """
+    Fetch a rendered explanation visualization by the id returned from a detect endpoint
+    """
+    store = get_visualization_store()
+    image_format = format or store.default_format
+    max_size = max_size or store.default_max_size
+    quality = quality or store.default_quality
+    
+    etag = f'"{visualization_id}-{image_format}-{max_size or 0}-{quality if image_format != "png" else 0}"'
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    
+    # Wait for a pending render and re-encode off the event loop so other requests keep being served
+    loop = asyncio.get_running_loop()
+    content = await loop.run_in_executor(
+        None, store.get_encoded, visualization_id, image_format, max_size, quality, wait
+    )
+    if content is not None:
+        return Response(content=content, media_type=IMAGE_FORMATS[image_format][2], headers=headers)
+    
+    status = store.status(visualization_id)
+    if status == "pending":
+        return JSONResponse(status_code=202, content={"id": visualization_id, "status": status})
+    if status == "skipped":
+        # Shed while the render queue was full; analyzing the content again re-queues it
+        raise HTTPException(status_code=503, detail="Visualization was not rendered: render queue full")
+    if status == "failed":
+        raise HTTPException(status_code=500, detail="Visualization rendering failed")
+    raise HTTPException(status_code=404, detail="Visualization not found")
@@ -1,9 +1,13 @@
-from fastapi import APIRouter, HTTPException, UploadFile, File, Form
+from fastapi import APIRouter, HTTPException, UploadFile, File, Form, Header, Query
 from pydantic import BaseModel
 from typing import Optional, List
 import json
-from utils.image_processor import ImageProcessor
-from utils.explainability import ImageExplainer
+from api.dependencies import get_image_processor, get_image_explainer
+from utils.serialization import shape_response
+from utils.analytics_store import get_analytics_store
+from utils.compute import get_inference_scheduler
+from utils.face_index import get_face_index
+from utils.fetcher import FetchError, fetch_image
 
 router = APIRouter()
 
@@ -14,38 +18,77 @@ class ImageResponse(BaseModel):
     face_detected: bool
     processing_time: float
     image_url: Optional[str] = None
+    face_count: Optional[int] = None
+    face_artifacts: Optional[List[dict]] = None
+    known_faces: Optional[List[dict]] = None
+    image_features: Optional[dict] = None
+
+# Fields returned in lite mode
+LITE_FIELDS = [
+    "is_deepfake", "confidence", "face_detected", "processing_time",
+    "explanation.key_factors", "explanation.visualization_url"
+]
 
 @router.post("/detect", response_model=ImageResponse)
 async def detect_deepfake(
-    file: UploadFile = File(...),
-    analyze_faces: bool = Form(True)
+    file: Optional[UploadFile] = File(None),
+    image_url: Optional[str] = Form(None),
+    analyze_faces: bool = Form(True),
+    prefilter: bool = Form(False),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return, e.g. is_deepfake,explanation.key_factors"),
+    lite: bool = Query(False, description="Return only the verdict, key factors and visualization URL")
 ):
     """
-    Detect deepfake in uploaded image using computer vision and explainable AI
+    Detect deepfake in an uploaded image, or one fetched from ``image_url``,
+    using computer vision and explainable AI. With ``prefilter``, images the
+    artifact and frequency features already decide skip Xception
     """
-    try:
-        # Validate file type
+    # Validate file type
+    if file is not None:
         if not file.content_type.startswith('image/'):
             raise HTTPException(status_code=400, detail="File must be an image")
+        image_file = file.file
+    elif image_url:
+        try:
+            image_file, _ = await fetch_image(image_url)
+        except FetchError as e:
+            raise HTTPException(status_code=e.status_code, detail=str(e))
+    else:
+        raise HTTPException(status_code=400, detail="Provide an image file or image_url")
+    
+    try:
+        # Shared processors
+        processor = get_image_processor()
+        explainer = get_image_explainer()
         
-        # Initialize processors
-        processor = ImageProcessor()
-        explainer = ImageExplainer()
-        
-        # Process image and get prediction
-        result = processor.predict(file.file, analyze_faces)
+        def analyze():
+            # Process image and get prediction
+            result = processor.predict(image_file, analyze_faces, prefilter)
+            
+            # Generate explanations
+            explanation = explainer.explain(image_file, result)
+            return result, explanation
         
-        # Generate explanations
-        explanation = explainer.explain(file.file, result)
+        # Run on the image inference pool so the event loop stays free
+        result, explanation = await get_inference_scheduler().run_image(analyze)
         
-        return ImageResponse(
-            is_deepfake=result["is_deepfake"],
-            confidence=result["confidence"],
-            explanation=explanation,
-            face_detected=result["face_detected"],
-            processing_time=result["processing_time"],
-            image_url=result.get("image_url")
+        get_analytics_store().record(
+            "image", result["is_deepfake"], result["confidence"], result["processing_time"], result["face_count"]
         )
+        
+        payload = {
+            "is_deepfake": result["is_deepfake"],
+            "confidence": result["confidence"],
+            "explanation": explanation,
+            "face_detected": result["face_detected"],
+            "processing_time": result["processing_time"],
+            "image_url": image_url,
+            "face_count": result["face_count"],
+            "face_artifacts": result["face_artifacts"],
+            "known_faces": result["known_faces"],
+            "image_features": result["image_features"]
+        }
+        return shape_response(payload, fields, lite, LITE_FIELDS)
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing image: {str(e)}")
@@ -56,14 +99,17 @@ async def batch_detect_deepfake(files: List[UploadFile] = File(...)):
     Detect deepfake in multiple images
     """
     try:
-        processor = ImageProcessor()
+        processor = get_image_processor()
         results = []
         
         for file in files:
             if not file.content_type.startswith('image/'):
                 continue
                 
-            result = processor.predict(file.file)
+            result = await get_inference_scheduler().run_image(processor.predict, file.file)
+            get_analytics_store().record(
+                "image", result["is_deepfake"], result["confidence"], result["processing_time"], result["face_count"]
+            )
             results.append({
                 "filename": file.filename,
                 "is_deepfake": result["is_deepfake"],
@@ -77,15 +123,70 @@ async def batch_detect_deepfake(files: List[UploadFile] = File(...)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing batch: {str(e)}")
 
+@router.post("/known-faces")
+async def add_known_faces(
+    label: str = Form(...),
+    file: Optional[UploadFile] = File(None),
+    image_url: Optional[str] = Form(None),
+    x_admin_token: Optional[str] = Header(None)
+):
+    """
+    Add the faces in a confirmed deepfake to the known-face index (admin only)
+    """
+    index = get_face_index()
+    if not index.is_admin(x_admin_token):
+        raise HTTPException(status_code=403, detail="Adding known faces requires a valid X-Admin-Token")
+    
+    if file is not None:
+        if not file.content_type.startswith('image/'):
+            raise HTTPException(status_code=400, detail="File must be an image")
+        image_file = file.file
+    elif image_url:
+        try:
+            image_file, _ = await fetch_image(image_url)
+        except FetchError as e:
+            raise HTTPException(status_code=e.status_code, detail=str(e))
+    else:
+        raise HTTPException(status_code=400, detail="Provide an image file or image_url")
+    
+    try:
+        encodings = await get_inference_scheduler().run_image(get_image_processor().face_encodings, image_file)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error processing image: {str(e)}")
+    if not len(encodings):
+        raise HTTPException(status_code=422, detail="No face could be encoded in the image")
+    
+    ids = await get_inference_scheduler().run_image(index.add, encodings, label, image_url or file.filename)
+    return {"ids": ids, "count": len(index)}
+
+@router.get("/known-faces")
+async def get_known_faces():
+    """
+    Get the size and match threshold of the known-face index
+    """
+    return get_face_index().describe()
+
+# Plain function so FastAPI runs the SQLite read in its threadpool
 @router.get("/stats")
-async def get_image_stats():
+def get_image_stats():
     """
     Get statistics about image processing
     """
+    totals = get_analytics_store().totals().get("image")
+    if not totals:
+        return {
+            "total_processed": 0,
+            "deepfake_detected": 0,
+            "real_detected": 0,
+            "faces_detected": 0,
+            "average_confidence": 0.0
+        }
+    
     return {
-        "total_processed": 0,
-        "deepfake_detected": 0,
-        "real_detected": 0,
-        "faces_detected": 0,
-        "average_confidence": 0.0
+        "total_processed": totals["total"],
+        "deepfake_detected": totals["flagged"],
+        "real_detected": totals["total"] - totals["flagged"],
+        "faces_detected": totals["faces"],
+        "average_confidence": totals["average_confidence"],
+        "average_processing_time": totals["average_processing_time"]
     } 
\ No newline at end of file
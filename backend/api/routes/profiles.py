@@ -0,0 +1,28 @@
+from typing import Optional
+from fastapi import APIRouter, Header, HTTPException
+from utils.profiling import get_request_profiler
+
+router = APIRouter()
+
+def _require_admin(token: Optional[str]):
+    if not get_request_profiler().is_admin(token):
+        raise HTTPException(status_code=403, detail="Profiling requires a valid X-Profile-Token")
+
+@router.get("")
+async def list_profiles(x_profile_token: Optional[str] = Header(None)):
+    """
+    List recently stored request profiles (admin only)
+    """
+    _require_admin(x_profile_token)
+    return {"profiles": get_request_profiler().list()}
+
+@router.get("/{profile_id}")
+async def get_profile(profile_id: str, x_profile_token: Optional[str] = Header(None)):
+    """
+    Get a stored request profile: span tree, raw spans and call profile (admin only)
+    """
+    _require_admin(x_profile_token)
+    profile = get_request_profiler().get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return profile
@@ -1,15 +1,24 @@
-from fastapi import APIRouter, HTTPException, UploadFile, File, Form
+from fastapi import APIRouter, HTTPException, UploadFile, File, Form, Query, WebSocket, WebSocketDisconnect
 from pydantic import BaseModel
 from typing import Optional, List
+import asyncio
 import json
-from utils.text_processor import TextProcessor
-from utils.explainability import TextExplainer
+from api.dependencies import get_text_processor, get_text_explainer, get_token_explainer
+from utils.serialization import shape_response
+from utils.analytics_store import get_analytics_store
+from utils.compute import get_inference_scheduler
+from utils.incremental_analysis import IncrementalTextSession
 
 router = APIRouter()
 
 class TextRequest(BaseModel):
     text: str
     language: Optional[str] = "en"
+    sliding_window: bool = True
+    prefilter: bool = False
+    explain_tokens: bool = False
+    sentence_level: bool = False
+    attribution_budget_ms: Optional[float] = None
 
 class TextResponse(BaseModel):
     is_fake: bool
@@ -17,30 +26,67 @@ class TextResponse(BaseModel):
     explanation: dict
     features: List[str]
     processing_time: float
+    language: Optional[str] = None
+    sentences: Optional[List[dict]] = None
+
+# Fields returned in lite mode
+LITE_FIELDS = [
+    "is_fake", "confidence", "processing_time",
+    "explanation.key_factors", "explanation.visualization_url"
+]
 
 @router.post("/detect", response_model=TextResponse)
-async def detect_fake_news(request: TextRequest):
+async def detect_fake_news(
+    request: TextRequest,
+    fields: Optional[str] = Query(None, description="Comma-separated fields to return, e.g. is_fake,explanation.key_factors"),
+    lite: bool = Query(False, description="Return only the verdict, key factors and visualization URL")
+):
     """
     Detect fake news in text content using NLP and explainable AI
     """
     try:
-        # Initialize text processor
-        processor = TextProcessor()
-        explainer = TextExplainer()
+        # Shared text processor and explainer
+        processor = get_text_processor()
+        explainer = get_text_explainer()
+        
+        def analyze():
+            # Process text and get prediction, sharing intermediate results with the explainer
+            context = processor.create_context(request.text, request.language)
+            if request.sentence_level:
+                # Per-sentence scores, aggregated into the document verdict
+                result = processor.predict_sentences(request.text, context=context)
+            else:
+                result = processor.predict(
+                    request.text, request.language, request.sliding_window,
+                    context=context, prefilter=request.prefilter
+                )
+            
+            # Generate explanations
+            explanation = explainer.explain(request.text, result, context=context)
+            
+            # Token attributions are opt-in since they need many extra model evaluations
+            if request.explain_tokens:
+                explanation["token_attributions"] = get_token_explainer().explain(
+                    request.text, context=context, budget_ms=request.attribution_budget_ms
+                )
+            return result, explanation
         
-        # Process text and get prediction
-        result = processor.predict(request.text, request.language)
+        # Run on the text inference pool so the event loop stays free
+        result, explanation = await get_inference_scheduler().run_text(analyze)
         
-        # Generate explanations
-        explanation = explainer.explain(request.text, result)
+        get_analytics_store().record("text", result["is_fake"], result["confidence"], result["processing_time"])
         
-        return TextResponse(
-            is_fake=result["is_fake"],
-            confidence=result["confidence"],
-            explanation=explanation,
-            features=result["features"],
-            processing_time=result["processing_time"]
-        )
+        payload = {
+            "is_fake": result["is_fake"],
+            "confidence": result["confidence"],
+            "explanation": explanation,
+            "features": result["features"],
+            "processing_time": result["processing_time"],
+            "language": result["language"]
+        }
+        if request.sentence_level:
+            payload["sentences"] = result["sentences"]
+        return shape_response(payload, fields, lite, LITE_FIELDS)
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing text: {str(e)}")
@@ -51,11 +97,12 @@ async def batch_detect_fake_news(texts: List[str]):
     Detect fake news in multiple text inputs
     """
     try:
-        processor = TextProcessor()
+        processor = get_text_processor()
         results = []
         
         for text in texts:
-            result = processor.predict(text)
+            result = await get_inference_scheduler().run_text(processor.predict, text)
+            get_analytics_store().record("text", result["is_fake"], result["confidence"], result["processing_time"])
             results.append({
                 "text": text,
                 "is_fake": result["is_fake"],
@@ -68,14 +115,74 @@ async def batch_detect_fake_news(texts: List[str]):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing batch: {str(e)}")
 
+@router.websocket("/ws")
+async def incremental_detection(websocket: WebSocket):
+    """
+    Incremental fake news detection for editors
+
+    Send ``{"type": "set", "text": ...}`` to replace the document or
+    ``{"type": "edit", "start": ..., "end": ..., "text": ...}`` to replace a
+    character range. After edits the server pushes a ``verdict`` for the
+    latest version; only chunks the edits changed are re-scored. Edits that
+    arrive while a verdict is being computed are coalesced into the next one.
+    The ``language`` query parameter fixes the document language; by
+    default it is identified from the text.
+    """
+    await websocket.accept()
+    session = IncrementalTextSession(get_text_processor(), language=websocket.query_params.get("language"))
+    scheduler = get_inference_scheduler()
+    changed = asyncio.Event()
+    
+    async def push_verdicts():
+        while True:
+            await changed.wait()
+            changed.clear()
+            try:
+                verdict = await scheduler.run_text(session.score, session.snapshot())
+            except Exception as e:
+                await websocket.send_json({"type": "error", "version": session.version, "detail": f"Error processing text: {str(e)}"})
+                continue
+            # Skip verdicts that later edits have already made stale
+            if verdict["version"] == session.version:
+                await websocket.send_json(dict(verdict, type="verdict"))
+    
+    pusher = asyncio.ensure_future(push_verdicts())
+    try:
+        while True:
+            raw = await websocket.receive_text()
+            try:
+                message = json.loads(raw)
+                if not isinstance(message, dict):
+                    raise ValueError("Messages must be JSON objects")
+                if message.get("type") == "set":
+                    session.set_text(message["text"])
+                elif message.get("type") == "edit":
+                    session.apply_edit(int(message["start"]), int(message["end"]), message.get("text", ""))
+                else:
+                    raise ValueError(f"Unknown message type {message.get('type')!r}")
+            except (KeyError, TypeError, ValueError) as e:
+                await websocket.send_json({"type": "error", "version": session.version, "detail": str(e)})
+                continue
+            changed.set()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        pusher.cancel()
+
+# Plain function so FastAPI runs the SQLite read in its threadpool
 @router.get("/stats")
-async def get_text_stats():
+def get_text_stats():
     """
     Get statistics about text processing
     """
+    totals = get_analytics_store().totals().get("text")
+    if not totals:
+        return {"total_processed": 0, "fake_detected": 0, "real_detected": 0, "average_confidence": 0.0}
+    
     return {
-        "total_processed": 0,
-        "fake_detected": 0,
-        "real_detected": 0,
-        "average_confidence": 0.0
+        "total_processed": totals["total"],
+        "fake_detected": totals["flagged"],
+        "real_detected": totals["total"] - totals["flagged"],
+        "average_confidence": totals["average_confidence"],
+        "average_processing_time": totals["average_processing_time"]
     } 
\ No newline at end of file
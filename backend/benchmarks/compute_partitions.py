@@ -0,0 +1,124 @@
+"""Throughput of mixed text and image load at different core partitions
+
+Each partition runs in a fresh process, since TensorFlow's thread limits
+can only be set before its runtime starts. Within that process, text and
+image requests are submitted concurrently through the inference scheduler
+for a fixed duration, and per-modality throughput and latency are reported.
+
+Run from the backend directory:
+
+    python -m benchmarks.compute_partitions --shares 0.25,0.5,0.75 --duration 20
+    python -m benchmarks.compute_partitions --cores 8 --text-workers 2 --image-workers 2
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import time
+from typing import Dict, List
+
+import numpy as np
+
+def _summarize(latencies: List[float], elapsed: float) -> Dict:
+    samples = np.array(latencies or [0.0]) * 1000
+    return {
+        "completed": len(latencies),
+        "throughput_per_s": len(latencies) / elapsed if elapsed > 0 else 0.0,
+        "p50_ms": float(np.percentile(samples, 50)),
+        "p90_ms": float(np.percentile(samples, 90)),
+    }
+
+async def _drive(args) -> Dict:
+    from benchmarks import corpora
+    from api.dependencies import get_text_processor, get_image_processor
+    from utils.compute import get_inference_scheduler
+
+    scheduler = get_inference_scheduler()
+    text_processor = get_text_processor()
+    image_processor = get_image_processor()
+    texts = corpora.synthetic_texts(args.text_size, 16)
+    images = corpora.synthetic_images(args.image_size, 4)
+
+    # Warm up both models outside the measured window
+    await scheduler.run_text(text_processor.predict, texts[0])
+    await scheduler.run_image(image_processor.predict, corpora.UploadedFile(images[0]))
+
+    latencies = {"text": [], "image": []}
+    deadline = time.perf_counter() + args.duration
+
+    async def text_client(i: int):
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            await scheduler.run_text(text_processor.predict, texts[i % len(texts)])
+            latencies["text"].append(time.perf_counter() - start)
+            i += 1
+
+    async def image_client(i: int):
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            await scheduler.run_image(image_processor.predict, corpora.UploadedFile(images[i % len(images)]))
+            latencies["image"].append(time.perf_counter() - start)
+            i += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(
+        *(text_client(i) for i in range(args.text_clients)),
+        *(image_client(i) for i in range(args.image_clients))
+    )
+    elapsed = time.perf_counter() - start
+    return {
+        "config": scheduler.config.describe(),
+        "text": _summarize(latencies["text"], elapsed),
+        "image": _summarize(latencies["image"], elapsed),
+    }
+
+def _run_partition(args, share: float, results):
+    # Configure before any framework is imported in this fresh process
+    from utils.compute import set_thread_env
+    os.environ["COMPUTE_TEXT_SHARE"] = str(share)
+    os.environ["COMPUTE_TEXT_WORKERS"] = str(args.text_workers)
+    os.environ["COMPUTE_IMAGE_WORKERS"] = str(args.image_workers)
+    if args.cores:
+        os.environ["COMPUTE_CORES"] = str(args.cores)
+        set_thread_env(args.cores)
+    results.put(asyncio.run(_drive(args)))
+
+def main():
+    parser = argparse.ArgumentParser(description="Mixed text/image throughput per core partition")
+    parser.add_argument('--shares', default="0.25,0.5,0.75", help="Fractions of the cores given to text inference")
+    parser.add_argument('--cores', type=int, default=0, help="Cores to partition (default: all available)")
+    parser.add_argument('--text-workers', type=int, default=1)
+    parser.add_argument('--image-workers', type=int, default=1)
+    parser.add_argument('--text-clients', type=int, default=4, help="Concurrent text requests")
+    parser.add_argument('--image-clients', type=int, default=4, help="Concurrent image requests")
+    parser.add_argument('--text-size', default="article")
+    parser.add_argument('--image-size', default="hd")
+    parser.add_argument('--duration', type=float, default=20.0, help="Seconds per partition")
+    parser.add_argument('--output', help="Write results as JSON to this path")
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context("spawn")
+    report = []
+    print(f"{'text share':>10}  {'text/image cores':>16}  {'text/s':>8}  {'text p90':>10}  {'image/s':>8}  {'image p90':>10}")
+    for share in [float(s) for s in args.shares.split(",")]:
+        results = context.Queue()
+        process = context.Process(target=_run_partition, args=(args, share, results))
+        process.start()
+        result = results.get()
+        process.join()
+
+        result["text_share"] = share
+        report.append(result)
+        config = result["config"]
+        print(f"{share:>10.2f}  {config['text']['cores']:>7} / {config['image']['cores']:<6}  "
+              f"{result['text']['throughput_per_s']:>8.1f}  {result['text']['p90_ms']:>7.1f} ms  "
+              f"{result['image']['throughput_per_s']:>8.1f}  {result['image']['p90_ms']:>7.1f} ms")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""Synthetic and fixture inputs for the benchmark suite"""
+import io
+import os
+import random
+from typing import Dict, List
+
+import cv2
+import numpy as np
+
+# Words sampled by the synthetic news corpora
+VOCABULARY = [
+    'the', 'government', 'announced', 'BREAKING', 'study', 'shows', 'that',
+    'officials', 'confirmed', 'SHOCKING', 'news', 'about', 'the', 'economy',
+    'you', "won't", 'believe', 'what', 'happened', 'next!', 'researchers',
+    'at', 'the', 'university', 'published', 'a', 'report,', 'allegedly',
+    'viral', 'video', 'insider', 'claims', 'experts', 'disagree.'
+]
+
+# Word counts of the synthetic text sizes
+TEXT_SIZES = {
+    "tweet": 25,
+    "article": 800,
+    "long_article": 6000,
+}
+
+# (width, height) of the synthetic image sizes
+IMAGE_SIZES = {
+    "thumbnail": (160, 120),
+    "hd": (1920, 1080),
+    "24mp": (6000, 4000),
+}
+
+# Image size and number of faces of the synthetic scenes that exercise the face path
+FACE_SCENES = {
+    "thumbnail_1_face": ("thumbnail", 1),
+    "hd_1_face": ("hd", 1),
+    "hd_4_faces": ("hd", 4),
+}
+
+# Side lengths of synthetic face crops
+FACE_CROP_SIZES = {
+    "small_face": 64,
+    "medium_face": 224,
+    "large_face": 800,
+}
+
+class UploadedFile(io.BytesIO):
+    """In-memory stand-in for the uploaded file objects passed to ImageProcessor"""
+
+def synthetic_texts(size: str, count: int, seed: int = 0) -> List[str]:
+    rng = random.Random(seed)
+    words = TEXT_SIZES[size]
+    return [' '.join(rng.choice(VOCABULARY) for _ in range(words)) for _ in range(count)]
+
+def synthetic_image(width: int, height: int, seed: int = 0) -> np.ndarray:
+    """Smooth random RGB image (noise would make JPEG sizes unrealistic)"""
+    rng = np.random.default_rng(seed)
+    small = rng.integers(0, 256, (max(height // 16, 2), max(width // 16, 2), 3), dtype=np.uint8)
+    return cv2.resize(small, (width, height), interpolation=cv2.INTER_CUBIC)
+
+def synthetic_face(side: int, seed: int = 0) -> np.ndarray:
+    """Cartoon frontal face on a plain background
+
+    Dark eye sockets and brows above lighter cheeks and a dark mouth give
+    the contrast pattern OpenCV's frontal face cascade looks for, so these
+    are detected at any size and exercise face detection, Xception and
+    Grad-CAM (dlib's HOG detector generally ignores them).
+    """
+    rng = np.random.default_rng(seed)
+    img = np.empty((side, side, 3), dtype=np.uint8)
+    img[:] = rng.integers(40, 220, 3)
+    c = side // 2
+    
+    def s(fraction: float) -> int:
+        return max(1, int(side * fraction))
+    
+    skin = np.clip(np.array([200, 155, 125]) + rng.integers(-30, 30, 3), 0, 255)
+    shade = (skin * 0.55).tolist()
+    cv2.ellipse(img, (c, c + s(.02)), (s(.30), s(.40)), 0, 0, 360, skin.tolist(), -1)
+    cv2.ellipse(img, (c, c - s(.27)), (s(.32), s(.15)), 0, 180, 360, (45, 35, 25), -1)
+    for side_sign in (-1, 1):
+        ex, ey = c + side_sign * s(.12), c - s(.07)
+        cv2.ellipse(img, (ex, ey), (s(.08), s(.045)), 0, 0, 360, shade, -1)
+        cv2.ellipse(img, (ex, ey - s(.06)), (s(.075), s(.018)), 0, 0, 360, (40, 30, 20), -1)
+        cv2.circle(img, (ex, ey), s(.022), (25, 20, 20), -1)
+    cv2.ellipse(img, (c, c + s(.09)), (s(.045), s(.022)), 0, 0, 360, shade, -1)
+    cv2.ellipse(img, (c, c + s(.2)), (s(.09), s(.028)), 0, 0, 360, (120, 50, 50), -1)
+    return cv2.GaussianBlur(img, (0, 0), max(side / 200, 0.5))
+
+def synthetic_face_scene(width: int, height: int, faces: int, seed: int = 0) -> np.ndarray:
+    """Smooth background with ``faces`` faces side by side across the middle"""
+    img = synthetic_image(width, height, seed)
+    if faces:
+        side = min(height * 2 // 3, width // faces)
+        top = (height - side) // 2
+        gap = (width - side * faces) // (faces + 1)
+        for i in range(faces):
+            left = gap + i * (side + gap)
+            img[top:top + side, left:left + side] = synthetic_face(side, seed * 31 + i)
+    return img
+
+def encode_jpeg(img: np.ndarray, quality: int = 90) -> bytes:
+    ok, buffer = cv2.imencode('.jpg', cv2.cvtColor(img, cv2.COLOR_RGB2BGR), [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok:
+        raise ValueError("Could not encode benchmark image")
+    return buffer.tobytes()
+
+def synthetic_images(size: str, count: int, seed: int = 0) -> List[bytes]:
+    width, height = IMAGE_SIZES[size]
+    return [encode_jpeg(synthetic_image(width, height, seed + i)) for i in range(count)]
+
+def synthetic_face_images(scene: str, count: int, seed: int = 0) -> List[bytes]:
+    size, faces = FACE_SCENES[scene]
+    width, height = IMAGE_SIZES[size]
+    return [encode_jpeg(synthetic_face_scene(width, height, faces, seed + i)) for i in range(count)]
+
+def synthetic_face_crops(size: str, count: int, seed: int = 0) -> List[np.ndarray]:
+    side = FACE_CROP_SIZES[size]
+    return [synthetic_face(side, seed + i) for i in range(count)]
+
+def load_fixture_texts(directory: str) -> Dict[str, List[str]]:
+    """Load ``*.txt`` files grouped by subdirectory name (e.g. tweets/, articles/)"""
+    corpora: Dict[str, List[str]] = {}
+    for root, _, files in os.walk(directory):
+        texts = []
+        for name in sorted(files):
+            if name.endswith('.txt'):
+                with open(os.path.join(root, name), encoding='utf-8') as f:
+                    texts.append(f.read())
+        if texts:
+            corpora[f"fixture_{os.path.basename(root)}"] = texts
+    return corpora
+
+def load_fixture_images(directory: str) -> Dict[str, List[bytes]]:
+    """Load images grouped by subdirectory name (e.g. faces_0/, faces_1/, faces_many/)"""
+    corpora: Dict[str, List[bytes]] = {}
+    for root, _, files in os.walk(directory):
+        images = []
+        for name in sorted(files):
+            if name.lower().endswith(('.jpg', '.jpeg', '.png', '.webp')):
+                with open(os.path.join(root, name), 'rb') as f:
+                    images.append(f.read())
+        if images:
+            corpora[f"fixture_{os.path.basename(root)}"] = images
+    return corpora
@@ -0,0 +1,81 @@
+"""Benchmark for the known-face index
+
+Builds an index of synthetic 128-d encodings in a temporary memory-mapped
+file, then measures insert throughput, the time to reopen it, and query
+latency for images with one to several faces. Some queries are perturbed
+copies of indexed encodings, so the run also checks that exact search finds
+them.
+
+Run from the backend directory:
+
+    python -m benchmarks.face_index --vectors 1000000 --faces 1,5
+"""
+import argparse
+import os
+import tempfile
+import time
+from typing import List
+
+import numpy as np
+
+from utils.face_index import ENCODING_SIZE, FaceIndex
+
+def synthetic_encodings(count: int, rng: np.random.Generator) -> np.ndarray:
+    """Encodings with roughly the scale of dlib's (unit-norm-ish rows)"""
+    return (rng.standard_normal((count, ENCODING_SIZE)) / np.sqrt(ENCODING_SIZE)).astype(np.float32)
+
+def percentiles(samples: List[float]) -> str:
+    p50, p95, p99 = np.percentile(np.array(samples) * 1000, [50, 95, 99])
+    return f"p50 {p50:.1f} ms, p95 {p95:.1f} ms, p99 {p99:.1f} ms"
+
+def main():
+    parser = argparse.ArgumentParser(description="Known-face index benchmark")
+    parser.add_argument('--vectors', type=int, default=1000000, help="Number of indexed encodings")
+    parser.add_argument('--faces', default="1,5", help="Comma-separated faces per query (one query per image)")
+    parser.add_argument('--queries', type=int, default=50, help="Queries per face count")
+    parser.add_argument('--block-size', type=int, default=65536, help="Rows scanned per block")
+    parser.add_argument('--insert-batch', type=int, default=10000, help="Encodings per insert")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "known_faces.npy")
+        index = FaceIndex(path, block_size=args.block_size)
+
+        # Keep a few inserted encodings per batch to plant in queries
+        sample_ids, samples = [], []
+        start = time.perf_counter()
+        for offset in range(0, args.vectors, args.insert_batch):
+            encodings = synthetic_encodings(min(args.insert_batch, args.vectors - offset), rng)
+            ids = index.add(encodings, "synthetic")
+            sample_ids.extend(ids[:10])
+            samples.append(encodings[:10])
+        samples = np.concatenate(samples)
+        elapsed = time.perf_counter() - start
+        print(f"Inserted {len(index)} encodings in {elapsed:.2f}s ({len(index) / elapsed:,.0f}/s), "
+              f"{index.describe()['bytes'] / 2**20:.0f} MB on disk")
+
+        start = time.perf_counter()
+        index = FaceIndex(path, block_size=args.block_size)
+        print(f"Reopened in {time.perf_counter() - start:.2f}s")
+
+        for faces in (int(value) for value in args.faces.split(",")):
+            latencies = []
+            found = 0
+            for _ in range(args.queries):
+                # Half of each image's faces are near-copies of indexed ones
+                planted = rng.integers(0, len(samples), size=(faces + 1) // 2)
+                known = [sample_ids[i] for i in planted]
+                queries = np.concatenate([
+                    samples[planted] + synthetic_encodings(len(known), rng) * 0.05,
+                    synthetic_encodings(faces - len(known), rng)
+                ])
+                start = time.perf_counter()
+                matches = index.match(queries)
+                latencies.append(time.perf_counter() - start)
+                found += sum(1 for match, row in zip(matches, known) if match is not None and match["id"] == row)
+            print(f"  {faces} face(s) per query: {percentiles(latencies)}; "
+                  f"found {found}/{args.queries * ((faces + 1) // 2)} planted matches")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""Timing, memory and comparison helpers for the benchmark suite"""
+import json
+import resource
+import sys
+import time
+from typing import Callable, Dict, List, Sequence
+
+import numpy as np
+
+def _proc_status_mb(field: str) -> float:
+    """A ``kB`` field of ``/proc/self/status`` in MB; raises OSError where it is unavailable"""
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(field + ":"):
+                return int(line.split()[1]) / 1024
+    raise OSError(f"{field} not in /proc/self/status")
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process since start or the last ``reset_peak_rss``, in MB"""
+    try:
+        return _proc_status_mb("VmHWM")
+    except OSError:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in bytes on macOS and kilobytes on Linux
+        return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+def current_rss_mb() -> float:
+    """Resident set size of this process now, in MB (the peak where the current size is unavailable)"""
+    try:
+        return _proc_status_mb("VmRSS")
+    except OSError:
+        return peak_rss_mb()
+
+def reset_peak_rss() -> bool:
+    """Restart peak RSS tracking from the current size (Linux 4.0+); False where unsupported"""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+def measure(name: str, func: Callable, inputs: Sequence, repeats: int = 3, warmup: int = 1) -> Dict:
+    """Call ``func`` on every input ``repeats`` times and summarize per-call latency
+
+    ``peak_rss_mb`` is the peak while this case ran and ``rss_growth_mb``
+    its growth over the resident size when the case started, so earlier
+    cases' peaks do not carry over. Where the peak cannot be reset (not
+    Linux), the peak is the process's so far and the growth is measured
+    against the peak before the case.
+    """
+    for item in list(inputs)[:warmup]:
+        func(item)
+    
+    rss_before = current_rss_mb() if reset_peak_rss() else peak_rss_mb()
+    latencies: List[float] = []
+    start = time.perf_counter()
+    for _ in range(repeats):
+        for item in inputs:
+            call_start = time.perf_counter()
+            func(item)
+            latencies.append(time.perf_counter() - call_start)
+    elapsed = time.perf_counter() - start
+    
+    samples = np.array(latencies) * 1000
+    result = {
+        "name": name,
+        "calls": len(latencies),
+        "mean_ms": float(samples.mean()),
+        "p50_ms": float(np.percentile(samples, 50)),
+        "p90_ms": float(np.percentile(samples, 90)),
+        "p99_ms": float(np.percentile(samples, 99)),
+        "max_ms": float(samples.max()),
+        "throughput_per_s": len(latencies) / elapsed if elapsed > 0 else float('inf'),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    result["rss_growth_mb"] = result["peak_rss_mb"] - rss_before
+    return result
+
+def format_result(result: Dict) -> str:
+    return (f"  {result['name']:<48} p50 {result['p50_ms']:9.2f} ms  p90 {result['p90_ms']:9.2f} ms  "
+            f"p99 {result['p99_ms']:9.2f} ms  {result['throughput_per_s']:9.1f}/s  "
+            f"peak RSS {result['peak_rss_mb']:8.1f} MB (+{result['rss_growth_mb']:.1f})")
+
+def save_results(results: List[Dict], path: str, metadata: Dict):
+    with open(path, 'w') as f:
+        json.dump({"metadata": metadata, "results": results}, f, indent=2)
+
+def compare(results: List[Dict], baseline_path: str, threshold: float = 0.10,
+            metrics: Sequence[str] = ("p50_ms", "p90_ms")) -> List[Dict]:
+    """Return cases whose latency metrics regressed by more than ``threshold`` (a fraction)"""
+    with open(baseline_path) as f:
+        baseline = {r["name"]: r for r in json.load(f)["results"]}
+    
+    regressions = []
+    for result in results:
+        reference = baseline.get(result["name"])
+        if reference is None:
+            continue
+        for metric in metrics:
+            before, after = reference[metric], result[metric]
+            if before > 0 and (after - before) / before > threshold:
+                regressions.append({
+                    "name": result["name"],
+                    "metric": metric,
+                    "baseline": before,
+                    "current": after,
+                    "change": (after - before) / before
+                })
+    return regressions
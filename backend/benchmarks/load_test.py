@@ -0,0 +1,292 @@
+"""HTTP load generator for sizing deployments
+
+Drives the detection endpoints at a sweep of load levels and reports
+client-side latency percentiles, throughput and errors per level. Two load
+models are supported:
+
+* ``closed``: a fixed number of concurrent clients, each sending the next
+  request as soon as the previous one completes (``--levels`` are
+  concurrencies).
+* ``open``: requests arrive as a Poisson process at a fixed rate regardless
+  of how fast the server answers (``--levels`` are requests per second).
+  Latency is measured from the scheduled arrival time, so queueing delay
+  is not hidden when the server falls behind.
+
+Before and after each level the server's ``/metrics`` are scraped to split
+server time into model stages and the remaining overhead (upload parsing,
+serialization, event loop blocking). Start the server with ``STUB_MODELS=1``
+to replace the models with synthetic latency:
+
+    STUB_MODELS=1 python main.py
+    python -m benchmarks.load_test --scenario text,image --mode open --levels 5,10,20,40
+
+The first level whose throughput falls short of the offered load, whose
+error rate exceeds ``--max-error-rate`` or whose p99 exceeds ``--slo-ms`` is
+reported as the saturation point.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import time
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional
+
+import httpx
+import numpy as np
+from prometheus_client.parser import text_string_to_metric_families
+
+from benchmarks import corpora
+
+# Stages that stand for model cost; everything else in a request is overhead
+MODEL_STAGES = ("stub_model", "bert_forward", "sentiment", "xception", "saliency")
+
+def build_scenarios(args) -> Dict[str, Callable[[int], Dict]]:
+    """Request builders by scenario name; each returns ``httpx`` request arguments"""
+    texts = corpora.synthetic_texts(args.text_size, 32)
+    images = corpora.synthetic_images(args.image_size, 8)
+
+    def text(i: int) -> Dict:
+        return {"method": "POST", "url": "/api/text/detect", "json": {"text": texts[i % len(texts)]}}
+
+    def text_batch(i: int) -> Dict:
+        batch = [texts[(i + j) % len(texts)] for j in range(args.batch_size)]
+        return {"method": "POST", "url": "/api/text/batch-detect", "json": batch}
+
+    def image(i: int) -> Dict:
+        upload = ("image.jpg", images[i % len(images)], "image/jpeg")
+        return {"method": "POST", "url": "/api/image/detect", "files": {"file": upload}}
+
+    def image_batch(i: int) -> Dict:
+        uploads = [("files", (f"image_{j}.jpg", images[(i + j) % len(images)], "image/jpeg"))
+                   for j in range(args.batch_size)]
+        return {"method": "POST", "url": "/api/image/batch-detect", "files": uploads}
+
+    def comprehensive(i: int) -> Dict:
+        upload = ("image.jpg", images[i % len(images)], "image/jpeg")
+        return {"method": "POST", "url": "/api/analysis/comprehensive/upload",
+                "data": {"text": texts[i % len(texts)]}, "files": {"image": upload}}
+
+    return {
+        "text": text,
+        "text-batch": text_batch,
+        "image": image,
+        "image-batch": image_batch,
+        "comprehensive": comprehensive,
+    }
+
+async def scrape_metrics(client: httpx.AsyncClient) -> Dict[str, float]:
+    """Sum request and stage latency counters from the server's /metrics"""
+    totals: Dict[str, float] = defaultdict(float)
+    try:
+        response = await client.get("/metrics")
+        response.raise_for_status()
+    except httpx.HTTPError as e:
+        print(f"Metrics scrape failed: {e}")
+        return totals
+
+    for family in text_string_to_metric_families(response.text):
+        for sample in family.samples:
+            if sample.name == "detection_http_request_seconds_sum" and sample.labels.get("route") != "/metrics":
+                totals["request_seconds"] += sample.value
+            elif sample.name == "detection_http_request_seconds_count" and sample.labels.get("route") != "/metrics":
+                totals["requests"] += sample.value
+            elif sample.name == "detection_stage_seconds_sum":
+                totals["stage:" + sample.labels["stage"]] += sample.value
+    return totals
+
+def server_breakdown(before: Dict[str, float], after: Dict[str, float]) -> Dict:
+    """Mean server time per request, split into model stages and overhead"""
+    requests = after.get("requests", 0) - before.get("requests", 0)
+    if requests <= 0:
+        return {}
+    per_request = lambda key: (after.get(key, 0) - before.get(key, 0)) / requests * 1000
+    server_ms = per_request("request_seconds")
+    stages = {key[len("stage:"):]: per_request(key) for key in after if key.startswith("stage:")}
+    model_ms = sum(stages.get(stage, 0.0) for stage in MODEL_STAGES)
+    return {
+        "server_mean_ms": server_ms,
+        "model_mean_ms": model_ms,
+        "overhead_mean_ms": max(0.0, server_ms - model_ms),
+        "stages_mean_ms": {stage: ms for stage, ms in stages.items() if ms > 0},
+    }
+
+class LevelRecorder:
+    def __init__(self):
+        self.latencies: List[float] = []
+        self.errors = 0
+        self.status_counts: Dict[int, int] = defaultdict(int)
+
+    async def send(self, client: httpx.AsyncClient, request: Dict, started: float):
+        """Send one request and record its latency measured from ``started``"""
+        try:
+            response = await client.request(**request)
+            self.status_counts[response.status_code] += 1
+            if response.status_code >= 400:
+                self.errors += 1
+        except httpx.HTTPError:
+            self.status_counts[0] += 1
+            self.errors += 1
+        self.latencies.append(time.perf_counter() - started)
+
+    def summary(self, elapsed: float) -> Dict:
+        completed = len(self.latencies)
+        samples = np.array(self.latencies or [0.0]) * 1000
+        return {
+            "completed": completed,
+            "errors": self.errors,
+            "error_rate": self.errors / completed if completed else 0.0,
+            "throughput_per_s": completed / elapsed if elapsed > 0 else 0.0,
+            "p50_ms": float(np.percentile(samples, 50)),
+            "p90_ms": float(np.percentile(samples, 90)),
+            "p99_ms": float(np.percentile(samples, 99)),
+            "max_ms": float(samples.max()),
+            "status_counts": dict(self.status_counts),
+        }
+
+async def run_closed(client: httpx.AsyncClient, next_request: Callable[[], Dict],
+                     concurrency: int, duration: float) -> Dict:
+    """Keep ``concurrency`` requests in flight for ``duration`` seconds"""
+    recorder = LevelRecorder()
+    deadline = time.perf_counter() + duration
+
+    async def worker():
+        while time.perf_counter() < deadline:
+            await recorder.send(client, next_request(), time.perf_counter())
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    result = recorder.summary(time.perf_counter() - start)
+    result["offered"] = concurrency
+    return result
+
+async def run_open(client: httpx.AsyncClient, next_request: Callable[[], Dict],
+                   rate: float, duration: float, max_in_flight: int, seed: int = 0) -> Dict:
+    """Issue Poisson arrivals at ``rate`` per second for ``duration`` seconds"""
+    recorder = LevelRecorder()
+    rng = random.Random(seed)
+    in_flight = set()
+    skipped = 0
+
+    start = time.perf_counter()
+    scheduled = start
+    while True:
+        scheduled += rng.expovariate(rate)
+        if scheduled - start >= duration:
+            break
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if len(in_flight) >= max_in_flight:
+            # The client itself is saturated; count the arrival as lost rather than queueing it
+            skipped += 1
+            continue
+        task = asyncio.ensure_future(recorder.send(client, next_request(), scheduled))
+        in_flight.add(task)
+        task.add_done_callback(in_flight.discard)
+
+    # Throughput counts only the arrival window; stragglers still contribute their latency
+    elapsed = time.perf_counter() - start
+    if in_flight:
+        await asyncio.gather(*in_flight)
+    result = recorder.summary(elapsed)
+    result["offered"] = rate
+    result["skipped"] = skipped
+    return result
+
+def is_saturated(result: Dict, previous: Optional[Dict], mode: str, args) -> bool:
+    if result["error_rate"] > args.max_error_rate:
+        return True
+    if args.slo_ms and result["p99_ms"] > args.slo_ms:
+        return True
+    if mode == "open":
+        return result["throughput_per_s"] < 0.9 * result["offered"] or result.get("skipped", 0) > 0
+    # Closed loop: adding clients no longer adds meaningful throughput
+    if previous is not None and previous["throughput_per_s"] > 0:
+        gain = result["throughput_per_s"] / previous["throughput_per_s"] - 1
+        return gain < 0.1
+    return False
+
+def format_level(result: Dict, mode: str) -> str:
+    unit = "c" if mode == "closed" else "/s"
+    line = (f"  {result['offered']:>7g}{unit:<3} {result['throughput_per_s']:8.1f}/s  "
+            f"p50 {result['p50_ms']:8.1f} ms  p90 {result['p90_ms']:8.1f} ms  p99 {result['p99_ms']:8.1f} ms  "
+            f"errors {result['error_rate']:6.1%}")
+    server = result.get("server")
+    if server:
+        line += (f"  | server {server['server_mean_ms']:7.1f} ms = model {server['model_mean_ms']:7.1f} ms"
+                 f" + overhead {server['overhead_mean_ms']:6.1f} ms")
+    return line
+
+async def run(args) -> Dict:
+    scenarios = build_scenarios(args)
+    names = [name.strip() for name in args.scenario.split(",")]
+    for name in names:
+        if name not in scenarios:
+            raise SystemExit(f"Unknown scenario: {name} (choose from {', '.join(scenarios)})")
+
+    counter = itertools.count()
+    def next_request() -> Dict:
+        # Round-robin across the selected scenarios
+        i = next(counter)
+        return scenarios[names[i % len(names)]](i)
+
+    levels = [float(level) for level in args.levels.split(",")]
+    limits = httpx.Limits(max_connections=args.max_connections, max_keepalive_connections=args.max_connections)
+    report = {"mode": args.mode, "scenarios": names, "levels": [], "saturation": None}
+
+    async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout, limits=limits) as client:
+        # Warm up so lazily loaded processors do not count against the first level
+        for name in names:
+            await LevelRecorder().send(client, scenarios[name](0), time.perf_counter())
+
+        previous = None
+        for level in levels:
+            before = await scrape_metrics(client)
+            if args.mode == "closed":
+                result = await run_closed(client, next_request, int(level), args.duration)
+            else:
+                result = await run_open(client, next_request, level, args.duration, args.max_connections)
+            result["server"] = server_breakdown(before, await scrape_metrics(client))
+            report["levels"].append(result)
+            print(format_level(result, args.mode))
+
+            if report["saturation"] is None and is_saturated(result, previous, args.mode, args):
+                report["saturation"] = level
+                print(f"Saturation reached at {level:g}")
+                if not args.continue_after_saturation:
+                    break
+            previous = result
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP load generator for the detection API")
+    parser.add_argument('--url', default="http://localhost:8000", help="Base URL of the server")
+    parser.add_argument('--scenario', default="text", help="Comma-separated: text,text-batch,image,image-batch,comprehensive")
+    parser.add_argument('--mode', choices=("closed", "open"), default="closed")
+    parser.add_argument('--levels', default="1,2,4,8,16,32", help="Concurrencies (closed) or arrival rates per second (open)")
+    parser.add_argument('--duration', type=float, default=15.0, help="Seconds per level")
+    parser.add_argument('--text-size', default="article", choices=list(corpora.TEXT_SIZES))
+    parser.add_argument('--image-size', default="hd", choices=list(corpora.IMAGE_SIZES))
+    parser.add_argument('--batch-size', type=int, default=8, help="Items per batch request")
+    parser.add_argument('--max-connections', type=int, default=256, help="Connection pool size and open-loop in-flight cap")
+    parser.add_argument('--timeout', type=float, default=60.0, help="Per-request timeout in seconds")
+    parser.add_argument('--slo-ms', type=float, default=0.0, help="p99 latency objective; 0 disables")
+    parser.add_argument('--max-error-rate', type=float, default=0.01)
+    parser.add_argument('--continue-after-saturation', action='store_true')
+    parser.add_argument('--output', help="Write the report as JSON to this path")
+    args = parser.parse_args()
+
+    print(f"Load test: {args.mode} loop, scenarios {args.scenario}, {args.duration:g}s per level")
+    report = asyncio.run(run(args))
+    if report["saturation"] is None:
+        print("No saturation within the tested levels")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""Benchmark suite for the text and image detection hot paths
+
+Measures latency percentiles, throughput and peak RSS of the processor
+stages and explainers on synthetic corpora (short tweets to long articles,
+thumbnails to 24 MP photos, scenes with cartoon faces that drive the face
+detection, Xception and Grad-CAM path) and optional fixture directories. Results can
+be written as JSON and compared against a stored baseline.
+
+Run from the backend directory:
+
+    python -m benchmarks.run --suite text,image,explain --output results.json
+    python -m benchmarks.run --compare baseline.json --threshold 0.1
+
+Fixture directories hold subdirectories of files, each becoming one case:
+``--text-fixtures`` expects ``*.txt`` files and ``--image-fixtures`` expects
+images (e.g. ``faces_0/``, ``faces_1/``, ``faces_many/``).
+"""
+import argparse
+import platform
+import sys
+import time
+from typing import Dict, List
+
+import cv2
+
+from benchmarks import corpora
+from benchmarks.harness import compare, format_result, measure, save_results
+
+def text_cases(args) -> Dict[str, List[str]]:
+    cases = {size: corpora.synthetic_texts(size, args.count) for size in corpora.TEXT_SIZES}
+    if args.text_fixtures:
+        cases.update(corpora.load_fixture_texts(args.text_fixtures))
+    return cases
+
+def image_cases(args) -> Dict[str, List[bytes]]:
+    cases = {}
+    for size in corpora.IMAGE_SIZES:
+        # Very large images are expensive to generate and process; use fewer of them
+        count = max(1, args.count // 10) if size == "24mp" else max(1, args.count // 2)
+        cases[size] = corpora.synthetic_images(size, count)
+    for scene in corpora.FACE_SCENES:
+        cases[scene] = corpora.synthetic_face_images(scene, max(1, args.count // 2))
+    if args.image_fixtures:
+        cases.update(corpora.load_fixture_images(args.image_fixtures))
+    return cases
+
+def run_text_suite(args, results: List[Dict]):
+    from api.dependencies import get_text_processor
+    processor = get_text_processor()
+    
+    for case, texts in text_cases(args).items():
+        results.append(measure(f"text.preprocess_text[{case}]", processor.preprocess_text, texts, args.repeats))
+        results.append(measure(f"text.extract_features[{case}]", processor.extract_features, texts, args.repeats))
+        results.append(measure(f"text.predict[{case}]", processor.predict, texts, args.repeats))
+
+def run_image_suite(args, results: List[Dict]):
+    from api.dependencies import get_image_processor
+    processor = get_image_processor()
+    
+    for case, images in image_cases(args).items():
+        decoded = [processor.preprocess_image(corpora.UploadedFile(data)) for data in images]
+        if case in corpora.FACE_SCENES and not any(processor.detect_faces(img) for img in decoded):
+            print(f"  No faces detected in {case}; its predictions skip Xception", file=sys.stderr)
+        results.append(measure(f"image.preprocess_image[{case}]",
+                               lambda data: processor.preprocess_image(corpora.UploadedFile(data)), images, args.repeats))
+        results.append(measure(f"image.detect_faces[{case}]", processor.detect_faces, decoded, args.repeats))
+        results.append(measure(f"image.predict[{case}]",
+                               lambda data: processor.predict(corpora.UploadedFile(data)), images, args.repeats))
+    
+    for size in corpora.FACE_CROP_SIZES:
+        crops = corpora.synthetic_face_crops(size, args.count)
+        results.append(measure(f"image.analyze_face_artifacts[{size}]", processor.analyze_face_artifacts, crops, args.repeats))
+
+def run_explain_suite(args, results: List[Dict]):
+    from api.dependencies import get_text_processor, get_image_processor, get_text_explainer, get_image_explainer, get_token_explainer
+    text_processor = get_text_processor()
+    image_processor = get_image_processor()
+    text_explainer = get_text_explainer()
+    image_explainer = get_image_explainer()
+    token_explainer = get_token_explainer()
+    
+    for case, texts in text_cases(args).items():
+        predictions = [(text, text_processor.predict(text)) for text in texts]
+        results.append(measure(f"explain.text[{case}]",
+                               lambda pair: text_explainer.explain(pair[0], pair[1]), predictions, args.repeats))
+        results.append(measure(f"explain.word_cloud_render[{case}]", text_explainer._generate_word_cloud, texts, args.repeats))
+        
+        def attribute(text):
+            # Clear the cache so every call measures a full attribution
+            token_explainer._cache.clear()
+            return token_explainer.explain(text)
+        results.append(measure(f"explain.token_attributions[{case}]", attribute, texts[:max(1, args.count // 4)], 1))
+    
+    for case, images in image_cases(args).items():
+        predictions = [(data, image_processor.predict(corpora.UploadedFile(data))) for data in images]
+        results.append(measure(f"explain.image[{case}]",
+                               lambda pair: image_explainer.explain(corpora.UploadedFile(pair[0]), pair[1]),
+                               predictions, args.repeats))
+        results.append(measure(f"explain.heatmap_render[{case}]",
+                               lambda pair: image_explainer._generate_heatmap(pair[0], pair[1]["face_boxes"], pair[1]["saliency_maps"]),
+                               predictions, args.repeats))
+
+SUITES = {
+    "text": run_text_suite,
+    "image": run_image_suite,
+    "explain": run_explain_suite,
+}
+
+def main():
+    parser = argparse.ArgumentParser(description="Detection hot path benchmarks")
+    parser.add_argument('--suite', default="text,image,explain", help="Comma-separated suites: " + ",".join(SUITES))
+    parser.add_argument('--count', type=int, default=20, help="Inputs per synthetic case")
+    parser.add_argument('--repeats', type=int, default=3, help="Passes over each case")
+    parser.add_argument('--text-fixtures', help="Directory of text fixture subdirectories")
+    parser.add_argument('--image-fixtures', help="Directory of image fixture subdirectories")
+    parser.add_argument('--output', help="Write results as JSON to this path")
+    parser.add_argument('--compare', help="Baseline JSON to compare against")
+    parser.add_argument('--threshold', type=float, default=0.10, help="Allowed relative slowdown before flagging")
+    args = parser.parse_args()
+    
+    results: List[Dict] = []
+    for suite in args.suite.split(","):
+        suite = suite.strip()
+        if suite not in SUITES:
+            parser.error(f"Unknown suite: {suite}")
+        print(f"Running {suite} suite...")
+        start = len(results)
+        SUITES[suite](args, results)
+        for result in results[start:]:
+            print(format_result(result))
+    
+    if args.output:
+        save_results(results, args.output, {
+            "timestamp": time.time(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "opencv_threads": cv2.getNumThreads(),
+            "count": args.count,
+            "repeats": args.repeats,
+        })
+        print(f"Results written to {args.output}")
+    
+    if args.compare:
+        regressions = compare(results, args.compare, args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regression(s) over {args.threshold:.0%}:")
+            for r in regressions:
+                print(f"  {r['name']} {r['metric']}: {r['baseline']:.2f} -> {r['current']:.2f} ms ({r['change']:+.0%})")
+            sys.exit(1)
+        print("No regressions against baseline")
+
+if __name__ == "__main__":
+    main()
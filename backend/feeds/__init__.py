@@ -0,0 +1 @@
+# Feeds package initialization
@@ -0,0 +1,391 @@
+"""Long-running consumer that analyzes a live feed
+
+Reads records from a source (see ``feeds.sources``), drops duplicates,
+groups them into micro-batches and writes one verdict per record to a JSONL
+sink. A batch's texts are scored in batched forward passes, one model per
+language, and the batch's images are fetched concurrently and predicted in one call on the
+image inference pool, so per-item overhead is paid once per batch. Positions
+are checkpointed after each batch's verdicts are written, so a restart
+resumes after the last written batch (at-least-once delivery).
+
+Run from the backend directory:
+
+    python -m feeds.consumer --source file:data/feed.jsonl --sink data/verdicts.jsonl \\
+        --checkpoint data/feed.checkpoint.json
+    python -m feeds.consumer --source unix:/tmp/feed.sock --metrics-port 9100
+    python -m feeds.consumer --source spool:data/spool --batch-size 64 --max-wait-ms 200
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import signal
+import sys
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from api.dependencies import get_image_processor, get_text_processor
+from feeds.sources import FeedSource, open_source, parse_record
+from utils.analytics_store import get_analytics_store
+from utils.compute import get_inference_scheduler
+from utils.fetcher import FetchError, fetch_image
+from utils.metrics import observe_stage, record_feed_items, track_queue_depth
+
+class Checkpoint:
+    def __init__(self, path: Optional[str]):
+        """Persist the last committed source position as JSON (no-op without a path)"""
+        self.path = path
+
+    def load(self) -> Any:
+        if not self.path or not os.path.exists(self.path):
+            return None
+        try:
+            with open(self.path) as f:
+                return json.load(f).get("position")
+        except (OSError, ValueError) as e:
+            print(f"Checkpoint load failed: {e}", file=sys.stderr)
+            return None
+
+    def save(self, position: Any):
+        if not self.path or position is None:
+            return
+        # Write then rename so a crash never leaves a torn checkpoint
+        temporary = self.path + ".tmp"
+        with open(temporary, "w") as f:
+            json.dump({"position": position, "saved_at": time.time()}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, self.path)
+
+class JsonlSink:
+    def __init__(self, path: str = "-"):
+        """Append verdicts as JSON lines to ``path`` (``-`` for stdout)"""
+        self.path = path
+        if path == "-":
+            self._file = sys.stdout
+        else:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._file = open(path, "a", encoding="utf-8")
+
+    def write(self, verdicts: List[Dict]):
+        self._file.write("".join(json.dumps(verdict, default=str) + "\n" for verdict in verdicts))
+        self._file.flush()
+
+    def close(self):
+        if self._file is not sys.stdout:
+            self._file.close()
+
+class FeedConsumer:
+    def __init__(self, source: FeedSource, sink: JsonlSink, checkpoint: Optional[Checkpoint] = None,
+                 batch_size: int = 32, max_wait: float = 0.5, max_pending: int = 1000,
+                 dedupe_size: int = 100000, report_interval: float = 10.0, chunk_words: int = 300):
+        """Consume ``source`` in micro-batches and write verdicts to ``sink``
+
+        A batch closes at ``batch_size`` records or ``max_wait`` seconds after
+        its first record. At most ``max_pending`` records wait between the
+        source and the batcher; beyond that the source is paused
+        (backpressure). Records are deduplicated by their ``id`` or, without
+        one, by a hash of their text and image URL, remembering the last
+        ``dedupe_size`` keys.
+
+        Texts are scored by the model of the record's ``language`` or, when
+        it is missing or ``auto``, of the identified language. Texts longer
+        than ``chunk_words`` words are split into chunks that fit the
+        model's window and their scores averaged, rather than scoring only
+        the start of the text.
+        """
+        self.source = source
+        self.sink = sink
+        self.checkpoint = checkpoint or Checkpoint(None)
+        self.batch_size = batch_size
+        self.max_wait = max_wait
+        self.dedupe_size = dedupe_size
+        self.report_interval = report_interval
+        self.chunk_words = chunk_words
+        self.stats = {"consumed": 0, "duplicate": 0, "malformed": 0, "analyzed": 0, "failed": 0, "batches": 0}
+        self._queue: "asyncio.Queue[Tuple[bytes, Any]]" = asyncio.Queue(maxsize=max_pending)
+        self._seen: "OrderedDict[str, None]" = OrderedDict()
+        self._stopping = asyncio.Event()
+        track_queue_depth("feed_items", self._queue.qsize)
+
+    async def _emit(self, line: bytes, position: Any):
+        await self._queue.put((line, position))
+
+    def stop(self):
+        """Stop reading; records already queued are still analyzed and checkpointed"""
+        self._stopping.set()
+
+    async def run(self):
+        reader = asyncio.ensure_future(self.source.run(self._emit, self.checkpoint.load()))
+        stopping = asyncio.ensure_future(self._stopping.wait())
+        reporter = asyncio.ensure_future(self._report())
+        try:
+            while True:
+                if stopping.done() and not reader.done():
+                    reader.cancel()
+                batch = await self._next_batch(reader, stopping)
+                if not batch:
+                    break
+                await self._process(batch)
+        finally:
+            for task in (reader, stopping, reporter):
+                task.cancel()
+            self._print_stats()
+        if reader.done() and not reader.cancelled() and reader.exception() is not None:
+            # A source that fails (e.g. cannot bind its socket) ends the consumer with its error
+            raise reader.exception()
+
+    async def _next_batch(self, reader: asyncio.Future, stopping: asyncio.Future) -> List[Tuple[bytes, Any]]:
+        """Wait for a first record, then collect more until the batch is full or ``max_wait`` passes"""
+        batch = []
+        while not batch:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                break
+            if reader.done() or stopping.done():
+                return []
+            getter = asyncio.ensure_future(self._queue.get())
+            await asyncio.wait({getter, reader, stopping}, return_when=asyncio.FIRST_COMPLETED)
+            if getter.done():
+                batch.append(getter.result())
+            else:
+                getter.cancel()
+
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.batch_size:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0 or reader.done() or stopping.done():
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    def _is_duplicate(self, record: Dict) -> bool:
+        key = record.get("id")
+        if key is None:
+            content = f"{record.get('text') or ''}\0{record.get('image_url') or ''}"
+            key = hashlib.sha1(content.encode("utf-8")).hexdigest()
+        key = str(key)
+        if key in self._seen:
+            self._seen.move_to_end(key)
+            return True
+        self._seen[key] = None
+        if len(self._seen) > self.dedupe_size:
+            self._seen.popitem(last=False)
+        return False
+
+    async def _process(self, batch: List[Tuple[bytes, Any]]):
+        start = time.perf_counter()
+        records = []
+        malformed = duplicates = 0
+        for line, _ in batch:
+            try:
+                record = parse_record(line)
+            except ValueError:
+                malformed += 1
+                continue
+            if record is None or not (record.get("text") or record.get("image_url")) or \
+                    not all(isinstance(record.get(key) or "", str) for key in ("text", "image_url")):
+                malformed += 1
+            elif self._is_duplicate(record):
+                duplicates += 1
+            else:
+                records.append(record)
+
+        text_verdicts, image_verdicts = await asyncio.gather(
+            self._score_texts([record for record in records if record.get("text")]),
+            self._score_images([record["image_url"] for record in records if record.get("image_url")])
+        )
+        text_verdicts, image_verdicts = iter(text_verdicts), iter(image_verdicts)
+
+        verdicts = []
+        store = get_analytics_store()
+        failed = 0
+        for record in records:
+            verdict = {"id": record.get("id"), "received_at": time.time()}
+            for key in ("url", "source", "published"):
+                if key in record:
+                    verdict[key] = record[key]
+            if record.get("text"):
+                verdict["text"] = next(text_verdicts)
+                if "error" not in verdict["text"]:
+                    store.record("text", verdict["text"]["is_fake"], verdict["text"]["confidence"],
+                                 verdict["text"]["processing_time"])
+            if record.get("image_url"):
+                verdict["image"] = next(image_verdicts)
+                if "error" not in verdict["image"]:
+                    store.record("image", verdict["image"]["is_deepfake"], verdict["image"]["confidence"],
+                                 verdict["image"]["processing_time"], verdict["image"]["face_count"])
+            results = [verdict[key] for key in ("text", "image") if key in verdict]
+            if any("error" in result for result in results):
+                failed += 1
+            verdict["is_manipulated"] = any(result.get("is_fake") or result.get("is_deepfake") for result in results)
+            verdicts.append(verdict)
+
+        # Write verdicts before checkpointing so a crash replays the batch rather than losing it
+        if verdicts:
+            self.sink.write(verdicts)
+        for _, position in batch:
+            self.source.commit(position)
+        self.checkpoint.save(batch[-1][1])
+
+        observe_stage("feed_batch", time.perf_counter() - start)
+        self._count("consumed", len(batch))
+        self._count("malformed", malformed)
+        self._count("duplicate", duplicates)
+        self._count("analyzed", len(verdicts) - failed)
+        self._count("failed", failed)
+        self.stats["batches"] += 1
+
+    def _count(self, outcome: str, count: int):
+        self.stats[outcome] += count
+        record_feed_items(outcome, count)
+
+    async def _score_texts(self, records: List[Dict]) -> List[Dict]:
+        """Score the texts of a batch's records on the text inference pool"""
+        if not records:
+            return []
+        items = [(record["text"], record.get("language") if isinstance(record.get("language"), str) else None)
+                 for record in records]
+        start = time.perf_counter()
+        try:
+            scored = await get_inference_scheduler().run_text(self._score_text_items, items)
+        except Exception as e:
+            print(f"Feed text batch failed: {e}", file=sys.stderr)
+            return [{"error": str(e)} for _ in records]
+        # Attribute the batch time evenly so per-item processing times stay comparable to the API
+        processing_time = (time.perf_counter() - start) / len(records)
+        return [{
+            "is_fake": bool(score > 0.5),
+            "confidence": float(score if score > 0.5 else 1 - score),
+            "fake_score": float(score),
+            "language": language,
+            "chunk_count": chunk_count,
+            "processing_time": processing_time
+        } for score, language, chunk_count in scored]
+
+    def _score_text_items(self, items: List[Tuple[str, Optional[str]]]) -> List[Tuple[float, str, int]]:
+        """Fake score, language and chunk count of each (text, requested language) item
+
+        Chunks are grouped by language and scored in batches of the
+        processor's ``sentence_batch_size``; a text's score is the mean of
+        its chunks' scores weighted by their word counts.
+        """
+        processor = get_text_processor()
+        languages = []
+        groups: Dict[str, List[Tuple[int, str]]] = {}
+        for index, (text, requested) in enumerate(items):
+            language, _ = processor.detect_language(text, requested)
+            languages.append(language)
+            words = text.split()
+            chunks = [' '.join(words[offset:offset + self.chunk_words])
+                      for offset in range(0, len(words), self.chunk_words)] or [text]
+            groups.setdefault(language, []).extend((index, chunk) for chunk in chunks)
+
+        totals = [0.0] * len(items)
+        weights = [0] * len(items)
+        chunk_counts = [0] * len(items)
+        for language, chunks in groups.items():
+            for offset in range(0, len(chunks), processor.sentence_batch_size):
+                batch = chunks[offset:offset + processor.sentence_batch_size]
+                scores = processor.score_texts([chunk for _, chunk in batch], language)["scores"]
+                for (index, chunk), score in zip(batch, scores):
+                    weight = max(1, len(chunk.split()))
+                    totals[index] += float(score) * weight
+                    weights[index] += weight
+                    chunk_counts[index] += 1
+        return [(totals[i] / weights[i], languages[i], chunk_counts[i]) for i in range(len(items))]
+
+    async def _score_images(self, urls: List[str]) -> List[Dict]:
+        """Fetch a batch's images concurrently, then predict them in one call on the image inference pool"""
+        if not urls:
+            return []
+        fetched = await asyncio.gather(*(fetch_image(url) for url in urls), return_exceptions=True)
+        files = [item[0] for item in fetched if not isinstance(item, BaseException)]
+
+        def predict_all() -> List:
+            processor = get_image_processor()
+            results = []
+            for image_file in files:
+                try:
+                    results.append(processor.predict(image_file))
+                except Exception as e:
+                    results.append(e)
+            return results
+
+        predictions = iter(await get_inference_scheduler().run_image(predict_all) if files else [])
+        verdicts = []
+        for item in fetched:
+            outcome = item if isinstance(item, BaseException) else next(predictions)
+            if isinstance(outcome, BaseException):
+                status = outcome.status_code if isinstance(outcome, FetchError) else None
+                verdicts.append({"error": str(outcome), "status_code": status})
+                continue
+            verdicts.append({key: outcome[key] for key in
+                             ("is_deepfake", "confidence", "deepfake_score", "face_count", "processing_time")})
+        return verdicts
+
+    async def _report(self):
+        """Print throughput and queue depth every ``report_interval`` seconds"""
+        last_consumed, last_time = 0, time.perf_counter()
+        while True:
+            await asyncio.sleep(self.report_interval)
+            now = time.perf_counter()
+            rate = (self.stats["consumed"] - last_consumed) / (now - last_time)
+            last_consumed, last_time = self.stats["consumed"], now
+            print(f"Feed consumer: {rate:.1f} items/s, {self._queue.qsize()} queued, "
+                  f"{self.stats['analyzed']} analyzed, {self.stats['duplicate']} duplicates, "
+                  f"{self.stats['failed']} failed", file=sys.stderr)
+
+    def _print_stats(self):
+        print(f"Feed consumer stopped: {json.dumps(self.stats)}", file=sys.stderr)
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyze a live feed in micro-batches")
+    parser.add_argument('--source', required=True, help="file:PATH (tail a JSONL file), unix:PATH (socket) or spool:DIR")
+    parser.add_argument('--sink', default="-", help="JSONL file for verdicts, - for stdout")
+    parser.add_argument('--checkpoint', help="File for the committed source position (resume after restart)")
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--max-wait-ms', type=float, default=500.0, help="Longest a record waits for its batch to fill")
+    parser.add_argument('--max-pending', type=int, default=1000, help="Records buffered before the source is paused")
+    parser.add_argument('--dedupe-size', type=int, default=100000, help="Recent record keys remembered for deduplication")
+    parser.add_argument('--report-interval', type=float, default=10.0, help="Seconds between throughput reports")
+    parser.add_argument('--chunk-words', type=int, default=300, help="Longer texts are scored in chunks of this many words")
+    parser.add_argument('--metrics-port', type=int, default=0, help="Serve Prometheus metrics on this port; 0 disables")
+    args = parser.parse_args()
+
+    if args.metrics_port:
+        from prometheus_client import start_http_server
+        start_http_server(args.metrics_port)
+
+    async def consume():
+        sink = JsonlSink(args.sink)
+        consumer = FeedConsumer(
+            open_source(args.source), sink, Checkpoint(args.checkpoint),
+            batch_size=args.batch_size, max_wait=args.max_wait_ms / 1000, max_pending=args.max_pending,
+            dedupe_size=args.dedupe_size, report_interval=args.report_interval, chunk_words=args.chunk_words
+        )
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, consumer.stop)
+        try:
+            await consumer.run()
+        finally:
+            sink.close()
+            get_analytics_store().close()
+            from utils.fetcher import get_url_fetcher
+            await get_url_fetcher().aclose()
+
+    asyncio.run(consume())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""Feed sources for the streaming consumer
+
+A source reads raw lines and hands each one to ``emit(line, position)``.
+``emit`` waits while the consumer's queue is full, so a slow consumer stops
+the source from reading instead of buffering without bound: a tailed file is
+simply read later, and a socket producer blocks once the kernel buffers
+fill. ``position`` is what the consumer checkpoints once the line's
+verdict is written; lines are parsed by the consumer, so malformed ones are
+checkpointed past like any other. ``commit`` is called with the position
+of every line whose verdict was written, so sources that acknowledge
+consumed data (the spool queue) can do so.
+
+Records are JSON objects, one per line (``{"id": ..., "text": ...,
+"image_url": ...}``); a line that is not JSON is taken as plain text.
+"""
+import asyncio
+import json
+import os
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+Emit = Callable[[bytes, Any], Awaitable[None]]
+
+def parse_record(line: bytes) -> Optional[Dict]:
+    """Decode one feed line; returns None for blank lines and raises ValueError for malformed JSON"""
+    line = line.strip()
+    if not line:
+        return None
+    if line.startswith(b"{"):
+        record = json.loads(line)
+        if not isinstance(record, dict):
+            raise ValueError("Feed record must be a JSON object")
+        return record
+    return {"text": line.decode("utf-8", errors="replace")}
+
+class FeedSource:
+    """Base class: ``run`` reads until cancelled or exhausted"""
+
+    async def run(self, emit: Emit, position: Any = None):
+        raise NotImplementedError
+
+    def commit(self, position: Any):
+        pass
+
+class FileTailSource(FeedSource):
+    def __init__(self, path: str, poll_interval: float = 0.5, follow: bool = True):
+        """Follow a JSONL file like ``tail -F``, resuming from a byte offset
+
+        Only complete lines are emitted; a partially written last line is
+        read again once its newline arrives. If the file is replaced or
+        truncated (log rotation), reading restarts at the beginning of the
+        new file. With ``follow`` disabled, ``run`` returns at end of file.
+        """
+        self.path = path
+        self.poll_interval = poll_interval
+        self.follow = follow
+
+    async def run(self, emit: Emit, position: Any = None):
+        offset = int(position or 0)
+        while True:
+            try:
+                f = open(self.path, "rb")
+            except FileNotFoundError:
+                if not self.follow:
+                    return
+                await asyncio.sleep(self.poll_interval)
+                continue
+
+            with f:
+                inode = os.fstat(f.fileno()).st_ino
+                if os.fstat(f.fileno()).st_size < offset:
+                    offset = 0
+                f.seek(offset)
+                while True:
+                    line = f.readline()
+                    if line.endswith(b"\n"):
+                        offset += len(line)
+                        await emit(line, offset)
+                        continue
+
+                    # At end of file (or mid-line): rewind the partial line and wait for more
+                    f.seek(offset)
+                    if not self.follow:
+                        return
+                    await asyncio.sleep(self.poll_interval)
+                    try:
+                        current = os.stat(self.path)
+                    except FileNotFoundError:
+                        current = None
+                    if current is None or current.st_ino != inode or current.st_size < offset:
+                        offset = 0
+                        break
+
+class UnixSocketSource(FeedSource):
+    def __init__(self, path: str):
+        """Accept producers on a Unix domain socket, one JSONL record per line
+
+        Several producers may connect at once. Records are not replayable,
+        so positions are not checkpointed; a producer that outpaces the
+        consumer blocks on its socket writes.
+        """
+        self.path = path
+
+    async def run(self, emit: Emit, position: Any = None):
+        async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+            try:
+                while True:
+                    line = await reader.readline()
+                    if not line:
+                        break
+                    await emit(line, None)
+            finally:
+                writer.close()
+
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        server = await asyncio.start_unix_server(handle, path=self.path)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+
+class SpoolSource(FeedSource):
+    def __init__(self, directory: str, poll_interval: float = 0.5):
+        """A local stand-in for a message queue backed by a spool directory
+
+        Producers publish by writing a ``*.jsonl`` file under another name and
+        renaming it into the directory, so the consumer never sees a partial
+        file. Files are consumed in name order and deleted once every record
+        in them is committed, which acknowledges them. The position is the
+        file name and line number, so a restart skips records already
+        committed from a file that was not yet deleted.
+        """
+        self.directory = directory
+        self.poll_interval = poll_interval
+        os.makedirs(directory, exist_ok=True)
+
+    async def run(self, emit: Emit, position: Any = None):
+        committed = dict(position) if position else {}
+        while True:
+            names = sorted(name for name in os.listdir(self.directory) if name.endswith(".jsonl"))
+            names = [name for name in names if not committed or name >= committed["file"]]
+            if not names:
+                await asyncio.sleep(self.poll_interval)
+                continue
+
+            for name in names:
+                path = os.path.join(self.directory, name)
+                try:
+                    with open(path, "rb") as f:
+                        lines = f.readlines()
+                except FileNotFoundError:
+                    continue
+                skip = committed.get("line", 0) if committed.get("file") == name else 0
+                for number, line in enumerate(lines, start=1):
+                    if number <= skip:
+                        continue
+                    await emit(line, {"file": name, "line": number, "last": number == len(lines)})
+                if skip >= len(lines):
+                    # Fully committed before a restart but not yet acknowledged
+                    self.commit({"file": name, "line": skip, "last": True})
+                committed = {"file": name, "line": len(lines)}
+            # Wait for the consumer to acknowledge before listing again
+            while any(os.path.exists(os.path.join(self.directory, name)) for name in names):
+                await asyncio.sleep(self.poll_interval)
+            committed = {}
+
+    def commit(self, position: Any):
+        if position and position.get("last"):
+            try:
+                os.unlink(os.path.join(self.directory, position["file"]))
+            except FileNotFoundError:
+                pass
+
+def open_source(spec: str) -> FeedSource:
+    """Create a source from ``file:PATH``, ``unix:PATH`` or ``spool:DIR``"""
+    kind, _, target = spec.partition(":")
+    if not target:
+        raise ValueError(f"Source must look like file:PATH, unix:PATH or spool:DIR, got {spec!r}")
+    if kind == "file":
+        return FileTailSource(target)
+    if kind == "unix":
+        return UnixSocketSource(target)
+    if kind == "spool":
+        return SpoolSource(target)
+    raise ValueError(f"Unknown source type {kind!r}")
@@ -0,0 +1,124 @@
+"""Production serving configuration
+
+Run from the backend directory:
+
+    gunicorn -c gunicorn.conf.py main:app
+
+The app and the models listed in ``SERVE_PRELOAD`` are loaded once in the
+master process before workers are forked, so the weights are shared
+copy-on-write instead of being loaded once per worker. Workers and their
+thread pools are sized so that ``workers * threads`` matches the cores
+available to the container, avoiding oversubscription.
+
+Environment:
+
+* ``SERVE_BIND`` (default ``0.0.0.0:8000``)
+* ``SERVE_THREADS_PER_WORKER``: intra-op threads per worker (default 2)
+* ``SERVE_WORKERS``: worker count (default cores // threads per worker)
+* ``SERVE_PRELOAD``: comma-separated models to load in the master
+  (default ``text``). The TensorFlow runtime is not fork-safe once
+  started, so the image model is loaded in each worker after the fork.
+* ``SERVE_MEMORY_REPORT_INTERVAL``: seconds between per-worker memory
+  reports (default 60, 0 disables), printed by a separate process so the
+  master runs no threads across forks
+* ``SERVE_SHARED_DIR``: directory for state every worker must see
+  (default a temporary directory removed on shutdown). Prometheus
+  metrics (``PROMETHEUS_MULTIPROC_DIR``), rendered visualizations
+  (``VISUALIZATION_DIR``) and request profiles (``PROFILING_STORE_DIR``)
+  go in subdirectories unless those variables are set.
+"""
+import gc
+import glob
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+# The config is executed before the app is imported; make the backend modules importable
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Workers only share what is on disk. This must be set up before prometheus_client is imported,
+# which picks its multiprocess mode from the environment at import time.
+shared_dir = os.getenv("SERVE_SHARED_DIR") or tempfile.mkdtemp(prefix="detection-serve-")
+for name, subdirectory in (("PROMETHEUS_MULTIPROC_DIR", "metrics"), ("VISUALIZATION_DIR", "visualizations"),
+                           ("PROFILING_STORE_DIR", "profiles")):
+    os.makedirs(os.environ.setdefault(name, os.path.join(shared_dir, subdirectory)), exist_ok=True)
+# Metric files of a previous run would be added to this one's
+for path in glob.glob(os.path.join(os.environ["PROMETHEUS_MULTIPROC_DIR"], "*.db")):
+    os.remove(path)
+
+from prometheus_client import multiprocess
+from utils.compute import ComputeConfig, available_cores, get_inference_scheduler, report_memory, set_thread_env
+
+cores = available_cores()
+threads_per_worker = max(1, int(os.getenv("SERVE_THREADS_PER_WORKER", "2")))
+threads_per_worker = min(threads_per_worker, cores)
+
+bind = os.getenv("SERVE_BIND", "0.0.0.0:8000")
+workers = int(os.getenv("SERVE_WORKERS", "0")) or max(1, cores // threads_per_worker)
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+# Model passes on large inputs can take a while; keep slow requests from being killed
+timeout = 120
+graceful_timeout = 30
+keepalive = 5
+
+preload = [m.strip() for m in os.getenv("SERVE_PRELOAD", "text").split(",") if m.strip()]
+memory_report_interval = float(os.getenv("SERVE_MEMORY_REPORT_INTERVAL", "60"))
+
+# Thread pools read these when the frameworks are first imported, which happens
+# when the app is preloaded right after this file is executed
+set_thread_env(threads_per_worker)
+# Each worker partitions its share of the cores between text and image inference
+os.environ.setdefault("COMPUTE_CORES", str(threads_per_worker))
+
+def when_ready(server):
+    """Load models in the master, then freeze the heap so forks share it"""
+    from api.dependencies import preload_models
+
+    # Avoid collections touching (and so copying) shared pages before the fork
+    gc.disable()
+    start = time.perf_counter()
+    # TensorFlow rejects thread settings once a model has initialized it
+    ComputeConfig.from_env().apply()
+    preload_models([m for m in preload if m in ("text", "image")])
+    gc.freeze()
+
+    server.log.info(
+        f"Preloaded {preload or 'no models'} in {time.perf_counter() - start:.1f}s; "
+        f"{workers} workers x {threads_per_worker} threads on {cores} cores"
+    )
+
+    if memory_report_interval > 0:
+        # A spawned process rather than a thread: a master thread holding a lock (e.g. logging's)
+        # at fork time would leave it locked forever in the worker
+        multiprocessing.get_context("spawn").Process(
+            target=report_memory, args=(os.getpid(), memory_report_interval), name="memory-report", daemon=True
+        ).start()
+
+def post_fork(server, worker):
+    gc.enable()
+    ComputeConfig.from_env().apply()
+
+def post_worker_init(worker):
+    """Load the models that were not preloaded so the first request is not a cold start"""
+    from api.dependencies import preload_models
+
+    # Inference pools are created per worker (threads do not survive the fork),
+    # and before the remaining models so their thread limits apply
+    get_inference_scheduler()
+    remaining = [m for m in ("text", "image") if m not in preload]
+    try:
+        preload_models(remaining)
+    except Exception as e:
+        worker.log.warning(f"Model warm-up failed: {e}")
+
+def child_exit(server, worker):
+    """Drop the exited worker's live gauges from the aggregated metrics"""
+    multiprocess.mark_process_dead(worker.pid)
+
+def on_exit(server):
+    if not os.getenv("SERVE_SHARED_DIR"):
+        shutil.rmtree(shared_dir, ignore_errors=True)
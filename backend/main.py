@@ -1,9 +1,16 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 import uvicorn
-from api.routes import text_detection, image_detection, analysis
+from prometheus_client import CONTENT_TYPE_LATEST
+from api.routes import text_detection, image_detection, analysis, explanations, profiles
+from utils.metrics import REQUESTS, REQUEST_ERRORS, REQUEST_LATENCY, collect_metrics
+from utils.profiling import get_request_profiler
+from utils.compute import get_inference_scheduler
+from utils.model_manager import get_model_manager
+import json
 import os
+import time
 
 app = FastAPI(
     title="Fake News & Deepfake Detection API",
@@ -22,10 +29,73 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    start_time = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # Label by route template (e.g. /api/explanations/{visualization_id}) to bound cardinality
+        route = request.scope.get("route")
+        path = route.path if route is not None else "unmatched"
+        REQUEST_LATENCY.labels(request.method, path).observe(time.perf_counter() - start_time)
+        REQUESTS.labels(request.method, path, str(status)).inc()
+        if status >= 500:
+            REQUEST_ERRORS.labels(request.method, path).inc()
+
+@app.middleware("http")
+async def profile_request(request: Request, call_next):
+    profiler = get_request_profiler()
+    session = profiler.session_for(request.headers, request.query_params, f"{request.method} {request.url.path}")
+    if session is None:
+        return await call_next(request)
+    
+    with session:
+        response = await call_next(request)
+        # Drain the body inside the session so streamed work is profiled too
+        body = b"".join([chunk async for chunk in response.body_iterator])
+    
+    record = profiler.finish(session, {"http.method": request.method, "http.route": request.url.path,
+                                       "http.status_code": response.status_code})
+    headers = {k: v for k, v in response.headers.items() if k.lower() != "content-length"}
+    headers["X-Profile-Id"] = record["id"]
+    
+    # Inline the profile into JSON object responses when asked to
+    inline = request.headers.get("x-profile-inline") == "1" and not session.sampled
+    if inline and headers.get("content-type", "").startswith("application/json"):
+        try:
+            payload = json.loads(body)
+            if isinstance(payload, dict):
+                payload["_profile"] = {k: record[k] for k in ("id", "mode", "tree", "call_profile")}
+                body = json.dumps(payload, default=str).encode()
+        except ValueError:
+            pass
+    
+    return Response(content=body, status_code=response.status_code, headers=headers)
+
 # Include API routes
 app.include_router(text_detection.router, prefix="/api/text", tags=["Text Detection"])
 app.include_router(image_detection.router, prefix="/api/image", tags=["Image Detection"])
 app.include_router(analysis.router, prefix="/api/analysis", tags=["Analysis"])
+app.include_router(explanations.router, prefix="/api/explanations", tags=["Explanations"])
+app.include_router(profiles.router, prefix="/api/profiles", tags=["Profiling"])
+
+@app.on_event("startup")
+async def startup():
+    # Thread limits only take effect before TensorFlow initializes, so apply them before any model loads
+    get_inference_scheduler()
+
+@app.on_event("shutdown")
+async def shutdown():
+    # Write queued analytics events before exiting
+    from utils.analytics_store import get_analytics_store
+    get_analytics_store().close()
+    
+    from utils.fetcher import get_url_fetcher
+    await get_url_fetcher().aclose()
 
 # Health check endpoint
 @app.get("/")
@@ -36,10 +106,24 @@ async def root():
         "version": "1.0.0"
     }
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return Response(content=collect_metrics(), media_type=CONTENT_TYPE_LATEST)
+
 @app.get("/health")
 async def health_check():
     return {"status": "healthy", "message": "API is running"}
 
+@app.get("/health/compute")
+async def compute_configuration():
+    """Core partition between text and image inference and the thread limits in effect"""
+    return get_inference_scheduler().config.describe()
+
+@app.get("/health/models")
+async def model_memory():
+    """Resident models against the memory budget, with recent load, restore and eviction events"""
+    return get_model_manager().describe()
+
 if __name__ == "__main__":
     uvicorn.run(
         "main:app",
@@ -0,0 +1,288 @@
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional
+from utils.metrics import track_queue_depth
+
+# Rollup granularities and their bucket width in seconds ("all" is a single bucket)
+GRANULARITIES = {
+    "minute": 60,
+    "hour": 3600,
+    "day": 86400,
+    "all": None,
+}
+
+# Number of equal-width confidence histogram bins over [0, 1]
+HISTOGRAM_BINS = 10
+
+# Minute buckets are only kept for this long
+MINUTE_RETENTION = 2 * 86400
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    kind TEXT NOT NULL,
+    flagged INTEGER NOT NULL,
+    confidence REAL NOT NULL,
+    processing_time REAL NOT NULL,
+    faces INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS rollups (
+    granularity TEXT NOT NULL,
+    bucket INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    total INTEGER NOT NULL,
+    flagged INTEGER NOT NULL,
+    confidence_sum REAL NOT NULL,
+    processing_time_sum REAL NOT NULL,
+    faces INTEGER NOT NULL,
+    PRIMARY KEY (granularity, kind, bucket)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS confidence_histogram (
+    granularity TEXT NOT NULL,
+    bucket INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    bin INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (granularity, kind, bucket, bin)
+) WITHOUT ROWID;
+"""
+
+class AnalyticsStore:
+    def __init__(self, path: str, batch_size: int = 512, flush_interval: float = 1.0, max_queue: int = 100000,
+                 busy_timeout: float = 5.0, write_attempts: int = 5, retry_backoff: float = 0.1):
+        """Persist detection events to SQLite (WAL) with incrementally maintained rollups
+
+        ``record`` only enqueues the event; a background thread writes
+        events in batches and, in the same transaction, adds them to
+        per-minute/hour/day/all-time counters and confidence histograms.
+        Dashboard queries read the rollups, so their cost depends on the
+        number of buckets requested rather than the number of events.
+        
+        Every worker process runs its own writer, so connections wait up to
+        ``busy_timeout`` seconds for another writer's lock, and a batch that
+        still hits a locked database is retried ``write_attempts`` times
+        with exponential backoff from ``retry_backoff`` seconds.
+        """
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self.write_attempts = write_attempts
+        self.retry_backoff = retry_backoff
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_queue)
+        self._stop = threading.Event()
+        self._flushed = threading.Condition()
+        self._enqueued = 0
+        self._written = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        connection = self._connect()
+        connection.executescript(SCHEMA)
+        connection.close()
+
+        self._writer = threading.Thread(target=self._run, name="analytics-writer", daemon=True)
+        self._writer.start()
+        track_queue_depth("analytics_events", self._queue.qsize)
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, timeout=self.busy_timeout, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def record(self, kind: str, flagged: bool, confidence: float, processing_time: float,
+               faces: int = 0, timestamp: Optional[float] = None):
+        """Queue a detection event without blocking; drops it if the queue is full"""
+        event = (
+            time.time() if timestamp is None else timestamp,
+            kind, int(bool(flagged)), float(confidence), float(processing_time), int(faces)
+        )
+        try:
+            self._queue.put_nowait(event)
+            self._enqueued += 1
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        """Writer loop: drain the queue in batches until stopped"""
+        connection = self._connect()
+        last_prune = 0.0
+        while not (self._stop.is_set() and self._queue.empty()):
+            batch = []
+            try:
+                batch.append(self._queue.get(timeout=self.flush_interval))
+                while len(batch) < self.batch_size:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                pass
+
+            if batch:
+                self._write_with_retry(connection, batch)
+
+            if time.time() - last_prune > 3600:
+                last_prune = time.time()
+                try:
+                    self._prune(connection)
+                except sqlite3.Error as e:
+                    print(f"Analytics pruning failed: {e}")
+
+            with self._flushed:
+                self._written += len(batch)
+                self._flushed.notify_all()
+        connection.close()
+
+    def _write_with_retry(self, connection: sqlite3.Connection, batch: List[tuple]):
+        """Write a batch, backing off and retrying while other workers hold the database lock"""
+        for attempt in range(self.write_attempts):
+            try:
+                self._write_batch(connection, batch)
+                return
+            except sqlite3.OperationalError as e:
+                if "locked" not in str(e) and "busy" not in str(e):
+                    print(f"Analytics write failed: {e}")
+                    break
+                if attempt + 1 == self.write_attempts:
+                    print(f"Analytics write failed after {self.write_attempts} attempts: {e}")
+                    break
+                time.sleep(self.retry_backoff * 2 ** attempt)
+            except sqlite3.Error as e:
+                print(f"Analytics write failed: {e}")
+                break
+        self.dropped += len(batch)
+
+    def _write_batch(self, connection: sqlite3.Connection, batch: List[tuple]):
+        """Insert events and apply their rollup increments in one transaction"""
+        counters = defaultdict(lambda: [0, 0, 0.0, 0.0, 0])
+        histogram = defaultdict(int)
+        for ts, kind, flagged, confidence, processing_time, faces in batch:
+            confidence_bin = min(int(confidence * HISTOGRAM_BINS), HISTOGRAM_BINS - 1)
+            for granularity, width in GRANULARITIES.items():
+                bucket = int(ts // width) * width if width else 0
+                counter = counters[(granularity, bucket, kind)]
+                counter[0] += 1
+                counter[1] += flagged
+                counter[2] += confidence
+                counter[3] += processing_time
+                counter[4] += faces
+                histogram[(granularity, bucket, kind, confidence_bin)] += 1
+
+        with connection:
+            connection.executemany(
+                "INSERT INTO events (ts, kind, flagged, confidence, processing_time, faces) VALUES (?, ?, ?, ?, ?, ?)",
+                batch
+            )
+            connection.executemany(
+                """INSERT INTO rollups VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                   ON CONFLICT (granularity, kind, bucket) DO UPDATE SET
+                       total = total + excluded.total,
+                       flagged = flagged + excluded.flagged,
+                       confidence_sum = confidence_sum + excluded.confidence_sum,
+                       processing_time_sum = processing_time_sum + excluded.processing_time_sum,
+                       faces = faces + excluded.faces""",
+                [key + tuple(values) for key, values in counters.items()]
+            )
+            connection.executemany(
+                """INSERT INTO confidence_histogram VALUES (?, ?, ?, ?, ?)
+                   ON CONFLICT (granularity, kind, bucket, bin) DO UPDATE SET count = count + excluded.count""",
+                [key + (count,) for key, count in histogram.items()]
+            )
+
+    def _prune(self, connection: sqlite3.Connection):
+        """Drop minute-level buckets older than the retention window"""
+        cutoff = time.time() - MINUTE_RETENTION
+        with connection:
+            connection.execute("DELETE FROM rollups WHERE granularity = 'minute' AND bucket < ?", (cutoff,))
+            connection.execute("DELETE FROM confidence_histogram WHERE granularity = 'minute' AND bucket < ?", (cutoff,))
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Wait until every event queued so far has been written"""
+        target = self._enqueued
+        deadline = time.time() + timeout
+        with self._flushed:
+            while self._written < target:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return False
+                self._flushed.wait(remaining)
+        return True
+
+    def close(self):
+        """Write any queued events and stop the writer thread"""
+        self._stop.set()
+        self._writer.join()
+
+    def _query(self, sql: str, params: tuple = ()) -> List[sqlite3.Row]:
+        connection = sqlite3.connect(self.path, timeout=self.busy_timeout)
+        connection.row_factory = sqlite3.Row
+        try:
+            return connection.execute(sql, params).fetchall()
+        finally:
+            connection.close()
+
+    def totals(self) -> Dict[str, Dict]:
+        """All-time counters per kind"""
+        rows = self._query("SELECT * FROM rollups WHERE granularity = 'all'")
+        return {row["kind"]: self._summarize(row) for row in rows}
+
+    def series(self, granularity: str, buckets: int, kind: Optional[str] = None) -> List[Dict]:
+        """Counters for the most recent ``buckets`` buckets of a granularity, oldest first"""
+        width = GRANULARITIES.get(granularity)
+        if width is None:
+            raise ValueError(f"Unsupported granularity for series: {granularity}")
+        start = (int(time.time() // width) - buckets + 1) * width
+        sql = "SELECT * FROM rollups WHERE granularity = ? AND bucket >= ?"
+        params: tuple = (granularity, start)
+        if kind is not None:
+            sql += " AND kind = ?"
+            params += (kind,)
+        rows = self._query(sql + " ORDER BY bucket", params)
+        return [dict(self._summarize(row), bucket=row["bucket"], kind=row["kind"]) for row in rows]
+
+    def confidence_histogram(self, granularity: str = "all", kind: Optional[str] = None) -> List[int]:
+        """Confidence histogram summed over the buckets of a granularity"""
+        sql = "SELECT bin, SUM(count) AS count FROM confidence_histogram WHERE granularity = ?"
+        params: tuple = (granularity,)
+        if kind is not None:
+            sql += " AND kind = ?"
+            params += (kind,)
+        counts = [0] * HISTOGRAM_BINS
+        for row in self._query(sql + " GROUP BY bin", params):
+            counts[row["bin"]] = row["count"]
+        return counts
+
+    def recent_events(self, limit: int = 10) -> List[Dict]:
+        """Most recent raw events"""
+        rows = self._query("SELECT * FROM events ORDER BY id DESC LIMIT ?", (limit,))
+        return [dict(row) for row in rows]
+
+    @staticmethod
+    def _summarize(row: sqlite3.Row) -> Dict:
+        total = row["total"]
+        return {
+            "total": total,
+            "flagged": row["flagged"],
+            "faces": row["faces"],
+            "average_confidence": row["confidence_sum"] / total if total else 0.0,
+            "average_processing_time": row["processing_time_sum"] / total if total else 0.0,
+        }
+
+_store: Optional[AnalyticsStore] = None
+_store_lock = threading.Lock()
+
+def get_analytics_store() -> AnalyticsStore:
+    """Return the process-wide analytics store"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = AnalyticsStore(os.getenv("ANALYTICS_DB_PATH", os.path.join("data", "analytics.db")))
+    return _store
@@ -0,0 +1,267 @@
+import asyncio
+import codecs
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from html.parser import HTMLParser
+from typing import Dict, List, Optional
+from urllib.parse import urljoin
+from utils.fetcher import URLFetcher, get_url_fetcher
+from utils.metrics import record_cache, stage_timer
+
+# Subtrees that never hold article text
+SKIP_TAGS = {"script", "style", "noscript", "template", "svg", "nav", "footer", "header", "aside", "form", "button", "iframe", "select"}
+
+# Elements whose text forms one paragraph
+BLOCK_TAGS = {"p", "h1", "h2", "h3", "h4", "li", "blockquote", "pre"}
+
+# Elements without an end tag
+VOID_TAGS = {"img", "br", "hr", "meta", "link", "input", "source", "area", "base", "col", "embed", "param", "track", "wbr"}
+
+# Image URLs that are usually logos, icons or tracking pixels
+IMAGE_NOISE_PATTERN = re.compile(r'(logo|icon|sprite|avatar|pixel|spacer|badge|emoji)', re.IGNORECASE)
+
+WHITESPACE_PATTERN = re.compile(r'\s+')
+
+class ArticleExtractor(HTMLParser):
+    def __init__(self, base_url: str, max_text_chars: int = 100000, max_images: int = 5,
+                 min_paragraph_chars: int = 40, max_depth: int = 512):
+        """Incrementally extract the article text and lead images from HTML
+
+        Feed the page in chunks as it downloads. Paragraphs inside
+        ``<article>``/``<main>`` are preferred; otherwise any paragraph of at
+        least ``min_paragraph_chars`` characters outside navigation,
+        headers, footers and scripts is kept. Memory is bounded by
+        ``max_text_chars`` of text, ``max_images`` candidate images per
+        source and ``max_depth`` open elements; ``done`` turns true once the
+        text budget is used so the download can stop early.
+        """
+        super().__init__(convert_charrefs=True)
+        self.base_url = base_url
+        self.max_text_chars = max_text_chars
+        self.max_images = max_images
+        self.min_paragraph_chars = min_paragraph_chars
+        self.max_depth = max_depth
+
+        self.title: Optional[str] = None
+        self.meta: Dict[str, str] = {}
+        self.paragraphs: List[tuple] = []
+        self.text_chars = 0
+        self._title_parts: Optional[List[str]] = None
+        self._images = {"meta": [], "article": [], "page": []}
+        self._stack: List[str] = []
+        self._skip_depth = 0
+        self._article_depth = 0
+        self._block: Optional[List[str]] = None
+        self._block_in_article = False
+
+    @property
+    def done(self) -> bool:
+        return self.text_chars >= self.max_text_chars
+
+    def handle_starttag(self, tag: str, attrs: list):
+        attributes = {name: value or "" for name, value in attrs}
+
+        if tag == "meta":
+            key = (attributes.get("property") or attributes.get("name") or "").lower()
+            if key in ("og:title", "og:description", "description", "og:image", "twitter:image") and key not in self.meta:
+                self.meta[key] = attributes.get("content", "")
+                if key in ("og:image", "twitter:image"):
+                    self._add_image("meta", self.meta[key])
+            return
+        if tag == "br":
+            self.handle_data(" ")
+            return
+        if tag == "img":
+            if self._skip_depth == 0:
+                self._add_image("article" if self._article_depth else "page",
+                                attributes.get("src") or attributes.get("data-src", ""), attributes)
+            return
+        if tag in VOID_TAGS or len(self._stack) >= self.max_depth:
+            return
+
+        self._stack.append(tag)
+        if tag == "title" and self.title is None:
+            self._title_parts = []
+        if tag in SKIP_TAGS:
+            self._skip_depth += 1
+        if tag in ("article", "main") or attributes.get("itemprop") == "articleBody":
+            self._article_depth += 1
+        if tag in BLOCK_TAGS and self._skip_depth == 0:
+            self._end_block()
+            self._block = []
+            self._block_in_article = self._article_depth > 0
+
+    def handle_endtag(self, tag: str):
+        if tag in VOID_TAGS or tag not in self._stack:
+            return
+        # Close any elements left open inside this one (common in real-world HTML)
+        while self._stack:
+            open_tag = self._stack.pop()
+            if open_tag == "title" and self._title_parts is not None:
+                self.title = WHITESPACE_PATTERN.sub(' ', ''.join(self._title_parts)).strip()
+                self._title_parts = None
+            if open_tag in SKIP_TAGS:
+                self._skip_depth -= 1
+            if open_tag in ("article", "main") and self._article_depth:
+                self._article_depth -= 1
+            if open_tag in BLOCK_TAGS:
+                self._end_block()
+            if open_tag == tag:
+                break
+
+    def handle_data(self, data: str):
+        if self._title_parts is not None:
+            self._title_parts.append(data)
+        elif self._block is not None and self._skip_depth == 0:
+            self._block.append(data)
+
+    def _end_block(self):
+        if self._block is None:
+            return
+        text = WHITESPACE_PATTERN.sub(' ', ''.join(self._block)).strip()
+        self._block = None
+        if text and not self.done:
+            text = text[:self.max_text_chars - self.text_chars]
+            self.paragraphs.append((text, self._block_in_article))
+            self.text_chars += len(text)
+
+    def _add_image(self, source: str, src: str, attributes: Optional[Dict] = None):
+        images = self._images[source]
+        if not src or src.startswith("data:") or len(images) >= self.max_images:
+            return
+        if IMAGE_NOISE_PATTERN.search(src) or src.lower().split("?")[0].endswith((".svg", ".gif")):
+            return
+        if attributes:
+            # Skip images declared too small to contain a face
+            for dimension in ("width", "height"):
+                value = attributes.get(dimension, "")
+                if value.isdigit() and int(value) < 100:
+                    return
+        images.append(urljoin(self.base_url, src))
+
+    def result(self) -> Dict:
+        """Extracted title, text and lead image URLs (page metadata images first)"""
+        self._end_block()
+        article = [text for text, in_article in self.paragraphs if in_article]
+        if sum(len(text) for text in article) >= 200:
+            paragraphs = article
+        else:
+            paragraphs = [text for text, _ in self.paragraphs if len(text) >= self.min_paragraph_chars]
+
+        images = []
+        for url in self._images["meta"] + self._images["article"] + self._images["page"]:
+            if url not in images:
+                images.append(url)
+
+        return {
+            "title": self.meta.get("og:title") or self.title,
+            "description": self.meta.get("og:description") or self.meta.get("description"),
+            "text": "\n\n".join(paragraphs),
+            "paragraph_count": len(paragraphs),
+            "images": images[:self.max_images]
+        }
+
+class ArticleIngestor:
+    def __init__(self, fetcher: URLFetcher, max_bytes: int = 2 * 1024 * 1024, timeout: float = 10.0,
+                 max_text_chars: int = 100000, max_images: int = 5, cache_size: int = 256, cache_ttl: float = 900.0):
+        """Fetch article pages and extract their content, caching the result per URL
+
+        The page is parsed while it streams in, each chunk on the default
+        executor so parsing never blocks the event loop, and reading stops after
+        ``max_bytes``, ``timeout`` seconds or once ``max_text_chars`` of text
+        have been extracted, so giant pages cost bounded time and memory.
+        """
+        self.fetcher = fetcher
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.max_text_chars = max_text_chars
+        self.max_images = max_images
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self._cache: "OrderedDict[str, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    async def extract(self, url: str) -> Dict:
+        with self._lock:
+            cached = self._cache.get(url)
+            if cached is not None and time.time() - cached["extracted_at"] < self.cache_ttl:
+                self._cache.move_to_end(url)
+                record_cache("articles", True)
+                return dict(cached, from_cache=True)
+        record_cache("articles", False)
+
+        extractor = ArticleExtractor(url, self.max_text_chars, self.max_images)
+        decoder = None
+        loop = asyncio.get_running_loop()
+
+        def feed(chunk: bytes, final: bool = False):
+            with stage_timer('html_extraction'):
+                extractor.feed(decoder.decode(chunk, final))
+
+        async def on_chunk(chunk: bytes, response: Dict) -> bool:
+            nonlocal decoder
+            if decoder is None:
+                # Resolve relative image URLs against the page after redirects
+                extractor.base_url = response["final_url"]
+                # Decode incrementally so multi-byte characters split across chunks survive
+                decoder = codecs.getincrementaldecoder(self._charset(response["charset"]) or "utf-8")(errors="replace")
+            # Chunks are fed one at a time, in order, so the parser is never used from two threads at once
+            await loop.run_in_executor(None, feed, chunk)
+            return not extractor.done
+
+        fetched = await self.fetcher.stream(url, on_chunk, self.max_bytes, self.timeout,
+                                            content_type_prefixes=("text/html", "application/xhtml+xml"))
+
+        def finish() -> Dict:
+            if decoder is not None:
+                feed(b"", final=True)
+            extractor.close()
+            return extractor.result()
+
+        article = await loop.run_in_executor(None, finish)
+        article.update({
+            "url": url,
+            "final_url": fetched["final_url"],
+            "truncated": fetched["truncated"] or extractor.done,
+            "bytes_read": fetched["bytes"],
+            "fetch_ms": fetched["fetch_ms"],
+            "extracted_at": time.time()
+        })
+
+        with self._lock:
+            self._cache[url] = article
+            self._cache.move_to_end(url)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return dict(article, from_cache=False)
+
+    @staticmethod
+    def _charset(name: Optional[str]) -> Optional[str]:
+        if not name:
+            return None
+        try:
+            return codecs.lookup(name).name
+        except LookupError:
+            return None
+
+_ingestor: Optional[ArticleIngestor] = None
+_ingestor_lock = threading.Lock()
+
+def get_article_ingestor() -> ArticleIngestor:
+    """Return the process-wide article ingestor, configured from the environment"""
+    global _ingestor
+    if _ingestor is None:
+        with _ingestor_lock:
+            if _ingestor is None:
+                _ingestor = ArticleIngestor(
+                    get_url_fetcher(),
+                    max_bytes=int(os.getenv("ARTICLE_MAX_BYTES", str(2 * 1024 * 1024))),
+                    timeout=float(os.getenv("ARTICLE_TIMEOUT", "10")),
+                    max_text_chars=int(os.getenv("ARTICLE_MAX_TEXT_CHARS", "100000")),
+                    cache_size=int(os.getenv("ARTICLE_CACHE_SIZE", "256")),
+                    cache_ttl=float(os.getenv("ARTICLE_CACHE_TTL", "900"))
+                )
+    return _ingestor
@@ -0,0 +1,279 @@
+import asyncio
+import contextvars
+import functools
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+from utils.metrics import track_queue_depth
+from utils.profiling import profile_call
+
+# Environment variables read by the OpenMP/BLAS runtimes when they start
+THREAD_ENV_VARS = (
+    "OMP_NUM_THREADS",
+    "MKL_NUM_THREADS",
+    "OPENBLAS_NUM_THREADS",
+    "NUMEXPR_NUM_THREADS",
+    "TF_NUM_INTRAOP_THREADS",
+)
+
+def available_cores() -> int:
+    """Cores this process may run on (respects CPU affinity and cpusets)"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+def set_thread_env(threads: int):
+    """Cap native thread pools through the environment
+
+    Only affects libraries initialized afterwards, so call it before torch,
+    TensorFlow or NumPy are imported.
+    """
+    for name in THREAD_ENV_VARS:
+        os.environ[name] = str(threads)
+    os.environ["TF_NUM_INTEROP_THREADS"] = "1"
+    # Tokenizer threads are not fork-safe once used; inference runs one text per request anyway
+    os.environ["TOKENIZERS_PARALLELISM"] = "false"
+
+def process_memory(pid: Optional[int] = None) -> Dict[str, float]:
+    """RSS, PSS and shared memory of a process in MB (Linux ``/proc``)
+
+    PSS divides each shared page between the processes mapping it, so the
+    sum of PSS over workers is their true combined footprint, while RSS
+    counts copy-on-write shared model weights once per worker.
+    """
+    pid = pid or os.getpid()
+    memory = {"pid": pid}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                name, _, value = line.partition(":")
+                fields = value.split()
+                if not fields or fields[-1] != "kB":
+                    continue
+                kb = int(fields[0])
+                if name == "Rss":
+                    memory["rss_mb"] = kb / 1024
+                elif name == "Pss":
+                    memory["pss_mb"] = kb / 1024
+                elif name in ("Shared_Clean", "Shared_Dirty"):
+                    memory["shared_mb"] = memory.get("shared_mb", 0.0) + kb / 1024
+    except OSError:
+        # No smaps_rollup (non-Linux or older kernel): report the peak RSS of this process
+        if pid == os.getpid():
+            import resource
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            memory["rss_mb"] = peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+    return memory
+
+def child_pids(pid: int) -> List[int]:
+    """Pids of the direct children of a process (Linux ``/proc``)"""
+    children = []
+    for name in os.listdir("/proc"):
+        if not name.isdigit():
+            continue
+        try:
+            with open(f"/proc/{name}/stat") as f:
+                # The command name may contain spaces; fields resume after its closing parenthesis
+                fields = f.read().rsplit(")", 1)[1].split()
+        except (OSError, IndexError):
+            continue
+        if int(fields[1]) == pid:
+            children.append(int(name))
+    return sorted(children)
+
+def report_memory(parent_pid: int, interval: float):
+    """Print the RSS and PSS of ``parent_pid`` and its children every ``interval`` seconds
+
+    Meant to run in its own process next to a preforking server, so the
+    server's master keeps no extra threads that could hold locks when it
+    forks workers. Returns once the parent is gone.
+    """
+    while os.getppid() == parent_pid:
+        time.sleep(interval)
+        rows = [("master", process_memory(parent_pid))]
+        children = [pid for pid in child_pids(parent_pid) if pid != os.getpid()]
+        rows += [(f"worker {i}", process_memory(pid)) for i, pid in enumerate(children)]
+
+        lines = [f"  {name:<10} pid {m['pid']:>7}  rss {m.get('rss_mb', 0):8.1f} MB  "
+                 f"pss {m.get('pss_mb', 0):8.1f} MB  shared {m.get('shared_mb', 0):8.1f} MB"
+                 for name, m in rows]
+        total_rss = sum(m.get("rss_mb", 0) for _, m in rows)
+        total_pss = sum(m.get("pss_mb", 0) for _, m in rows)
+        print(
+            "Memory per process:\n" + "\n".join(lines) +
+            f"\n  total rss {total_rss:.1f} MB, actual footprint (pss) {total_pss:.1f} MB",
+            file=sys.stderr, flush=True
+        )
+
+class ComputeConfig:
+    def __init__(self, cores: Optional[int] = None, text_share: float = 0.5, text_workers: int = 1,
+                 image_workers: int = 1, interop_threads: int = 1, blas_threads: int = 1):
+        """Partition the cores of this process between text and image inference
+
+        ``text_share`` of the cores go to the text models (torch) and the rest
+        to the image models (TensorFlow and OpenCV). Each side runs up to
+        ``text_workers``/``image_workers`` inferences at once, and every
+        inference gets an equal slice of its side's cores as intra-op threads,
+        so concurrent requests do not multiply thread counts past the cores.
+        NumPy's BLAS is capped at ``blas_threads`` since it only handles small
+        matrices here. dlib (used by face_recognition) does not expose a
+        thread setting and is left as is.
+        """
+        self.cores = max(1, cores or available_cores())
+        self.text_workers = max(1, text_workers)
+        self.image_workers = max(1, image_workers)
+        self.interop_threads = max(1, interop_threads)
+        self.blas_threads = max(1, blas_threads)
+        
+        if self.cores == 1:
+            # Nothing to partition; both sides share the single core
+            self.text_cores = self.image_cores = 1
+        else:
+            self.text_cores = min(self.cores - 1, max(1, round(self.cores * text_share)))
+            self.image_cores = self.cores - self.text_cores
+
+    @property
+    def text_threads(self) -> int:
+        return max(1, self.text_cores // self.text_workers)
+
+    @property
+    def image_threads(self) -> int:
+        return max(1, self.image_cores // self.image_workers)
+
+    @classmethod
+    def from_env(cls) -> "ComputeConfig":
+        cores = os.getenv("COMPUTE_CORES")
+        return cls(
+            cores=int(cores) if cores else None,
+            text_share=float(os.getenv("COMPUTE_TEXT_SHARE", "0.5")),
+            text_workers=int(os.getenv("COMPUTE_TEXT_WORKERS", "1")),
+            image_workers=int(os.getenv("COMPUTE_IMAGE_WORKERS", "1")),
+            interop_threads=int(os.getenv("COMPUTE_INTEROP_THREADS", "1")),
+            blas_threads=int(os.getenv("COMPUTE_BLAS_THREADS", "1"))
+        )
+
+    def apply(self):
+        """Apply the thread limits to every framework loaded in this process"""
+        import cv2
+        cv2.setNumThreads(self.image_threads)
+        
+        if "torch" in sys.modules:
+            import torch
+            torch.set_num_threads(self.text_threads)
+            try:
+                torch.set_num_interop_threads(self.interop_threads)
+            except RuntimeError:
+                pass
+        
+        if "tensorflow" in sys.modules:
+            import tensorflow as tf
+            try:
+                tf.config.threading.set_intra_op_parallelism_threads(self.image_threads)
+                tf.config.threading.set_inter_op_parallelism_threads(self.interop_threads)
+            except RuntimeError as e:
+                print(f"TensorFlow thread limits not applied: {e}")
+        
+        try:
+            from threadpoolctl import threadpool_limits
+            threadpool_limits(limits=self.blas_threads, user_api="blas")
+        except ImportError:
+            pass
+
+    def describe(self) -> Dict:
+        """Configured partition and the thread counts currently in effect"""
+        import cv2
+        effective = {"opencv_threads": cv2.getNumThreads()}
+        if "torch" in sys.modules:
+            import torch
+            effective["torch_intra_op_threads"] = torch.get_num_threads()
+            effective["torch_inter_op_threads"] = torch.get_num_interop_threads()
+        if "tensorflow" in sys.modules:
+            import tensorflow as tf
+            effective["tf_intra_op_threads"] = tf.config.threading.get_intra_op_parallelism_threads()
+            effective["tf_inter_op_threads"] = tf.config.threading.get_inter_op_parallelism_threads()
+        try:
+            from threadpoolctl import threadpool_info
+            effective["blas_threads"] = {pool["internal_api"]: pool["num_threads"]
+                                         for pool in threadpool_info() if pool["user_api"] == "blas"}
+        except ImportError:
+            pass
+        
+        return {
+            "cores": self.cores,
+            "text": {"cores": self.text_cores, "workers": self.text_workers, "threads_per_worker": self.text_threads},
+            "image": {"cores": self.image_cores, "workers": self.image_workers, "threads_per_worker": self.image_threads},
+            "interop_threads": self.interop_threads,
+            "blas_threads": self.blas_threads,
+            "effective": effective
+        }
+
+class InferenceScheduler:
+    def __init__(self, config: ComputeConfig):
+        """Run text and image inference on separate pools sized by ``config``
+
+        Each pool admits as many concurrent inferences as its side has
+        workers; further requests queue instead of competing for cores.
+        Work is submitted from the event loop so request handlers no longer
+        block it while models run.
+        """
+        self.config = config
+        self.text_pool = ThreadPoolExecutor(max_workers=config.text_workers, thread_name_prefix="text-inference")
+        self.image_pool = ThreadPoolExecutor(max_workers=config.image_workers, thread_name_prefix="image-inference")
+        # Calls submitted to each pool that no worker has picked up yet
+        self._queued = {"text_inference": 0, "image_inference": 0}
+        self._queued_lock = threading.Lock()
+        for queue in self._queued:
+            track_queue_depth(queue, functools.partial(self._queued.get, queue))
+
+    def _dequeue(self, queue: str, claimed: List[bool]):
+        with self._queued_lock:
+            if not claimed:
+                claimed.append(True)
+                self._queued[queue] -= 1
+
+    async def _run(self, pool: ThreadPoolExecutor, queue: str, func: Callable, *args, **kwargs):
+        # Carry the request context (e.g. the profiling trace) into the pool thread, which profiles the call itself
+        context = contextvars.copy_context()
+        claimed: List[bool] = []
+
+        def call():
+            self._dequeue(queue, claimed)
+            return context.run(profile_call, func, *args, **kwargs)
+
+        with self._queued_lock:
+            self._queued[queue] += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(pool, call)
+        finally:
+            # Cancelled before a worker picked it up
+            self._dequeue(queue, claimed)
+
+    async def run_text(self, func: Callable, *args, **kwargs):
+        """Run ``func`` on the text inference pool"""
+        return await self._run(self.text_pool, "text_inference", func, *args, **kwargs)
+
+    async def run_image(self, func: Callable, *args, **kwargs):
+        """Run ``func`` on the image inference pool"""
+        return await self._run(self.image_pool, "image_inference", func, *args, **kwargs)
+
+    def shutdown(self):
+        self.text_pool.shutdown(wait=False)
+        self.image_pool.shutdown(wait=False)
+
+_scheduler: Optional[InferenceScheduler] = None
+_scheduler_lock = threading.Lock()
+
+def get_inference_scheduler() -> InferenceScheduler:
+    """Return the process-wide scheduler, applying the configured thread limits on creation"""
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                config = ComputeConfig.from_env()
+                config.apply()
+                _scheduler = InferenceScheduler(config)
+    return _scheduler
@@ -1,24 +1,43 @@
 import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
 from typing import Dict, List, Optional
+import hashlib
 import json
-import base64
 import io
+import threading
+import time
+import contextvars
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from wordcloud import WordCloud
 import cv2
 from PIL import Image
+from utils.visualization_store import VisualizationStore, get_visualization_store
+from utils.language import DEFAULT_LANGUAGE
+from utils.frequency_analysis import GRID_MISMATCH_THRESHOLD, SPECTRAL_TAIL_THRESHOLD, UPSAMPLING_PEAK_THRESHOLD
+from utils.metrics import observe_stage, record_cache
+from utils.profiling import traced
+
+def visualization_url(visualization_id: str) -> str:
+    """URL from which a rendered visualization can be fetched"""
+    return f"/api/explanations/{visualization_id}"
 
 class TextExplainer:
-    def __init__(self):
+    def __init__(self, visualization_store: Optional[VisualizationStore] = None):
         """Initialize text explainer for generating explanations"""
+        self.visualization_store = visualization_store or get_visualization_store()
         self.feature_names = [
             'fake_indicators', 'credible_indicators', 'exclamation_count',
             'caps_ratio', 'sentiment_score', 'word_count', 'avg_word_length'
         ]
 
-    def explain(self, text: str, result: Dict) -> Dict:
-        """Generate explanations for text prediction"""
+    @traced("text_explainer.explain")
+    def explain(self, text: str, result: Dict, context=None) -> Dict:
+        """Generate explanations for text prediction
+
+        When the ``TextAnalysisContext`` used for the prediction is passed,
+        key factors are derived from its cached feature values rather than
+        from the list of feature names in the result.
+        """
         explanation = {
             "type": "text",
             "prediction": "fake" if result["is_fake"] else "real",
@@ -26,11 +45,25 @@ class TextExplainer:
             "key_factors": [],
             "feature_importance": {},
             "recommendations": [],
-            "visualization": None
+            "visualization_id": None,
+            "visualization_url": None
         }
         
         # Extract key factors
-        if result.get("features"):
+        features = None
+        if context is not None:
+            features = context.features if context.features is not None else context.statistics
+        
+        if features is not None:
+            if features.get("fake_indicators", 0) > 0:
+                explanation["key_factors"].append("Contains suspicious language patterns")
+            if features.get("credible_indicators", 0) > 0:
+                explanation["key_factors"].append("Contains credible source indicators")
+            if features.get("exclamation_count", 0) > 2:
+                explanation["key_factors"].append("Uses excessive exclamation marks")
+            if features.get("caps_ratio", 0) > 0.3:
+                explanation["key_factors"].append("Uses excessive capitalization")
+        elif result.get("features"):
             for feature in result["features"]:
                 if "fake_indicators" in feature:
                     explanation["key_factors"].append("Contains suspicious language patterns")
@@ -65,49 +98,170 @@ class TextExplainer:
                 "Look for official documentation when possible"
             ]
         
-        # Generate word cloud visualization
+        # Schedule word cloud rendering in the background
         try:
-            explanation["visualization"] = self._generate_word_cloud(text)
-        except:
-            explanation["visualization"] = None
+            visualization_id = VisualizationStore.content_id("wordcloud", text.encode("utf-8"))
+            self.visualization_store.submit(visualization_id, self._generate_word_cloud, text)
+            explanation["visualization_id"] = visualization_id
+            explanation["visualization_url"] = visualization_url(visualization_id)
+        except Exception as e:
+            print(f"Word cloud scheduling failed: {e}")
         
         return explanation
 
-    def _generate_word_cloud(self, text: str) -> Optional[str]:
-        """Generate word cloud visualization"""
-        try:
-            # Create word cloud
-            wordcloud = WordCloud(
-                width=400, 
-                height=200, 
-                background_color='white',
-                max_words=50
-            ).generate(text)
-            
-            # Convert to base64
-            img_buffer = io.BytesIO()
-            plt.figure(figsize=(8, 4))
-            plt.imshow(wordcloud, interpolation='bilinear')
-            plt.axis('off')
-            plt.tight_layout()
-            plt.savefig(img_buffer, format='png', bbox_inches='tight', dpi=150)
-            plt.close()
-            
-            img_buffer.seek(0)
-            img_str = base64.b64encode(img_buffer.getvalue()).decode()
-            
-            return f"data:image/png;base64,{img_str}"
-        except:
-            return None
+    def _generate_word_cloud(self, text: str) -> bytes:
+        """Render word cloud visualization as PNG bytes"""
+        wordcloud = WordCloud(
+            width=400, 
+            height=200, 
+            background_color='white',
+            max_words=50
+        ).generate(text)
+        
+        img_buffer = io.BytesIO()
+        wordcloud.to_image().save(img_buffer, format='PNG', optimize=True)
+        return img_buffer.getvalue()
+
+class TokenAttributionExplainer:
+    def __init__(self, processor, max_samples: int = 500, min_samples: int = 32,
+                 default_budget_ms: float = 1500.0, kernel_width: float = 25.0,
+                 top_k: int = 15, cache_size: int = 512, seed: int = 0):
+        """Initialize a LIME-style token attribution explainer for a TextProcessor
+
+        Perturbed copies of the text (with random subsets of words removed)
+        are scored by ``processor.score_texts`` in batched forward passes of
+        the processor's ``sentence_batch_size``, and a kernel-weighted ridge
+        regression over the word masks gives each word's contribution to
+        the fake score. The number of perturbations is
+        chosen per request from a latency budget using the measured cost per
+        token, and attributions are cached by content hash.
+        """
+        self.processor = processor
+        self.max_samples = max_samples
+        self.min_samples = min_samples
+        self.default_budget_ms = default_budget_ms
+        self.kernel_width = kernel_width
+        self.top_k = top_k
+        self.cache_size = cache_size
+        self.seed = seed
+        
+        # Running estimate of model cost, refined after every explanation
+        self.seconds_per_token = 2e-5
+        
+        self._cache: "OrderedDict[str, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _sample_count(self, token_estimate: int, budget_ms: float) -> int:
+        """Number of perturbations that fit in the latency budget"""
+        per_sample = max(self.seconds_per_token * max(token_estimate, 1), 1e-9)
+        affordable = int((budget_ms / 1000.0) / per_sample)
+        return max(self.min_samples, min(self.max_samples, affordable))
+
+    @traced("token_attribution_explainer.explain")
+    def explain(self, text: str, context=None, budget_ms: Optional[float] = None) -> Dict:
+        """Compute per-word attributions toward the fake score
+        
+        Perturbations are scored by the model for the context's language,
+        and attributions are cached by that model's key and the text.
+        Attributions over rule-based fallback scores are not cached.
+        """
+        processed = context.processed_text if context is not None else self.processor.preprocess_text(text)
+        language = context.language if context is not None else DEFAULT_LANGUAGE
+        words = processed.split()[:self.processor.max_length]
+        
+        prefix = self.processor._language_model_name(language) or f"rules:{language}"
+        cache_key = f"{prefix}:" + hashlib.sha256(processed.encode("utf-8")).hexdigest()
+        with self._lock:
+            cached = self._cache.get(cache_key)
+            if cached is not None:
+                self._cache.move_to_end(cache_key)
+        record_cache('token_attributions', cached is not None)
+        if cached is not None:
+            return dict(cached, cached=True)
+        
+        if not words:
+            return {"attributions": [], "samples": 0, "base_score": None, "cached": False, "time": 0.0}
+        
+        start_time = time.perf_counter()
+        vocabulary = list(dict.fromkeys(words))
+        position = {word: i for i, word in enumerate(vocabulary)}
+        word_index = np.array([position[word] for word in words])
+        n_features = len(vocabulary)
+        
+        # Budget is estimated from the number of word pieces (~1.3 per word)
+        budget_ms = self.default_budget_ms if budget_ms is None else budget_ms
+        n_samples = self._sample_count(int(len(words) * 1.3) + 2, budget_ms)
+        
+        # Row 0 keeps every word; other rows drop a random number of distinct words
+        rng = np.random.default_rng(self.seed)
+        masks = np.ones((n_samples, n_features), dtype=bool)
+        for row in range(1, n_samples):
+            n_removed = rng.integers(1, n_features + 1)
+            masks[row, rng.choice(n_features, n_removed, replace=False)] = False
+        
+        word_array = np.array(words, dtype=object)
+        samples = [' '.join(word_array[mask[word_index]]) for mask in masks]
+        
+        # Batches of the processor's sentence batch size bound the activations of one forward pass
+        batch_size = self.processor.sentence_batch_size
+        scores = np.empty(n_samples, dtype=np.float64)
+        token_count = 0
+        modeled = True
+        for offset in range(0, n_samples, batch_size):
+            scored = self.processor.score_texts(samples[offset:offset + batch_size], language)
+            scores[offset:offset + batch_size] = scored["scores"]
+            token_count += scored["token_count"]
+            modeled = modeled and scored["model"]
+        elapsed = time.perf_counter() - start_time
+        if token_count > 0:
+            measured = elapsed / token_count
+            self.seconds_per_token = 0.7 * self.seconds_per_token + 0.3 * measured
+        
+        # Exponential kernel on cosine distance to the original text (as in LIME)
+        kept = masks.sum(axis=1)
+        distances = (1.0 - np.sqrt(kept / n_features)) * 100
+        weights = np.sqrt(np.exp(-(distances ** 2) / self.kernel_width ** 2))
+        
+        # Weighted ridge regression with intercept
+        X = masks.astype(np.float64)
+        X_mean = np.average(X, axis=0, weights=weights ** 2)
+        y_mean = np.average(scores, weights=weights ** 2)
+        Xw = (X - X_mean) * weights[:, None]
+        yw = (scores - y_mean) * weights
+        coefficients = np.linalg.solve(Xw.T @ Xw + np.eye(n_features), Xw.T @ yw)
+        
+        order = np.argsort(-np.abs(coefficients))[:self.top_k]
+        attribution = {
+            "attributions": [
+                {"token": vocabulary[i], "weight": float(coefficients[i])} for i in order
+            ],
+            "samples": int(n_samples),
+            "base_score": float(scores[0]),
+            "cached": False,
+            "time": time.perf_counter() - start_time
+        }
+        observe_stage('token_attributions', attribution["time"])
+        
+        if not modeled:
+            return attribution
+        with self._lock:
+            self._cache[cache_key] = attribution
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        
+        return attribution
 
 class ImageExplainer:
-    def __init__(self):
+    def __init__(self, visualization_store: Optional[VisualizationStore] = None):
         """Initialize image explainer for generating explanations"""
+        self.visualization_store = visualization_store or get_visualization_store()
         self.artifact_names = [
             'edge_density', 'hue_variance', 'saturation_variance',
-            'value_variance', 'symmetry_score'
+            'value_variance', 'symmetry_score', 'spectral_tail', 'upsampling_peak',
+            'jpeg_grid_mismatch'
         ]
 
+    @traced("image_explainer.explain")
     def explain(self, image_file, result: Dict) -> Dict:
         """Generate explanations for image prediction"""
         explanation = {
@@ -117,7 +271,8 @@ class ImageExplainer:
             "key_factors": [],
             "artifact_analysis": {},
             "recommendations": [],
-            "visualization": None
+            "visualization_id": None,
+            "visualization_url": None
         }
         
         # Analyze face artifacts
@@ -139,6 +294,22 @@ class ImageExplainer:
             
             if avg_artifacts.get("symmetry_score", 0) > 0.95:
                 explanation["key_factors"].append("Unnaturally perfect facial symmetry")
+            
+            if avg_artifacts.get("spectral_tail", 0) > SPECTRAL_TAIL_THRESHOLD:
+                explanation["key_factors"].append("Excess high-frequency energy in the face spectrum")
+            
+            if avg_artifacts.get("upsampling_peak", 0) > UPSAMPLING_PEAK_THRESHOLD:
+                explanation["key_factors"].append("Periodic upsampling pattern in the face spectrum")
+        
+        # A pasted face stands out on its own, so the grid is checked per face rather than on the average
+        for i, artifacts in enumerate(face_artifacts):
+            if artifacts.get("jpeg_grid_mismatch", 0) > GRID_MISMATCH_THRESHOLD:
+                explanation["key_factors"].append(f"Face {i + 1} lacks the JPEG block grid of the rest of the image")
+        
+        for match in result.get("known_faces", []):
+            explanation["key_factors"].append(
+                f"Face {match['face'] + 1} matches a confirmed deepfake ({match['label']}, distance {match['distance']:.2f})"
+            )
         
         # Face detection analysis
         if result.get("face_detected"):
@@ -162,93 +333,109 @@ class ImageExplainer:
                 "Consider the source and context"
             ]
         
-        # Generate heatmap visualization
-        try:
-            explanation["visualization"] = self._generate_heatmap(image_file, result)
-        except:
-            explanation["visualization"] = None
-        
-        return explanation
-
-    def _generate_heatmap(self, image_file, result: Dict) -> Optional[str]:
-        """Generate heatmap visualization highlighting suspicious areas"""
+        # Schedule heatmap rendering in the background
         try:
-            # Read and process image
             image_bytes = image_file.read()
             image_file.seek(0)
             
-            nparr = np.frombuffer(image_bytes, np.uint8)
-            img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-            img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-            
-            # Create heatmap
-            heatmap = np.zeros(img_rgb.shape[:2], dtype=np.float32)
-            
-            # Highlight face areas if detected
-            face_artifacts = result.get("face_artifacts", [])
-            for i, face in enumerate(face_artifacts):
-                # This is a simplified heatmap - in practice, you'd use Grad-CAM or similar
-                if face.get("edge_density", 0) > 0.1:
-                    # Add some heat to face areas
-                    heatmap += 0.3
-            
-            # Normalize heatmap
-            if np.max(heatmap) > 0:
-                heatmap = heatmap / np.max(heatmap)
-            
-            # Create visualization
-            plt.figure(figsize=(10, 6))
-            
-            plt.subplot(1, 2, 1)
-            plt.imshow(img_rgb)
-            plt.title("Original Image")
-            plt.axis('off')
-            
-            plt.subplot(1, 2, 2)
-            plt.imshow(img_rgb)
-            plt.imshow(heatmap, alpha=0.6, cmap='hot')
-            plt.title("Suspicious Areas Highlighted")
-            plt.axis('off')
-            
-            plt.tight_layout()
-            
-            # Convert to base64
-            img_buffer = io.BytesIO()
-            plt.savefig(img_buffer, format='png', bbox_inches='tight', dpi=150)
-            plt.close()
+            face_boxes = result.get("face_boxes", [])
+            saliency_maps = [np.asarray(cam, dtype=np.float32) for cam in result.get("saliency_maps", [])]
+            visualization_id = VisualizationStore.content_id(
+                "heatmap", image_bytes, json.dumps(face_boxes).encode(),
+                *[cam.tobytes() for cam in saliency_maps]
+            )
+            self.visualization_store.submit(
+                visualization_id, self._generate_heatmap, image_bytes, face_boxes, saliency_maps
+            )
+            explanation["visualization_id"] = visualization_id
+            explanation["visualization_url"] = visualization_url(visualization_id)
+        except Exception as e:
+            print(f"Heatmap scheduling failed: {e}")
+        
+        return explanation
+
+    def _generate_heatmap(self, image_bytes: bytes, face_boxes: List[List[int]], saliency_maps: List[np.ndarray]) -> bytes:
+        """Render original and Grad-CAM panels side by side as PNG bytes
+
+        Each face's saliency map is upsampled to its bounding box and blended
+        only inside that box; the rest of the image is left untouched.
+        """
+        nparr = np.frombuffer(image_bytes, np.uint8)
+        img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        if img is None:
+            raise ValueError("Could not decode image")
+        
+        overlay = img.copy()
+        for i, (x, y, w, h) in enumerate(face_boxes):
+            x, y = max(x, 0), max(y, 0)
+            w, h = min(w, img.shape[1] - x), min(h, img.shape[0] - y)
+            if w <= 0 or h <= 0:
+                continue
             
-            img_buffer.seek(0)
-            img_str = base64.b64encode(img_buffer.getvalue()).decode()
+            if i < len(saliency_maps):
+                cam = cv2.resize(saliency_maps[i], (w, h), interpolation=cv2.INTER_LINEAR)
+                colored = cv2.applyColorMap(np.uint8(np.clip(cam, 0, 1) * 255), cv2.COLORMAP_JET)
+                region = overlay[y:y+h, x:x+w]
+                overlay[y:y+h, x:x+w] = cv2.addWeighted(region, 0.5, colored, 0.5, 0)
             
-            return f"data:image/png;base64,{img_str}"
-        except Exception as e:
-            print(f"Heatmap generation failed: {e}")
-            return None
+            cv2.rectangle(overlay, (x, y), (x + w - 1, y + h - 1), (0, 255, 255), 2)
+        
+        panels = cv2.hconcat([img, overlay])
+        ok, buffer = cv2.imencode('.png', panels)
+        if not ok:
+            raise ValueError("Could not encode heatmap")
+        return buffer.tobytes()
 
 class ComprehensiveExplainer:
-    def __init__(self):
-        """Initialize comprehensive explainer for multi-modal analysis"""
-        self.text_explainer = TextExplainer()
-        self.image_explainer = ImageExplainer()
+    def __init__(self, text_explainer: Optional[TextExplainer] = None, image_explainer: Optional[ImageExplainer] = None):
+        """Initialize comprehensive explainer for multi-modal analysis
+
+        Pass the shared explainers to reuse their visualization store; the
+        text and image explanations are generated concurrently.
+        """
+        self.text_explainer = text_explainer or TextExplainer()
+        self.image_explainer = image_explainer or ImageExplainer()
+        self.executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="comprehensive-explainer")
 
-    def explain_comprehensive(self, text: Optional[str], image_file, text_result: Dict, image_result: Dict) -> Dict:
+    @traced("comprehensive_explainer.explain")
+    def explain_comprehensive(self, text: Optional[str], image_file, text_result: Dict, image_result: Dict,
+                              text_context=None) -> Dict:
         """Generate comprehensive explanations for multi-modal analysis"""
+        text_future = None
+        image_future = None
+        
+        # Explain both modalities at once, carrying the request context into the worker threads
+        if text and text_result:
+            text_future = self.executor.submit(contextvars.copy_context().run, self.text_explainer.explain,
+                                               text, text_result, text_context)
+        if image_file and image_result:
+            image_future = self.executor.submit(contextvars.copy_context().run, self.image_explainer.explain,
+                                                image_file, image_result)
+        
+        return self.combine(
+            text_future.result() if text_future else None,
+            image_future.result() if image_future else None,
+            text_result if text else None,
+            image_result if image_file else None
+        )
+
+    def combine(self, text_explanation: Optional[Dict], image_explanation: Optional[Dict],
+                text_result: Optional[Dict], image_result: Optional[Dict]) -> Dict:
+        """Merge per-modality explanations into an overall score, insights and recommendations
+
+        A modality whose result is None (not submitted or skipped) does not
+        contribute to the overall score.
+        """
         explanation = {
             "type": "comprehensive",
             "overall_score": 0.0,
-            "text_analysis": None,
-            "image_analysis": None,
+            "text_analysis": text_explanation,
+            "image_analysis": image_explanation,
             "cross_modal_insights": [],
             "recommendations": []
         }
-        
-        # Text analysis
-        if text and text_result:
-            explanation["text_analysis"] = self.text_explainer.explain(text, text_result)
-        
-        # Image analysis
-        if image_file and image_result:
-            explanation["image_analysis"] = self.image_explainer.explain(image_file, image_result)
+        text = text_result is not None
+        image_file = image_result is not None
         
         # Calculate overall score
         text_score = text_result.get("fake_score", 0.5) if text_result else 0.5
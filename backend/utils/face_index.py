@@ -0,0 +1,285 @@
+"""Index of face encodings from confirmed deepfakes
+
+Every image's faces are compared against the encodings of faces already
+confirmed as manipulated, so a reused synthetic identity is flagged without
+running the models. Encodings are the 128-d face_recognition (dlib)
+embeddings that ``ImageProcessor.detect_faces`` computes anyway.
+
+The index is a flat matrix searched exactly with batched dot products:
+``|q - x|^2 = |q|^2 + |x|^2 - 2 q.x`` over blocks of rows, so all faces of
+an image share one pass over the vectors and memory use stays bounded by the
+block size. At 1M encodings that is a 512 MB scan per image (see
+``benchmarks.face_index``); ``search`` is the only method that depends on
+the layout, so an IVF or HNSW index can replace it once that is too slow.
+
+Vectors live in a ``.npy`` file opened as a memory map and grown by
+doubling; each row's label is a line in a JSONL file next to it, and a row
+counts only once its label line is written, so an interrupted insert leaves
+no partial entries.
+
+Several processes (e.g. gunicorn workers) can share one index. Inserts
+take an exclusive lock on a ``.lock`` file next to it, and every process
+picks up rows added by the others, and remaps a grown file, before each
+search and insert.
+"""
+import hmac
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: a single process only
+    fcntl = None
+
+ENCODING_SIZE = 128
+
+class FaceIndex:
+    def __init__(self, path: Optional[str] = None, threshold: float = 0.5, block_size: int = 65536,
+                 initial_capacity: int = 1024, admin_token: Optional[str] = None):
+        """Open (or create) the index at ``path``; without a path it is kept in memory
+
+        A query face matches a known face when their Euclidean distance is
+        at most ``threshold`` (face_recognition treats 0.6 as the same
+        person; the default is stricter to keep false positives down).
+        Searches scan ``block_size`` rows at a time. Adding faces requires
+        ``admin_token``.
+        """
+        self.path = path
+        self.labels_path = os.path.splitext(path)[0] + ".jsonl" if path else None
+        self.threshold = threshold
+        self.block_size = block_size
+        self.admin_token = admin_token
+        self._lock = threading.Lock()
+        # Byte offset of each row's label line, or the labels themselves when in memory
+        self._offsets = np.zeros(0, dtype=np.int64)
+        self._labels: List[Dict] = []
+        self._labels_size = 0
+        self._count = 0
+        self._inode = None
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            with self._file_lock():
+                if os.path.exists(path):
+                    self._vectors = np.lib.format.open_memmap(path, mode="r+")
+                else:
+                    self._vectors = self._allocate(initial_capacity)
+                    # Labels left over from a deleted vector file
+                    open(self.labels_path, "wb").close()
+                self._inode = os.stat(path).st_ino
+        else:
+            self._vectors = self._allocate(initial_capacity)
+        self._norms = np.zeros(len(self._vectors), dtype=np.float32)
+        self._refresh()
+
+    def _allocate(self, capacity: int) -> np.ndarray:
+        if not self.path:
+            return np.zeros((capacity, ENCODING_SIZE), dtype=np.float32)
+        return np.lib.format.open_memmap(self.path, mode="w+", dtype=np.float32, shape=(capacity, ENCODING_SIZE))
+
+    @contextmanager
+    def _file_lock(self):
+        """Exclusive lock across processes sharing the index files"""
+        if fcntl is None:
+            yield
+            return
+        with open(self.path + ".lock", "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _refresh(self):
+        """Pick up rows other processes added and remap the vector file if one of them grew it
+
+        Called with ``_lock`` held (or during construction). Labels are read
+        before the vector file is checked: a writer swaps in a grown file
+        before appending the labels of the rows it put there.
+        """
+        if not self.path:
+            return
+        offsets = []
+        position = self._labels_size
+        try:
+            if os.stat(self.labels_path).st_size > position:
+                with open(self.labels_path, "rb") as f:
+                    f.seek(position)
+                    for line in f:
+                        if not line.endswith(b"\n"):
+                            break
+                        offsets.append(position)
+                        position += len(line)
+        except FileNotFoundError:
+            pass
+        
+        inode = os.stat(self.path).st_ino
+        if inode != self._inode:
+            self._vectors = np.lib.format.open_memmap(self.path, mode="r+")
+            self._inode = inode
+            norms = np.zeros(len(self._vectors), dtype=np.float32)
+            norms[:self._count] = self._norms[:self._count]
+            self._norms = norms
+        if not offsets:
+            return
+        
+        start = self._count
+        self._count = min(start + len(offsets), len(self._vectors))
+        added = self._count - start
+        self._offsets = np.concatenate([self._offsets, np.array(offsets[:added], dtype=np.int64)])
+        self._labels_size = offsets[added] if added < len(offsets) else position
+        for block_start in range(start, self._count, self.block_size):
+            block = self._vectors[block_start:min(block_start + self.block_size, self._count)]
+            self._norms[block_start:block_start + len(block)] = np.einsum("ij,ij->i", block, block)
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._refresh()
+        return self._count
+
+    def is_admin(self, token: Optional[str]) -> bool:
+        return bool(self.admin_token) and token is not None and hmac.compare_digest(token, self.admin_token)
+
+    def add(self, encodings: np.ndarray, label: str, source: Optional[str] = None) -> List[int]:
+        """Append encodings of a confirmed deepfake; returns their row ids"""
+        encodings = np.asarray(encodings, dtype=np.float32).reshape(-1, ENCODING_SIZE)
+        entry = {"label": label, "source": source, "added_at": time.time()}
+        if not self.path:
+            with self._lock:
+                start, end = self._count, self._count + len(encodings)
+                if end > len(self._vectors):
+                    self._grow(end)
+                self._vectors[start:end] = encodings
+                self._norms[start:end] = np.einsum("ij,ij->i", encodings, encodings)
+                self._labels.extend([entry] * len(encodings))
+                self._count = end
+            return list(range(start, end))
+        
+        with self._lock, self._file_lock():
+            # Rows start after everything any process has added so far
+            self._refresh()
+            start, end = self._count, self._count + len(encodings)
+            if end > len(self._vectors):
+                self._grow(end)
+            self._vectors[start:end] = encodings
+            self._norms[start:end] = np.einsum("ij,ij->i", encodings, encodings)
+            self._vectors.flush()
+            # Publish the rows only once they are written: other processes count label lines
+            line = (json.dumps(entry) + "\n").encode("utf-8")
+            with open(self.labels_path, "ab") as f:
+                offset = f.tell()
+                f.write(line * len(encodings))
+            self._offsets = np.concatenate([self._offsets, offset + len(line) * np.arange(len(encodings))])
+            self._labels_size = offset + len(line) * len(encodings)
+            self._count = end
+        return list(range(start, end))
+
+    def _grow(self, needed: int):
+        capacity = len(self._vectors)
+        while capacity < needed:
+            capacity *= 2
+        if self.path:
+            # Copy into a larger file and swap it in; searches still scanning the old map keep it alive
+            tmp_path = self.path + ".tmp"
+            grown = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=np.float32,
+                                              shape=(capacity, ENCODING_SIZE))
+            grown[:self._count] = self._vectors[:self._count]
+            grown.flush()
+            os.replace(tmp_path, self.path)
+            self._inode = os.stat(self.path).st_ino
+        else:
+            grown = np.zeros((capacity, ENCODING_SIZE), dtype=np.float32)
+            grown[:self._count] = self._vectors[:self._count]
+        norms = np.zeros(capacity, dtype=np.float32)
+        norms[:self._count] = self._norms[:self._count]
+        self._vectors, self._norms = grown, norms
+
+    def search(self, encodings: np.ndarray, k: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        """Distances and row ids of the ``k`` nearest known faces for each query, nearest first"""
+        queries = np.asarray(encodings, dtype=np.float32).reshape(-1, ENCODING_SIZE)
+        with self._lock:
+            self._refresh()
+            vectors, norms, count = self._vectors, self._norms, self._count
+        k = min(k, count)
+        best_distances = np.full((len(queries), k), np.inf, dtype=np.float32)
+        best_ids = np.zeros((len(queries), k), dtype=np.int64)
+        if k == 0 or len(queries) == 0:
+            return best_distances, best_ids
+
+        # |q|^2 is the same for every row, so it is only added to the final distances. Rows x queries
+        # is the faster orientation for BLAS with only a few queries.
+        scaled_queries = -2.0 * queries.T
+        rows = np.arange(len(queries))[:, None]
+        for start in range(0, count, self.block_size):
+            end = min(start + self.block_size, count)
+            distances = vectors[start:end] @ scaled_queries
+            distances += norms[start:end, None]
+            distances = distances.T
+            if k == 1:
+                nearest = distances.argmin(axis=1)[:, None]
+                distances = distances[rows, nearest]
+            elif end - start > k:
+                nearest = np.argpartition(distances, k - 1, axis=1)[:, :k]
+                distances = distances[rows, nearest]
+            else:
+                nearest = np.broadcast_to(np.arange(end - start), distances.shape)
+            # Merge the block's nearest rows with the best so far
+            merged_distances = np.concatenate([best_distances, distances], axis=1)
+            merged_ids = np.concatenate([best_ids, nearest + start], axis=1)
+            keep = np.argpartition(merged_distances, k - 1, axis=1)[:, :k]
+            best_distances, best_ids = merged_distances[rows, keep], merged_ids[rows, keep]
+
+        order = np.argsort(best_distances, axis=1)
+        query_norms = np.einsum("ij,ij->i", queries, queries)[:, None]
+        best_distances = np.sqrt(np.maximum(best_distances[rows, order] + query_norms, 0.0))
+        return best_distances, best_ids[rows, order]
+
+    def match(self, encodings: np.ndarray) -> List[Optional[Dict]]:
+        """For each encoding, the nearest known face within ``threshold`` (id, distance, label) or None"""
+        distances, ids = self.search(encodings, 1)
+        if not distances.shape[1]:
+            return [None] * len(distances)
+        return [
+            {"id": int(row), "distance": float(distance), **self.label(int(row))} if distance <= self.threshold else None
+            for distance, row in zip(distances[:, 0], ids[:, 0])
+        ]
+
+    def label(self, row: int) -> Dict:
+        """Label, source and insertion time of a row"""
+        if not self.path:
+            return self._labels[row]
+        with open(self.labels_path, "rb") as f:
+            f.seek(int(self._offsets[row]))
+            return json.loads(f.readline())
+
+    def describe(self) -> Dict:
+        with self._lock:
+            self._refresh()
+        return {
+            "count": self._count,
+            "capacity": len(self._vectors),
+            "encoding_size": ENCODING_SIZE,
+            "threshold": self.threshold,
+            "path": self.path,
+            "bytes": int(self._vectors.nbytes)
+        }
+
+_index: Optional[FaceIndex] = None
+_index_lock = threading.Lock()
+
+def get_face_index() -> FaceIndex:
+    """Return the process-wide known-face index, configured from the environment"""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = FaceIndex(
+                    path=os.getenv("FACE_INDEX_PATH", os.path.join("data", "known_faces.npy")) or None,
+                    threshold=float(os.getenv("FACE_INDEX_THRESHOLD", "0.5")),
+                    admin_token=os.getenv("FACE_INDEX_ADMIN_TOKEN") or None
+                )
+    return _index
@@ -0,0 +1,431 @@
+import asyncio
+import hashlib
+import io
+import ipaddress
+import json
+import os
+import socket
+import threading
+import time
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+import httpcore
+import httpx
+from utils.metrics import observe_stage, record_cache
+
+try:
+    import h2  # noqa: F401  (enables HTTP/2 in httpx)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+# Seconds after which the blob cache size is recounted from disk
+CACHE_RESCAN_SECONDS = 60.0
+
+class FetchError(ValueError):
+    """A URL could not be fetched; ``status_code`` is the HTTP status to report to the client"""
+
+    def __init__(self, message: str, status_code: int = 502):
+        super().__init__(message)
+        self.status_code = status_code
+
+def is_public_address(address: str) -> bool:
+    """Whether an IP address may be fetched from (not internal, multicast or unspecified)"""
+    ip = ipaddress.ip_address(address.split("%")[0])
+    if ip.version == 6 and ip.ipv4_mapped is not None:
+        ip = ip.ipv4_mapped
+    return not (ip.is_private or ip.is_loopback or ip.is_link_local or ip.is_reserved
+                or ip.is_multicast or ip.is_unspecified)
+
+class PublicAddressBackend(httpcore.AsyncNetworkBackend):
+    """Network backend that resolves hosts itself and only dials public addresses
+
+    The addresses that were checked are the ones connected to, so a host
+    cannot pass the check and then resolve to an internal address for the
+    connection (DNS rebinding). TLS still uses the host name for SNI and
+    certificate verification, and requests keep their Host header.
+    """
+
+    def __init__(self):
+        self._backend = httpcore.AnyIOBackend()
+
+    async def connect_tcp(self, host: str, port: int, timeout: Optional[float] = None,
+                          local_address: Optional[str] = None, socket_options=None) -> httpcore.AsyncNetworkStream:
+        try:
+            infos = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        except socket.gaierror:
+            raise FetchError(f"Could not resolve {host}", 400)
+        addresses = list(dict.fromkeys(info[4][0] for info in infos))
+        if not all(is_public_address(address) for address in addresses):
+            raise FetchError(f"Fetching from {host} is not allowed", 400)
+        
+        error: Optional[Exception] = None
+        for address in addresses:
+            try:
+                return await self._backend.connect_tcp(address, port, timeout, local_address, socket_options)
+            except (httpcore.ConnectError, httpcore.ConnectTimeout) as e:
+                error = e
+        raise error
+
+    async def connect_unix_socket(self, path: str, timeout: Optional[float] = None, socket_options=None):
+        raise FetchError("Unix sockets are not allowed", 400)
+
+    async def sleep(self, seconds: float):
+        await self._backend.sleep(seconds)
+
+class URLFetcher:
+    def __init__(self, cache_dir: str, max_bytes: int = 20 * 1024 * 1024, timeout: float = 15.0,
+                 connect_timeout: float = 5.0, max_connections: int = 100, max_connections_per_host: int = 8,
+                 cache_max_bytes: int = 512 * 1024 * 1024, revalidate_after: float = 300.0,
+                 allow_private_hosts: bool = False, http2: bool = True):
+        """Download remote content through a pooled async client with a local cache
+
+        One ``httpx.AsyncClient`` keeps connections alive across requests
+        (HTTP/2 when the ``h2`` package is installed), with at most
+        ``max_connections`` overall and ``max_connections_per_host`` to any one
+        host. Bodies are streamed and abandoned once they exceed
+        ``max_bytes`` or the whole download exceeds ``timeout`` seconds.
+
+        Downloaded bytes are stored under ``cache_dir`` by their SHA-256, so
+        identical content fetched from different URLs is kept once. Each URL
+        remembers its ETag/Last-Modified; within ``revalidate_after`` seconds
+        the cached bytes are returned without a request, and after that a
+        conditional request is sent so unchanged content is not downloaded
+        again. Blobs are evicted least recently used beyond ``cache_max_bytes``.
+
+        Hosts resolving to private, loopback, link-local, multicast or
+        unspecified addresses are refused unless ``allow_private_hosts`` is
+        set; connections are made to the checked addresses themselves.
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.max_connections = max_connections
+        self.max_connections_per_host = max_connections_per_host
+        self.cache_max_bytes = cache_max_bytes
+        self.revalidate_after = revalidate_after
+        self.allow_private_hosts = allow_private_hosts
+        self.http2 = http2 and HTTP2_AVAILABLE
+        self._client: Optional[httpx.AsyncClient] = None
+        self._host_limits: Dict[str, asyncio.Semaphore] = {}
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._cache_lock = threading.Lock()
+        # Bytes in the blob cache as of the last eviction scan plus this process's writes since;
+        # rescanned periodically since other worker processes write to the same cache
+        self._cache_bytes: Optional[int] = None
+        self._scanned_at = 0.0
+
+        os.makedirs(os.path.join(cache_dir, "blobs"), exist_ok=True)
+        os.makedirs(os.path.join(cache_dir, "urls"), exist_ok=True)
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            transport = httpx.AsyncHTTPTransport(
+                http2=self.http2,
+                limits=httpx.Limits(max_connections=self.max_connections,
+                                    max_keepalive_connections=self.max_connections)
+            )
+            if not self.allow_private_hosts:
+                # httpx has no option for the network backend; every new connection,
+                # including each redirect hop, resolves and dials through it
+                transport._pool._network_backend = PublicAddressBackend()
+            self._client = httpx.AsyncClient(
+                transport=transport,
+                timeout=httpx.Timeout(self.timeout, connect=self.connect_timeout),
+                follow_redirects=True,
+                max_redirects=5,
+                headers={"User-Agent": "fake-news-deepfake-detector/1.0"}
+            )
+        return self._client
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def fetch(self, url: str, content_type_prefix: Optional[str] = None) -> Dict:
+        """Return the content of ``url``, from the cache when possible
+
+        Concurrent fetches of the same URL share one download, which runs
+        in its own task: a caller that is cancelled stops waiting for it, but
+        the download carries on (within ``timeout``) for the other callers
+        and the cache. Raises ``FetchError`` for invalid URLs, refused
+        hosts, HTTP errors, oversized bodies, timeouts and content types not
+        starting with ``content_type_prefix``.
+        """
+        start = time.perf_counter()
+        task = self._inflight.get(url)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch(url))
+            self._inflight[url] = task
+            task.add_done_callback(lambda done: self._fetch_done(url, done))
+        result = dict(await asyncio.shield(task))
+
+        if content_type_prefix and not result["content_type"].startswith(content_type_prefix):
+            raise FetchError(f"Expected {content_type_prefix}* content but got {result['content_type'] or 'unknown'}", 415)
+        result["fetch_ms"] = (time.perf_counter() - start) * 1000
+        return result
+
+    def _fetch_done(self, url: str, task: asyncio.Task):
+        if self._inflight.get(url) is task:
+            del self._inflight[url]
+        # Every waiter may have left; mark the exception as retrieved
+        if not task.cancelled():
+            task.exception()
+
+    async def stream(self, url: str, on_chunk: Callable[[bytes, Dict], Awaitable[bool]], max_bytes: int,
+                     timeout: float, content_type_prefixes: Tuple[str, ...] = ()) -> Dict:
+        """Feed the body of ``url`` to the coroutine ``on_chunk`` without caching or buffering it
+
+        The next chunk is read once ``on_chunk`` returns, so it can hand
+        work to a thread without reordering chunks. It also receives the response state (final URL, content type,
+        charset). Reading stops when it returns False, after ``max_bytes`` or
+        once ``timeout`` seconds have passed; unlike ``fetch``, reaching a
+        limit is not an error and the result reports ``truncated`` instead.
+        """
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            raise FetchError("Only absolute http(s) URLs are supported", 400)
+
+        state = {"final_url": url, "content_type": "", "charset": None, "bytes": 0, "truncated": False}
+
+        async def read():
+            async with self._get_client().stream("GET", url) as response:
+                if response.status_code >= 400:
+                    raise FetchError(f"{url} returned HTTP {response.status_code}", 502)
+                content_type = response.headers.get("content-type", "")
+                state["final_url"] = str(response.url)
+                state["content_type"] = content_type.split(";")[0].strip().lower()
+                state["charset"] = response.charset_encoding
+                if content_type_prefixes and not state["content_type"].startswith(content_type_prefixes):
+                    raise FetchError(f"Unsupported content type {state['content_type'] or 'unknown'}", 415)
+
+                async for chunk in response.aiter_bytes():
+                    chunk = chunk[:max_bytes - state["bytes"]]
+                    state["bytes"] += len(chunk)
+                    if await on_chunk(chunk, state) is False:
+                        return
+                    if state["bytes"] >= max_bytes:
+                        state["truncated"] = True
+                        return
+
+        start = time.perf_counter()
+        semaphore = self._host_limits.setdefault(parts.hostname, asyncio.Semaphore(self.max_connections_per_host))
+        try:
+            async with semaphore:
+                await asyncio.wait_for(read(), timeout)
+        except asyncio.TimeoutError:
+            state["truncated"] = True
+        except httpx.TimeoutException:
+            state["truncated"] = True
+        except httpx.HTTPError as e:
+            raise FetchError(f"Fetching {url} failed: {e}", 502)
+        observe_stage("url_fetch", time.perf_counter() - start)
+        state["fetch_ms"] = (time.perf_counter() - start) * 1000
+        return state
+
+    async def _fetch(self, url: str) -> Dict:
+        parts = urlsplit(url)
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            raise FetchError("Only absolute http(s) URLs are supported", 400)
+
+        entry = await self._in_thread(self._load_entry, url)
+        if entry is not None and time.time() - entry["validated_at"] < self.revalidate_after:
+            content = await self._in_thread(self._read_blob, entry["sha256"])
+            if content is not None:
+                record_cache("url_fetch", True)
+                return self._result(url, entry, content, from_cache=True)
+
+        headers = {}
+        if entry is not None:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+        semaphore = self._host_limits.setdefault(parts.hostname, asyncio.Semaphore(self.max_connections_per_host))
+        download_start = time.perf_counter()
+        try:
+            async with semaphore:
+                content, response = await asyncio.wait_for(self._download(url, headers), self.timeout)
+        except asyncio.TimeoutError:
+            raise FetchError(f"Fetching {url} timed out after {self.timeout:g}s", 504)
+        except httpx.TimeoutException:
+            raise FetchError(f"Fetching {url} timed out", 504)
+        except httpx.HTTPError as e:
+            raise FetchError(f"Fetching {url} failed: {e}", 502)
+        observe_stage("url_fetch", time.perf_counter() - download_start)
+
+        if response.status_code == 304 and entry is not None:
+            content = await self._in_thread(self._read_blob, entry["sha256"])
+            if content is not None:
+                record_cache("url_fetch", True)
+                entry["validated_at"] = time.time()
+                await self._in_thread(self._save_entry, url, entry)
+                return self._result(url, entry, content, from_cache=True)
+            # The blob was evicted; download it again without validators
+            return await self._refetch(url)
+
+        record_cache("url_fetch", False)
+        entry = {
+            "sha256": hashlib.sha256(content).hexdigest(),
+            "etag": response.headers.get("etag"),
+            "last_modified": response.headers.get("last-modified"),
+            "content_type": response.headers.get("content-type", "").split(";")[0].strip().lower(),
+            "final_url": str(response.url),
+            "size": len(content),
+            "validated_at": time.time()
+        }
+        await self._in_thread(self._write_blob, entry["sha256"], content)
+        await self._in_thread(self._save_entry, url, entry)
+        return self._result(url, entry, content, from_cache=False)
+
+    async def _refetch(self, url: str) -> Dict:
+        await self._in_thread(self._delete_entry, url)
+        return await self._fetch(url)
+
+    @staticmethod
+    async def _in_thread(func: Callable, *args):
+        """Run blocking cache file I/O on the default executor, off the event loop"""
+        return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+    async def _download(self, url: str, headers: Dict):
+        """Stream the body, stopping as soon as it exceeds ``max_bytes``"""
+        async with self._get_client().stream("GET", url, headers=headers) as response:
+            if response.status_code == 304:
+                return b"", response
+            if response.status_code >= 400:
+                raise FetchError(f"{url} returned HTTP {response.status_code}", 502)
+
+            declared = response.headers.get("content-length")
+            if declared and declared.isdigit() and int(declared) > self.max_bytes:
+                raise FetchError(f"Content is larger than {self.max_bytes} bytes", 413)
+
+            chunks = []
+            received = 0
+            async for chunk in response.aiter_bytes():
+                received += len(chunk)
+                if received > self.max_bytes:
+                    raise FetchError(f"Content is larger than {self.max_bytes} bytes", 413)
+                chunks.append(chunk)
+            return b"".join(chunks), response
+
+    @staticmethod
+    def _result(url: str, entry: Dict, content: bytes, from_cache: bool) -> Dict:
+        return {
+            "url": url,
+            "final_url": entry.get("final_url", url),
+            "content": content,
+            "content_type": entry["content_type"],
+            "etag": entry.get("etag"),
+            "sha256": entry["sha256"],
+            "size": entry["size"],
+            "from_cache": from_cache
+        }
+
+    # On-disk cache: urls/<sha256(url)>.json points at blobs/<sha256(content)>
+
+    def _entry_path(self, url: str) -> str:
+        return os.path.join(self.cache_dir, "urls", hashlib.sha256(url.encode()).hexdigest() + ".json")
+
+    def _blob_path(self, digest: str) -> str:
+        return os.path.join(self.cache_dir, "blobs", digest)
+
+    def _load_entry(self, url: str) -> Optional[Dict]:
+        try:
+            with open(self._entry_path(url)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _save_entry(self, url: str, entry: Dict):
+        path = self._entry_path(url)
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, "w") as f:
+            json.dump(entry, f)
+        os.replace(temporary, path)
+
+    def _delete_entry(self, url: str):
+        try:
+            os.remove(self._entry_path(url))
+        except OSError:
+            pass
+
+    def _read_blob(self, digest: str) -> Optional[bytes]:
+        path = self._blob_path(digest)
+        try:
+            with open(path, "rb") as f:
+                content = f.read()
+            # Access time for LRU eviction (atime is often disabled on mounts)
+            os.utime(path)
+            return content
+        except OSError:
+            return None
+
+    def _write_blob(self, digest: str, content: bytes):
+        path = self._blob_path(digest)
+        if not os.path.exists(path):
+            temporary = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(temporary, "wb") as f:
+                f.write(content)
+            os.replace(temporary, path)
+            with self._cache_lock:
+                if self._cache_bytes is not None:
+                    self._cache_bytes += len(content)
+        # Only scan the directory once the running total may exceed the budget
+        if (self._cache_bytes is None or self._cache_bytes > self.cache_max_bytes
+                or time.time() - self._scanned_at > CACHE_RESCAN_SECONDS):
+            self._evict()
+
+    def _evict(self):
+        """Remove least recently used blobs until the cache fits its budget"""
+        with self._cache_lock:
+            directory = os.path.join(self.cache_dir, "blobs")
+            blobs = []
+            total = 0
+            for name in os.listdir(directory):
+                if name.endswith(".tmp"):
+                    continue
+                try:
+                    stat = os.stat(os.path.join(directory, name))
+                except OSError:
+                    continue
+                blobs.append((stat.st_mtime, stat.st_size, name))
+                total += stat.st_size
+            for _, size, name in sorted(blobs):
+                if total <= self.cache_max_bytes:
+                    break
+                try:
+                    os.remove(os.path.join(directory, name))
+                    total -= size
+                except OSError:
+                    pass
+            self._cache_bytes = total
+            self._scanned_at = time.time()
+
+_fetcher: Optional[URLFetcher] = None
+_fetcher_lock = threading.Lock()
+
+def get_url_fetcher() -> URLFetcher:
+    """Return the process-wide URL fetcher, configured from the environment"""
+    global _fetcher
+    if _fetcher is None:
+        with _fetcher_lock:
+            if _fetcher is None:
+                _fetcher = URLFetcher(
+                    cache_dir=os.getenv("FETCH_CACHE_DIR", os.path.join("data", "fetch_cache")),
+                    max_bytes=int(os.getenv("FETCH_MAX_BYTES", str(20 * 1024 * 1024))),
+                    timeout=float(os.getenv("FETCH_TIMEOUT", "15")),
+                    max_connections=int(os.getenv("FETCH_MAX_CONNECTIONS", "100")),
+                    max_connections_per_host=int(os.getenv("FETCH_MAX_CONNECTIONS_PER_HOST", "8")),
+                    cache_max_bytes=int(os.getenv("FETCH_CACHE_MAX_MB", "512")) * 1024 * 1024,
+                    revalidate_after=float(os.getenv("FETCH_REVALIDATE_AFTER", "300")),
+                    allow_private_hosts=os.getenv("FETCH_ALLOW_PRIVATE_HOSTS", "0") == "1"
+                )
+    return _fetcher
+
+async def fetch_image(url: str) -> Tuple[io.BytesIO, Dict]:
+    """Fetch an image URL into a file object the image processor can read"""
+    result = await get_url_fetcher().fetch(url, content_type_prefix="image/")
+    return io.BytesIO(result["content"]), result
@@ -1,28 +1,88 @@
 import time
+import importlib
 import cv2
 import numpy as np
+from contextlib import nullcontext
 from typing import Dict, Optional
 from PIL import Image
 import io
-import face_recognition
-from deepface import DeepFace
 import tensorflow as tf
 from tensorflow.keras.applications import Xception
 from tensorflow.keras.preprocessing import image as keras_image
+from utils.face_index import FaceIndex, get_face_index
+from utils.frequency_analysis import (
+    FrequencyAnalyzer, GRID_MISMATCH_THRESHOLD, SPECTRAL_TAIL_THRESHOLD, UPSAMPLING_PEAK_THRESHOLD
+)
+from utils.metrics import stage_timer, observe_stage, set_model_loaded
+from utils.model_manager import KerasOffloader, ModelManager, get_model_manager
+from utils.profiling import traced
+
+def keras_footprint(models) -> int:
+    """Bytes held by the weights of an (Xception, saliency model) pair; the two share their layers"""
+    return sum(int(np.prod(weight.shape)) * tf.as_dtype(weight.dtype).size for weight in models[0].weights)
+
+def load_face_recognition():
+    """Import face_recognition, which loads its dlib detector and encoder models at import time"""
+    return importlib.import_module('face_recognition')
 
 class ImageProcessor:
-    def __init__(self):
-        """Initialize the image processor with CV models"""
+    def __init__(self, load_models: bool = True, models: Optional[ModelManager] = None,
+                 face_index: Optional[FaceIndex] = None, frequency_analyzer: Optional[FrequencyAnalyzer] = None,
+                 prefilter_fake_threshold: float = 0.7, prefilter_real_threshold: float = 0.0):
+        """Initialize the image processor with CV models
+
+        Xception and the face_recognition (dlib) models are held by
+        ``models`` (by default the process-wide model manager), which may
+        evict Xception when memory runs short; they are loaded now and
+        leased while in use. face_recognition is pinned: its dlib models
+        live in module globals that are not freed short of process exit. With ``load_models`` disabled Xception is not
+        registered and predictions rely on the face artifact heuristics
+        alone.
+
+        Face encodings are looked up in ``face_index`` (by default the
+        process-wide index of confirmed deepfakes); a face that matches one
+        marks the image as a deepfake without running Xception.
+        
+        Every face also gets frequency-domain features from
+        ``frequency_analyzer``, computed for all faces of an image at once.
+        When prediction runs with the pre-filter enabled, images whose
+        artifact score is at least ``prefilter_fake_threshold`` (and above the
+        deepfake verdict threshold, so a pre-filtered fake is always reported
+        as one) or at most ``prefilter_real_threshold`` are decided without
+        Xception.
+        """
         self.device = 'cuda' if tf.config.list_physical_devices('GPU') else 'cpu'
         
+        # Last convolutional activation of Xception, used for Grad-CAM
+        self.saliency_layer_name = 'block14_sepconv2_act'
+        
         # Initialize face detection
         self.face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
         
+        # Models this processor registered with the manager; anything else is unavailable
+        self.models = models or get_model_manager()
+        self.managed = set()
+        
+        # Measured once, as resident set growth during the import below; pinned models are never reloaded
+        self._register('face_recognition', load_face_recognition, pinned=True)
+        
         # Initialize Xception model for deepfake detection
-        try:
-            self.xception_model = Xception(weights='imagenet', include_top=False, pooling='avg')
-        except:
-            self.xception_model = None
+        if load_models:
+            self._register('xception', lambda: self._build_xception('imagenet'), keras_footprint,
+                           KerasOffloader(lambda: self._build_xception(None), lambda models: models[0]))
+        for name in self.managed:
+            self.models.get(name)
+        
+        set_model_loaded('face_cascade', not self.face_cascade.empty())
+        
+        self.face_index = face_index or get_face_index()
+        self.known_face_score = 0.95
+        
+        self.frequency_analyzer = frequency_analyzer or FrequencyAnalyzer()
+        
+        # Artifact score pre-filter thresholds
+        self.prefilter_fake_threshold = prefilter_fake_threshold
+        self.prefilter_real_threshold = prefilter_real_threshold
         
         # Deepfake detection thresholds
         self.face_confidence_threshold = 0.5
@@ -32,6 +92,25 @@ class ImageProcessor:
         self.target_size = (224, 224)
         self.max_faces = 5
 
+    def _register(self, name: str, loader, footprint=None, offloader=None, pinned: bool = False):
+        self.models.register(name, loader, footprint, offloader, pinned=pinned)
+        self.managed.add(name)
+
+    def _use(self, name: Optional[str]):
+        """Lease a managed model for a block; yields None if this processor has no such model or it failed"""
+        if name not in self.managed:
+            return nullcontext()
+        return self.models.use(name)
+
+    def _build_xception(self, weights: Optional[str]):
+        """Xception and a model exposing its last conv block, so Grad-CAM can reuse the scoring activations"""
+        xception_model = Xception(weights=weights, include_top=False, pooling='avg')
+        saliency_model = tf.keras.Model(
+            inputs=xception_model.input,
+            outputs=xception_model.get_layer(self.saliency_layer_name).output
+        )
+        return xception_model, saliency_model
+
     def preprocess_image(self, image_file) -> np.ndarray:
         """Preprocess image for analysis"""
         try:
@@ -77,23 +156,41 @@ class ImageProcessor:
             })
         
         # Also try face_recognition library for better accuracy
-        try:
-            face_locations_fr = face_recognition.face_locations(img)
-            face_encodings = face_recognition.face_encodings(img, face_locations_fr)
-            
-            for i, (top, right, bottom, left) in enumerate(face_locations_fr):
-                face_img = img[top:bottom, left:right]
-                faces.append({
-                    'bbox': (left, top, right-left, bottom-top),
-                    'face_img': face_img,
-                    'encoding': face_encodings[i] if i < len(face_encodings) else None,
-                    'confidence': 0.9
-                })
-        except Exception as e:
-            print(f"Face recognition failed: {e}")
+        with self._use('face_recognition') as face_recognition:
+            try:
+                if face_recognition is None:
+                    raise RuntimeError("face_recognition is unavailable")
+                face_locations_fr = face_recognition.face_locations(img)
+                face_encodings = face_recognition.face_encodings(img, face_locations_fr)
+                
+                for i, (top, right, bottom, left) in enumerate(face_locations_fr):
+                    face_img = img[top:bottom, left:right]
+                    faces.append({
+                        'bbox': (left, top, right-left, bottom-top),
+                        'face_img': face_img,
+                        'encoding': face_encodings[i] if i < len(face_encodings) else None,
+                        'confidence': 0.9
+                    })
+            except Exception as e:
+                print(f"Face recognition failed: {e}")
         
         return faces[:self.max_faces]  # Limit number of faces
 
+    def face_encodings(self, image_file) -> np.ndarray:
+        """Encodings of the faces face_recognition finds in an image, one 128-d row per face"""
+        faces = self.detect_faces(self.preprocess_image(image_file))
+        encodings = [face['encoding'] for face in faces if face.get('encoding') is not None]
+        return np.array(encodings, dtype=np.float32).reshape(-1, 128)
+
+    def match_known_faces(self, faces: list) -> list:
+        """Faces whose encoding matches a confirmed deepfake, with the match (one batched index query)"""
+        encoded = [i for i, face in enumerate(faces) if face.get('encoding') is not None]
+        if not encoded or not len(self.face_index):
+            return []
+        with stage_timer('face_index'):
+            matches = self.face_index.match(np.stack([faces[i]['encoding'] for i in encoded]))
+        return [{"face": i, **match} for i, match in zip(encoded, matches) if match is not None]
+
     def extract_image_features(self, img: np.ndarray) -> Dict:
         """Extract features from image for deepfake detection"""
         features = {}
@@ -152,31 +249,93 @@ class ImageProcessor:
         
         return artifacts
 
-    def predict(self, image_file, analyze_faces: bool = True) -> Dict:
-        """Predict whether image contains deepfakes"""
-        start_time = time.time()
+    def _preprocess_faces(self, faces: list) -> np.ndarray:
+        """Resize face crops and stack them into one Xception input batch"""
+        batch = []
+        for face in faces:
+            face_pil = Image.fromarray(face['face_img'])
+            face_pil = face_pil.resize(self.target_size)
+            batch.append(keras_image.img_to_array(face_pil))
+        return tf.keras.applications.xception.preprocess_input(np.stack(batch))
+
+    def score_faces_with_saliency(self, faces: list, saliency_model) -> Dict:
+        """Score face crops with Xception and compute Grad-CAM maps in the same pass
+
+        All faces go through the network in one batch. The pooled features
+        used for scoring are the global average of the last conv block, so
+        the same activations (and a single backward pass to them) yield the
+        Grad-CAM map for each face. The Grad-CAM target is the spread of the
+        pooled features, which is what the score heuristic inspects.
+        """
+        x = self._preprocess_faces(faces)
+        
+        start_time = time.perf_counter()
+        with tf.GradientTape() as tape:
+            conv_maps = saliency_model(x, training=False)
+            tape.watch(conv_maps)
+            pooled = tf.reduce_mean(conv_maps, axis=[1, 2])
+            target = tf.math.reduce_std(pooled, axis=1)
+        xception_time = time.perf_counter() - start_time
+        
+        # Grad-CAM: channel weights are the spatially averaged gradients
+        start_time = time.perf_counter()
+        grads = tape.gradient(target, conv_maps)
+        weights = tf.reduce_mean(grads, axis=[1, 2])
+        cams = tf.nn.relu(tf.einsum('nhwc,nc->nhw', conv_maps, weights)).numpy()
+        cam_max = cams.reshape(len(faces), -1).max(axis=1)
+        cams = cams / np.where(cam_max > 0, cam_max, 1.0)[:, None, None]
+        saliency_time = time.perf_counter() - start_time
+        
+        pooled = pooled.numpy()
+        return {
+            "feature_means": pooled.mean(axis=1),
+            "feature_stds": pooled.std(axis=1),
+            "saliency_maps": cams.astype(np.float32),
+            "xception_time": xception_time,
+            "saliency_time": saliency_time
+        }
+
+    @traced("image_processor.predict")
+    def predict(self, image_file, analyze_faces: bool = True, prefilter: bool = False) -> Dict:
+        """Predict whether image contains deepfakes
+
+        With ``prefilter`` enabled, images the artifact and frequency
+        features already decide skip Xception and Grad-CAM.
+        """
+        start_time = time.perf_counter()
         
         try:
             # Preprocess image
-            img = self.preprocess_image(image_file)
+            with stage_timer('decode'):
+                img = self.preprocess_image(image_file)
             
             # Extract general image features
-            features = self.extract_image_features(img)
+            with stage_timer('image_features'):
+                features = self.extract_image_features(img)
             
             # Detect faces
-            faces = self.detect_faces(img) if analyze_faces else []
+            with stage_timer('face_detection'):
+                faces = self.detect_faces(img) if analyze_faces else []
             
             # Initialize deepfake score
             deepfake_score = 0.0
             face_artifacts = []
             
+            # Frequency-domain features of all faces in one batched pass
+            frequency_features = []
+            if faces:
+                with stage_timer('frequency_analysis'):
+                    frequency_features = self.frequency_analyzer.analyze(img, [face['bbox'] for face in faces])
+            
             # Analyze each face for artifacts
-            for face in faces:
+            artifact_start = time.perf_counter()
+            for face, frequency in zip(faces, frequency_features):
                 artifacts = self.analyze_face_artifacts(face['face_img'])
+                artifacts.update(frequency)
                 face_artifacts.append(artifacts)
                 
-                # Calculate artifact score
-                artifact_score = 0.0
+                # Calculate artifact score, starting from the spectral and JPEG grid evidence
+                artifact_score = artifacts['frequency_score']
                 
                 # High edge density might indicate manipulation
                 if artifacts['edge_density'] > 0.1:
@@ -192,38 +351,45 @@ class ImageProcessor:
                 
                 deepfake_score = max(deepfake_score, artifact_score)
             
+            if faces:
+                observe_stage('artifact_analysis', time.perf_counter() - artifact_start)
+            
+            # Faces already confirmed as deepfakes decide the verdict on their own
+            known_faces = self.match_known_faces(faces)
+            if known_faces:
+                deepfake_score = max(deepfake_score, self.known_face_score)
+            
+            # Scores the cheap stages already decide need no Xception pass
+            prefiltered = bool(prefilter and faces and not known_faces and (
+                (deepfake_score >= self.prefilter_fake_threshold and deepfake_score > self.deepfake_threshold)
+                or deepfake_score <= self.prefilter_real_threshold
+            ))
+            
             # Use Xception model if available
-            if self.xception_model and len(faces) > 0:
-                try:
-                    # Use the largest face for analysis
-                    largest_face = max(faces, key=lambda x: x['face_img'].shape[0] * x['face_img'].shape[1])
-                    face_img = largest_face['face_img']
+            saliency_maps = []
+            timings = {}
+            with self._use('xception' if faces and not known_faces and not prefiltered else None) as xception:
+                if xception is not None:
+                    try:
+                        xception_result = self.score_faces_with_saliency(faces, xception[1])
+                        saliency_maps = list(xception_result["saliency_maps"])
+                        timings["xception"] = xception_result["xception_time"]
+                        timings["saliency"] = xception_result["saliency_time"]
+                        observe_stage('xception', timings["xception"])
+                        observe_stage('saliency', timings["saliency"])
+                        
+                        # Unusual feature patterns on any face might indicate deepfake
+                        for feature_mean, feature_std in zip(xception_result["feature_means"], xception_result["feature_stds"]):
+                            if feature_std > 0.5 or feature_mean < -0.1:
+                                deepfake_score = max(deepfake_score, 0.4)
                     
-                    # Preprocess for Xception
-                    face_pil = Image.fromarray(face_img)
-                    face_pil = face_pil.resize(self.target_size)
-                    x = keras_image.img_to_array(face_pil)
-                    x = np.expand_dims(x, axis=0)
-                    x = tf.keras.applications.xception.preprocess_input(x)
-                    
-                    # Extract features
-                    features_xception = self.xception_model.predict(x)
-                    
-                    # Simple classification based on feature statistics
-                    feature_mean = np.mean(features_xception)
-                    feature_std = np.std(features_xception)
-                    
-                    # Unusual feature patterns might indicate deepfake
-                    if feature_std > 0.5 or feature_mean < -0.1:
-                        deepfake_score = max(deepfake_score, 0.4)
-                
-                except Exception as e:
-                    print(f"Xception analysis failed: {e}")
+                    except Exception as e:
+                        print(f"Xception analysis failed: {e}")
             
             # Normalize score
             deepfake_score = max(0.0, min(1.0, deepfake_score))
             
-            processing_time = time.time() - start_time
+            processing_time = time.perf_counter() - start_time
             
             return {
                 "is_deepfake": deepfake_score > self.deepfake_threshold,
@@ -232,6 +398,11 @@ class ImageProcessor:
                 "face_detected": len(faces) > 0,
                 "face_count": len(faces),
                 "face_artifacts": face_artifacts,
+                "face_boxes": [[int(v) for v in face['bbox']] for face in faces],
+                "known_faces": known_faces,
+                "prefiltered": prefiltered,
+                "saliency_maps": saliency_maps,
+                "timings": timings,
                 "processing_time": processing_time,
                 "image_features": features
             }
@@ -257,6 +428,12 @@ class ImageProcessor:
                 importance[artifact] = value * 0.3 if value > 1000 else 0
             elif artifact == 'symmetry_score':
                 importance[artifact] = value * 0.2 if value > 0.95 else 0
+            elif artifact == 'spectral_tail':
+                importance[artifact] = value * 0.3 if value > SPECTRAL_TAIL_THRESHOLD else 0
+            elif artifact == 'upsampling_peak':
+                importance[artifact] = value * 0.3 if value > UPSAMPLING_PEAK_THRESHOLD else 0
+            elif artifact == 'jpeg_grid_mismatch':
+                importance[artifact] = value * 0.3 if value > GRID_MISMATCH_THRESHOLD else 0
             else:
                 importance[artifact] = 0
         
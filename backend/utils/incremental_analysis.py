@@ -0,0 +1,190 @@
+import hashlib
+import re
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+from utils.metrics import record_cache, stage_timer
+from utils.text_processor import TextProcessor, rule_based_score, scan_text
+
+PARAGRAPH_PATTERN = re.compile(r'\S(?:.*?\S)?(?=\s*\n\s*\n|\s*$)', re.DOTALL)
+SENTENCE_END_PATTERN = re.compile(r'(?<=[.!?])\s+')
+
+# Statistics that add up across chunks (indicator counts are distinct phrases, so they are unioned instead)
+ADDITIVE_STATS = ('word_count', 'exclamation_count')
+
+class IncrementalTextSession:
+    def __init__(self, processor: TextProcessor, max_chunk_words: int = 300, max_chars: int = 200000,
+                 cache_size: int = 4096, language: Optional[str] = None):
+        """Per-connection document state that re-scores only the chunks an edit touched
+
+        The document is split into chunks at paragraph breaks, with long
+        paragraphs split further at sentence ends so no chunk exceeds
+        ``max_chunk_words`` words (and so fits the model's window). Each
+        chunk's model score and indicator scan are cached by content hash,
+        so after an edit only new or changed chunks are scored, in batched
+        forward passes; the document verdict is aggregated from the
+        chunk results. The cache keeps the ``cache_size`` most recently
+        used chunks, so undo and moved paragraphs are free as well.
+        Chunks are scanned with the lexicon and scored by the model of
+        ``language``, or of the document's identified language when it is
+        ``auto`` or missing.
+        """
+        self.processor = processor
+        self.max_chunk_words = max_chunk_words
+        self.max_chars = max_chars
+        self.cache_size = cache_size
+        self.language = language
+        self.text = ""
+        self.version = 0
+        self._cache: "OrderedDict[str, Dict]" = OrderedDict()
+
+    def set_text(self, text: str):
+        """Replace the whole document"""
+        self._check_edit(text, len(self.text))
+        self.text = text
+        self.version += 1
+
+    def apply_edit(self, start: int, end: int, replacement: str):
+        """Replace ``text[start:end]`` with ``replacement`` (character offsets)"""
+        if not 0 <= start <= end <= len(self.text):
+            raise ValueError(f"Edit range {start}-{end} is outside the document (length {len(self.text)})")
+        self._check_edit(replacement, end - start)
+        self.text = self.text[:start] + replacement + self.text[end:]
+        self.version += 1
+
+    def _check_edit(self, replacement: str, removed: int):
+        if not isinstance(replacement, str):
+            raise ValueError("Text must be a string")
+        if len(self.text) - removed + len(replacement) > self.max_chars:
+            raise ValueError(f"Document exceeds {self.max_chars} characters")
+
+    def segment(self, text: str) -> List[Tuple[int, int]]:
+        """Character spans of the document's chunks"""
+        spans = []
+        for paragraph in PARAGRAPH_PATTERN.finditer(text):
+            start, end = paragraph.span()
+            if len(paragraph.group().split()) <= self.max_chunk_words:
+                spans.append((start, end))
+                continue
+            # Pack sentences into chunks of at most max_chunk_words words
+            chunk_start, words = start, 0
+            position = start
+            for boundary in SENTENCE_END_PATTERN.finditer(text, start, end):
+                sentence_words = len(text[position:boundary.start()].split())
+                if words and words + sentence_words > self.max_chunk_words:
+                    spans.append((chunk_start, position))
+                    chunk_start, words = position, 0
+                words += sentence_words
+                position = boundary.end()
+            spans.append((chunk_start, end))
+        return [(start, end) for start, end in spans if text[start:end].strip()]
+
+    def snapshot(self) -> Tuple[str, int]:
+        """The current document and its version, to score off the event loop"""
+        return self.text, self.version
+
+    def score(self, snapshot: Optional[Tuple[str, int]] = None) -> Dict:
+        """Score a snapshot of the document (the current one by default), reusing cached chunk results
+
+        Take the snapshot where edits are applied, so an edit landing while
+        the chunks are scored cannot pair one version's text with another's
+        number.
+        """
+        start_time = time.perf_counter()
+        text, version = snapshot if snapshot is not None else self.snapshot()
+        language, _ = self.processor.detect_language(text, self.language)
+        spans = self.segment(text)
+
+        chunks = []
+        missing: Dict[str, str] = {}
+        for start, end in spans:
+            chunk_text = text[start:end].strip()
+            key = f"{language}:" + hashlib.sha1(chunk_text.encode('utf-8')).hexdigest()
+            cached = key in self._cache
+            record_cache('incremental_chunks', cached)
+            if cached:
+                self._cache.move_to_end(key)
+            else:
+                missing[key] = chunk_text
+            chunks.append({"key": key, "start": start, "end": end, "cached": cached})
+
+        if missing:
+            self._score_chunks(missing, language)
+
+        results = [self._cache[chunk["key"]] for chunk in chunks]
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+        statistics = self._aggregate(text, results)
+        weights = [max(1, result["statistics"]["word_count"]) for result in results]
+        if results and self.processor.model_available(language):
+            fake_score = sum(result["fake_score"] * w for result, w in zip(results, weights)) / sum(weights)
+        else:
+            fake_score = max(0.0, min(1.0, rule_based_score(statistics)))
+
+        return {
+            "version": version,
+            "language": language,
+            "is_fake": fake_score > 0.5,
+            "confidence": fake_score if fake_score > 0.5 else 1 - fake_score,
+            "fake_score": fake_score,
+            "statistics": statistics,
+            "chunks": [{
+                "start": chunk["start"],
+                "end": chunk["end"],
+                "fake_score": result["fake_score"],
+                "fake_indicators": result["statistics"]["fake_indicators"],
+                "credible_indicators": result["statistics"]["credible_indicators"],
+                "cached": chunk["cached"]
+            } for chunk, result in zip(chunks, results)],
+            "rescored": len(missing),
+            "reused": len(chunks) - len(missing),
+            "processing_time": time.perf_counter() - start_time
+        }
+
+    def _score_chunks(self, missing: Dict[str, str], language: str):
+        """Scan and score new chunks in batched forward passes of ``sentence_batch_size``"""
+        processor = self.processor
+        lexicon = processor.lexicon(language)
+        with stage_timer('text_scan'):
+            statistics = {key: scan_text(chunk_text, lexicon.fake, lexicon.credible)[1]
+                          for key, chunk_text in missing.items()}
+            # Phrases found in each chunk, so the document counts each phrase once
+            phrases = {}
+            for key, chunk_text in missing.items():
+                phrase_text = ' '.join(chunk_text.lower().split())
+                phrases[key] = (frozenset(lexicon.fake.matches(phrase_text)),
+                                frozenset(lexicon.credible.matches(phrase_text)))
+        if processor.model_available(language):
+            texts = list(missing.values())
+            scores = []
+            for offset in range(0, len(texts), processor.sentence_batch_size):
+                batch = texts[offset:offset + processor.sentence_batch_size]
+                scores.extend(processor.score_texts(batch, language)["scores"])
+        else:
+            scores = [max(0.0, min(1.0, rule_based_score(statistics[key]))) for key in missing]
+        for key, score in zip(missing, scores):
+            self._cache[key] = {"fake_score": float(score), "statistics": statistics[key],
+                                "fake_phrases": phrases[key][0], "credible_phrases": phrases[key][1]}
+
+    @staticmethod
+    def _aggregate(text: str, results: List[Dict]) -> Dict:
+        """Document statistics from per-chunk statistics, matching ``scan_text`` on the whole text
+
+        Indicator counts are the distinct phrases over all chunks, as in
+        ``scan_text``; only a phrase split across two chunks is not found.
+        """
+        statistics = {key: sum(result["statistics"][key] for result in results) for key in ADDITIVE_STATS}
+        statistics["fake_indicators"] = len(frozenset().union(*(result["fake_phrases"] for result in results)))
+        statistics["credible_indicators"] = len(frozenset().union(*(result["credible_phrases"] for result in results)))
+        characters = sum(result["statistics"]["length"] for result in results)
+        statistics["length"] = len(text)
+        statistics["avg_word_length"] = (
+            sum(result["statistics"]["avg_word_length"] * result["statistics"]["word_count"] for result in results)
+            / statistics["word_count"] if statistics["word_count"] else 0
+        )
+        statistics["caps_ratio"] = (
+            sum(result["statistics"]["caps_ratio"] * result["statistics"]["length"] for result in results) / characters
+            if characters else 0
+        )
+        return statistics
@@ -0,0 +1,385 @@
+import math
+import os
+import re
+import threading
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import numpy as np
+from utils.model_manager import ModelManager
+
+DEFAULT_LANGUAGE = "en"
+
+# Training text per language: articles 1 and 3-7 of the Universal Declaration
+# of Human Rights, a few news sentences and frequent function words. Short,
+# but enough for the trigram coverage check to tell these languages from
+# unsupported ones and for character n-grams to separate them reliably.
+LANGUAGE_SAMPLES = {
+    "en": "All human beings are born free and equal in dignity and rights. They are endowed with reason and "
+          "conscience and should act towards one another in a spirit of brotherhood. "
+          "Everyone has the right to life, liberty and security of person. No one shall be held in slavery or "
+          "servitude; slavery and the slave trade shall be prohibited in all their forms. No one shall be "
+          "subjected to torture or to cruel, inhuman or degrading treatment or punishment. Everyone has the "
+          "right to recognition everywhere as a person before the law. All are equal before the law and are "
+          "entitled without any discrimination to equal protection of the law. The minister said on Tuesday "
+          "that the new law will come into force next year after a vote in parliament. Police reported that "
+          "several people were injured in the city, and officials are investigating the cause of the fire. "
+          "Experts say prices could rise again because of the war and the weak economy. "
+          "the of and to in is that it was for on are with as his they be at one have this from by not but what "
+          "all were when we there can an your which their said if do will each about how up out them then she "
+          "many some so these would other into has more her two like him see time could no make than first been "
+          "its who now people my made over did down only way find use may long little very after words called "
+          "just where most know government according news report",
+    "es": "Todos los seres humanos nacen libres e iguales en dignidad y derechos y, dotados como están de razón "
+          "y conciencia, deben comportarse fraternalmente los unos con los otros. "
+          "Todo individuo tiene derecho a la vida, a la libertad y a la seguridad de su persona. Nadie estará "
+          "sometido a esclavitud ni a servidumbre; la esclavitud y la trata de esclavos están prohibidas en "
+          "todas sus formas. Nadie será sometido a torturas ni a penas o tratos crueles, inhumanos o "
+          "degradantes. Todo ser humano tiene derecho, en todas partes, al reconocimiento de su personalidad "
+          "jurídica. Todos son iguales ante la ley y tienen, sin distinción, derecho a igual protección de la "
+          "ley. El ministro dijo el martes que la nueva ley entrará en vigor el próximo año tras una votación "
+          "en el parlamento. La policía informó de que varias personas resultaron heridas en la ciudad, y las "
+          "autoridades investigan la causa del incendio. Los expertos dicen que los precios podrían volver a "
+          "subir por la guerra y la débil economía. "
+          "de la que el en y a los se del las un por con no una su para es al lo como más pero sus le ya o este "
+          "sí porque esta entre cuando muy sin sobre también me hasta hay donde quien desde todo nos durante "
+          "todos uno les ni contra otros ese eso ante ellos esto antes algunos qué unos yo otro otras otra él "
+          "tanto esa estos mucho quienes nada muchos cual poco ella estar estas algunas algo nosotros gobierno "
+          "según noticias informe",
+    "fr": "Tous les êtres humains naissent libres et égaux en dignité et en droits. Ils sont doués de raison et "
+          "de conscience et doivent agir les uns envers les autres dans un esprit de fraternité. "
+          "Tout individu a droit à la vie, à la liberté et à la sûreté de sa personne. Nul ne sera tenu en "
+          "esclavage ni en servitude; l'esclavage et la traite des esclaves sont interdits sous toutes leurs "
+          "formes. Nul ne sera soumis à la torture, ni à des peines ou traitements cruels, inhumains ou "
+          "dégradants. Chacun a le droit à la reconnaissance en tous lieux de sa personnalité juridique. Tous "
+          "sont égaux devant la loi et ont droit sans distinction à une égale protection de la loi. Le ministre"
+          " a déclaré mardi que la nouvelle loi entrera en vigueur l'année prochaine après un vote au "
+          "parlement. La police a indiqué que plusieurs personnes ont été blessées dans la ville, et les "
+          "autorités enquêtent sur la cause de l'incendie. Selon les experts, les prix pourraient encore "
+          "augmenter à cause de la guerre et de la faiblesse de l'économie. "
+          "le de un être et à il avoir ne je son que se qui ce dans en du elle au pour pas plus par sur faire "
+          "comme mais nous avec tout aller voir bien où sans tu ou leur homme si deux moi vouloir te femme venir "
+          "quand grand celui notre devoir là jour prendre même votre rien petit encore aussi quelque dire cette "
+          "ces été selon gouvernement nouvelles rapport",
+    "de": "Alle Menschen sind frei und gleich an Würde und Rechten geboren. Sie sind mit Vernunft und Gewissen "
+          "begabt und sollen einander im Geist der Brüderlichkeit begegnen. "
+          "Jeder hat das Recht auf Leben, Freiheit und Sicherheit der Person. Niemand darf in Sklaverei oder "
+          "Leibeigenschaft gehalten werden; Sklaverei und Sklavenhandel in allen ihren Formen sind verboten. "
+          "Niemand darf der Folter oder grausamer, unmenschlicher oder erniedrigender Behandlung oder Strafe "
+          "unterworfen werden. Jeder hat das Recht, überall als rechtsfähig anerkannt zu werden. Alle Menschen "
+          "sind vor dem Gesetz gleich und haben ohne Unterschied Anspruch auf gleichen Schutz durch das Gesetz."
+          " Der Minister sagte am Dienstag, dass das neue Gesetz nach einer Abstimmung im Parlament im nächsten"
+          " Jahr in Kraft treten wird. Die Polizei teilte mit, dass mehrere Menschen in der Stadt verletzt "
+          "wurden, und die Behörden untersuchen die Ursache des Feuers. Experten sagen, dass die Preise wegen "
+          "des Krieges und der schwachen Wirtschaft wieder steigen könnten. "
+          "der die und in den von zu das mit sich des auf für ist im dem nicht ein eine als auch es an werden "
+          "aus er hat dass sie nach wird bei einer um am sind noch wie einem über einen so zum war haben nur oder "
+          "aber vor zur bis mehr durch man sein wurde sei ihre schon wenn jahr zwei kann diese gegen vom können "
+          "dann ihr seine sagte regierung laut nachrichten bericht",
+    "it": "Tutti gli esseri umani nascono liberi ed eguali in dignità e diritti. Essi sono dotati di ragione e "
+          "di coscienza e devono agire gli uni verso gli altri in spirito di fratellanza. "
+          "Ogni individuo ha diritto alla vita, alla libertà ed alla sicurezza della propria persona. Nessun "
+          "individuo potrà essere tenuto in stato di schiavitù o di servitù; la schiavitù e la tratta degli "
+          "schiavi saranno proibite sotto qualsiasi forma. Nessun individuo potrà essere sottoposto a tortura o"
+          " a trattamento o punizione crudeli, inumani o degradanti. Ogni individuo ha diritto, in ogni luogo, "
+          "al riconoscimento della sua personalità giuridica. Tutti sono eguali dinanzi alla legge e hanno "
+          "diritto, senza alcuna discriminazione, ad una eguale tutela da parte della legge. Il ministro ha "
+          "detto martedì che la nuova legge entrerà in vigore il prossimo anno dopo un voto in parlamento. La "
+          "polizia ha riferito che diverse persone sono rimaste ferite in città, e le autorità stanno indagando"
+          " sulla causa dell'incendio. Secondo gli esperti i prezzi potrebbero aumentare di nuovo a causa della"
+          " guerra e dell'economia debole. "
+          "di che è e la il un a per in una sono mi ho non lo ma ti le si con cosa se io come da del questo bene "
+          "qui hai no più della tutto lei gli nel anche alla ci me sul nella suo sua dei delle degli stato essere "
+          "molto perché quando ancora dopo secondo governo notizie rapporto",
+    "pt": "Todos os seres humanos nascem livres e iguais em dignidade e em direitos. Dotados de razão e de "
+          "consciência, devem agir uns para com os outros em espírito de fraternidade. "
+          "Todo indivíduo tem direito à vida, à liberdade e à segurança pessoal. Ninguém será mantido em "
+          "escravatura ou em servidão; a escravatura e o trato dos escravos, sob todas as formas, são "
+          "proibidos. Ninguém será submetido a tortura nem a penas ou tratamentos cruéis, desumanos ou "
+          "degradantes. Todos os indivíduos têm direito ao reconhecimento em todos os lugares da sua "
+          "personalidade jurídica. Todos são iguais perante a lei e, sem distinção, têm direito a igual "
+          "proteção da lei. O ministro disse na terça-feira que a nova lei entrará em vigor no próximo ano após"
+          " uma votação no parlamento. A polícia informou que várias pessoas ficaram feridas na cidade, e as "
+          "autoridades estão investigando a causa do incêndio. Segundo os especialistas, os preços podem voltar"
+          " a subir por causa da guerra e da economia fraca. "
+          "de a o que e do da em um para é com não uma os no se na por mais as dos como mas foi ao ele das tem à "
+          "seu sua ou ser quando muito há nos já está eu também só pelo pela até isso ela entre era depois sem "
+          "mesmo aos ter seus quem nas me esse eles estão você tinha foram essa num nem suas meu às minha têm "
+          "numa pelos elas havia seja qual será nós governo segundo notícias relatório",
+    "nl": "Alle mensen worden vrij en gelijk in waardigheid en rechten geboren. Zij zijn begiftigd met verstand "
+          "en geweten, en behoren zich jegens elkander in een geest van broederschap te gedragen. "
+          "Een ieder heeft het recht op leven, vrijheid en onschendbaarheid van zijn persoon. Niemand zal in "
+          "slavernij of horigheid gehouden worden. Slavernij en slavenhandel in iedere vorm zijn verboden. "
+          "Niemand zal onderworpen worden aan folteringen, noch aan een wrede, onmenselijke of onterende "
+          "behandeling of bestraffing. Een ieder heeft, waar hij zich ook bevindt, het recht als persoon erkend"
+          " te worden voor de wet. Allen zijn gelijk voor de wet en hebben zonder onderscheid aanspraak op "
+          "gelijke bescherming door de wet. De minister zei dinsdag dat de nieuwe wet volgend jaar na een "
+          "stemming in het parlement in werking zal treden. De politie meldde dat meerdere mensen in de stad "
+          "gewond zijn geraakt, en de autoriteiten onderzoeken de oorzaak van de brand. Volgens deskundigen "
+          "kunnen de prijzen opnieuw stijgen door de oorlog en de zwakke economie. "
+          "de en van ik te dat die in een hij het niet zijn is was op aan met als voor had er maar om hem dan zou "
+          "of wat mijn men dit zo door over ze zich bij ook tot je mij uit der daar haar naar heb hoe heeft "
+          "hebben deze u want nog zal me zij nu geen omdat iets worden toch al waren veel meer doen toen moet "
+          "ben zonder kan hun dus alles onder ja eens hier wie werd altijd wordt kunnen ons zelf tegen na wil "
+          "kon niets uw iemand geweest andere regering volgens nieuws rapport",
+    "ru": "Все люди рождаются свободными и равными в своем достоинстве и правах. Они наделены разумом и совестью "
+          "и должны поступать в отношении друг друга в духе братства. "
+          "Каждый человек имеет право на жизнь, на свободу и на личную неприкосновенность. Никто не должен "
+          "содержаться в рабстве или в подневольном состоянии; рабство и работорговля запрещаются во всех их "
+          "видах. Никто не должен подвергаться пыткам или жестоким, бесчеловечным или унижающим его достоинство"
+          " обращению и наказанию. Каждый человек, где бы он ни находился, имеет право на признание его "
+          "правосубъектности. Все люди равны перед законом и имеют право, без всякого различия, на равную "
+          "защиту закона. Министр заявил во вторник, что новый закон вступит в силу в следующем году после "
+          "голосования в парламенте. Полиция сообщила, что несколько человек получили ранения в городе, и "
+          "власти выясняют причину пожара. По словам экспертов, цены могут снова вырасти из-за войны и слабой "
+          "экономики. "
+          "и в во не что он на я с со как а то все она так его но да ты к у же вы за бы по только ее мне было "
+          "вот от меня еще нет о из ему теперь когда даже ну вдруг ли если уже или ни быть был него до вас "
+          "опять уж вам ведь там потом себя ничего ей может они тут где есть надо ней для мы тебя их чем была "
+          "сам чтобы без будто чего раз тоже себе под будет тогда кто этот того потому этого какой совсем ним "
+          "здесь этом один почти мой тем сейчас были куда зачем всех никогда можно при два об другой после над "
+          "больше тот через эти нас про всего них много три эту моя хорошо свою этой перед лучше том нельзя "
+          "такой им более всегда между правительство по данным новости доклад",
+}
+
+# Indicator phrases per language (lowercase; matched as substrings like the English lists)
+LEXICONS = {
+    "es": {
+        "fake": ["falso", "bulo", "engaño", "conspiración", "no verificado", "rumor", "supuestamente",
+                 "presuntamente", "fuente anónima", "exclusiva", "última hora", "impactante", "no creerás",
+                 "viral", "increíble", "compártelo"],
+        "credible": ["estudio", "investigación", "oficial", "gobierno", "universidad", "revisado por pares",
+                     "revista científica", "publicado", "verificado", "confirmado", "experto", "científico"],
+    },
+    "fr": {
+        "fake": ["faux", "canular", "complot", "non vérifié", "rumeur", "prétendument", "soi-disant",
+                 "source anonyme", "exclusif", "dernière minute", "choquant", "vous ne croirez pas", "viral",
+                 "incroyable", "partagez"],
+        "credible": ["étude", "recherche", "officiel", "gouvernement", "université", "évalué par les pairs",
+                     "revue", "publié", "vérifié", "confirmé", "expert", "scientifique"],
+    },
+    "de": {
+        "fake": ["fälschung", "falschmeldung", "verschwörung", "unbestätigt", "gerücht", "angeblich",
+                 "vermeintlich", "anonyme quelle", "exklusiv", "eilmeldung", "schockierend",
+                 "sie werden nicht glauben", "viral", "unglaublich", "teilen sie"],
+        "credible": ["studie", "forschung", "offiziell", "regierung", "universität", "begutachtet",
+                     "fachzeitschrift", "veröffentlicht", "verifiziert", "bestätigt", "experte", "wissenschaftler"],
+    },
+    "it": {
+        "fake": ["falso", "bufala", "complotto", "non verificato", "presumibilmente", "fonte anonima",
+                 "esclusiva", "ultima ora", "scioccante", "non crederai", "virale", "incredibile", "condividi"],
+        "credible": ["studio", "ricerca", "ufficiale", "governo", "università", "revisione paritaria", "rivista",
+                     "pubblicato", "verificato", "confermato", "esperto", "scienziato"],
+    },
+    "pt": {
+        "fake": ["falso", "boato", "farsa", "conspiração", "não verificado", "supostamente", "alegadamente",
+                 "fonte anônima", "exclusivo", "urgente", "chocante", "você não vai acreditar", "viral",
+                 "incrível", "compartilhe"],
+        "credible": ["estudo", "pesquisa", "oficial", "governo", "universidade", "revisado por pares",
+                     "revista científica", "publicado", "verificado", "confirmado", "especialista", "cientista"],
+    },
+    "nl": {
+        "fake": ["nep", "hoax", "complot", "onbevestigd", "gerucht", "zogenaamd", "vermeend", "anonieme bron",
+                 "exclusief", "schokkend", "je zult niet geloven", "viraal", "ongelooflijk", "deel dit"],
+        "credible": ["onderzoek", "studie", "officieel", "overheid", "universiteit", "peer-reviewed",
+                     "tijdschrift", "gepubliceerd", "geverifieerd", "bevestigd", "deskundige", "wetenschapper"],
+    },
+    "ru": {
+        # Stems, so inflected forms match as substrings
+        "fake": ["фейк", "фальшивк", "заговор", "непроверенн", "слух", "якобы", "анонимный источник", "эксклюзив",
+                 "срочно", "шок", "вы не поверите", "вирусн", "сенсаци"],
+        "credible": ["исследовани", "официальн", "правительств", "университет", "рецензируем", "журнал",
+                     "опубликован", "подтвержден", "проверен", "эксперт", "учен"],
+    },
+}
+
+# NLTK stopword corpus names
+NLTK_LANGUAGE_NAMES = {
+    "en": "english", "es": "spanish", "fr": "french", "de": "german",
+    "it": "italian", "pt": "portuguese", "nl": "dutch", "ru": "russian",
+}
+
+NON_LETTER_PATTERN = re.compile(r'[\W\d_]+')
+
+def normalize_language(language: Optional[str]) -> Optional[str]:
+    """Lowercase ISO 639-1 code from tags like ``en-US``; None for auto-detection"""
+    if not language or language.lower() == "auto":
+        return None
+    return language.lower().replace("_", "-").split("-")[0]
+
+class LanguageIdentifier:
+    def __init__(self, samples: Dict[str, str], ngram_sizes: Tuple[int, ...] = (1, 2, 3),
+                 max_chars: int = 512, smoothing: float = 0.5, min_coverage: float = 0.45,
+                 margin_scale: float = 0.02, min_ngrams: int = 24):
+        """Naive Bayes language identification over character n-grams
+
+        Each language's n-gram log probabilities are precomputed into one
+        matrix; identifying a text looks up the row of each of its n-grams
+        (from the first ``max_chars`` characters) and sums them, so a
+        typical text is classified in well under a millisecond.
+
+        Naive Bayes always picks some language, so text in a language
+        without samples is rejected when fewer than ``min_coverage`` of
+        its longest n-grams occur in the best language's sample. The
+        confidence comes from the log-likelihood margin over the runner-up
+        per n-gram rather than the posterior, which saturates at 1.0 for
+        any text of a few words: ``1 - exp(-margin / margin_scale)``,
+        scaled down for texts with fewer than ``min_ngrams`` n-grams.
+        """
+        self.ngram_sizes = ngram_sizes
+        self.max_chars = max_chars
+        self.min_coverage = min_coverage
+        self.margin_scale = margin_scale
+        self.min_ngrams = min_ngrams
+        self.languages = list(samples)
+
+        counts = {language: Counter(self._ngrams(sample)) for language, sample in samples.items()}
+        vocabulary = sorted(set().union(*counts.values()))
+        self._index = {gram: i for i, gram in enumerate(vocabulary)}
+
+        log_probs = np.empty((len(vocabulary), len(self.languages)), dtype=np.float64)
+        self._unseen = np.empty(len(self.languages), dtype=np.float64)
+        for column, language in enumerate(self.languages):
+            total = sum(counts[language].values()) + smoothing * (len(vocabulary) + 1)
+            log_probs[:, column] = [math.log((counts[language][gram] + smoothing) / total) for gram in vocabulary]
+            self._unseen[column] = math.log(smoothing / total)
+        self._log_probs = log_probs
+        self._seen = log_probs > self._unseen
+
+    def _ngrams(self, text: str) -> List[str]:
+        grams = []
+        for word in NON_LETTER_PATTERN.sub(' ', text.lower()).split():
+            padded = f" {word} "
+            for n in self.ngram_sizes:
+                grams.extend(padded[i:i + n] for i in range(len(padded) - n + 1))
+        return grams
+
+    def identify(self, text: str) -> Tuple[Optional[str], float]:
+        """Most likely language and its confidence; (None, 0.0) for text without letters or in no known language"""
+        grams = self._ngrams(text[:self.max_chars])
+        if not grams:
+            return None, 0.0
+        indices = np.fromiter((self._index.get(gram, -1) for gram in grams), dtype=np.int64, count=len(grams))
+        known = indices[indices >= 0]
+        scores = self._log_probs[known].sum(axis=0) + (len(indices) - len(known)) * self._unseen
+        best = int(np.argmax(scores))
+
+        longest = max(self.ngram_sizes)
+        longest_indices = indices[np.fromiter(map(len, grams), dtype=np.int64, count=len(grams)) == longest]
+        if len(longest_indices) == 0:
+            longest_indices = indices
+        seen = self._seen[longest_indices[longest_indices >= 0], best].sum()
+        if seen < self.min_coverage * len(longest_indices):
+            return None, 0.0
+
+        if len(scores) < 2:
+            return self.languages[best], 1.0
+        margin = (scores[best] - np.partition(scores, -2)[-2]) / len(grams)
+        confidence = (1.0 - math.exp(-margin / self.margin_scale)) * min(1.0, len(grams) / self.min_ngrams)
+        return self.languages[best], float(confidence)
+
+class IndicatorMatcher:
+    def __init__(self, phrases: List[str]):
+        """Find which of many phrases occur in a text with one compiled regex scan
+
+        The pattern is a lookahead alternation tried at every position
+        (longest phrases first), so overlapping phrases are found as with
+        separate substring tests; only a phrase that is a prefix of a longer
+        one matching at the same position is not reported there.
+        """
+        self.phrases = sorted({phrase.lower() for phrase in phrases}, key=len, reverse=True)
+        self._pattern = re.compile('(?=(' + '|'.join(map(re.escape, self.phrases)) + '))') if self.phrases else None
+
+    def matches(self, text: str) -> set:
+        if self._pattern is None:
+            return set()
+        return {match.group(1) for match in self._pattern.finditer(text)}
+
+    def count(self, text: str) -> int:
+        """Number of distinct phrases present in (lowercased) text"""
+        return len(self.matches(text))
+
+class Lexicon:
+    def __init__(self, language: str, fake_indicators: List[str], credible_indicators: List[str]):
+        """Compiled indicator matchers and (lazily loaded) stopwords for one language"""
+        self.language = language
+        self.fake = IndicatorMatcher(fake_indicators)
+        self.credible = IndicatorMatcher(credible_indicators)
+        self._stop_words: Optional[set] = None
+
+    @property
+    def stop_words(self) -> set:
+        if self._stop_words is None:
+            try:
+                from nltk.corpus import stopwords
+                self._stop_words = set(stopwords.words(NLTK_LANGUAGE_NAMES[self.language]))
+            except (KeyError, LookupError, OSError):
+                self._stop_words = set()
+        return self._stop_words
+
+class LanguageModelRegistry:
+    def __init__(self, model_names: Dict[str, str], loader: Callable[[str], Any], manager: ModelManager,
+                 footprint: Optional[Callable[[Any], int]] = None, offloader: Any = None):
+        """Per-language models held by the model manager
+
+        ``model_names`` maps language codes to model names (``*`` for any
+        other language); languages that share a model share one loaded
+        copy. Each model is registered with ``manager`` as
+        ``language:<name>`` on first use, loaded by ``loader(name)`` and
+        measured by ``footprint``, so it shares the manager's memory budget
+        and LRU eviction with every other model. A model that fails to load
+        is not retried.
+        """
+        self.model_names = model_names
+        self.loader = loader
+        self.manager = manager
+        self.footprint = footprint
+        self.offloader = offloader
+
+    def model_name(self, language: str) -> Optional[str]:
+        return self.model_names.get(language, self.model_names.get("*"))
+
+    def key(self, language: str) -> Optional[str]:
+        """Manager key of the model for ``language``, registering it on first use; None if none is configured"""
+        name = self.model_name(language)
+        if not name:
+            return None
+        key = f"language:{name}"
+        self.manager.register(key, lambda: self.loader(name), self.footprint, self.offloader)
+        return key
+
+    def get(self, language: str) -> Optional[Any]:
+        """The model for ``language``, loading it if needed; None if none is configured or it failed"""
+        key = self.key(language)
+        return self.manager.get(key) if key else None
+
+    def describe(self) -> Dict:
+        models = self.manager.describe()["models"]
+        return {
+            "model_names": dict(self.model_names),
+            "models": {key: state for key, state in models.items() if key.startswith("language:")}
+        }
+
+def parse_model_names(spec: str) -> Dict[str, str]:
+    """Parse ``es=model-a,fr=model-b,*=model-c`` into a language-to-model mapping"""
+    names = {}
+    for item in spec.split(","):
+        language, _, name = item.partition("=")
+        if language.strip() and name.strip():
+            names[language.strip().lower()] = name.strip()
+    return names
+
+def language_model_settings() -> Dict[str, str]:
+    """Model names per language from ``LANGUAGE_MODELS``"""
+    return parse_model_names(os.getenv("LANGUAGE_MODELS", "*=bert-base-multilingual-cased"))
+
+_identifier: Optional[LanguageIdentifier] = None
+_identifier_lock = threading.Lock()
+
+def get_language_identifier() -> LanguageIdentifier:
+    """Return the process-wide language identifier (built from the samples on first use)"""
+    global _identifier
+    if _identifier is None:
+        with _identifier_lock:
+            if _identifier is None:
+                _identifier = LanguageIdentifier(LANGUAGE_SAMPLES)
+    return _identifier
@@ -0,0 +1,121 @@
+import os
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+from utils.profiling import record_completed_span, span
+
+# Latency buckets from 1 ms to 30 s, covering cheap regex stages and full model passes
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+REQUESTS = Counter(
+    "detection_http_requests_total", "HTTP requests handled", ["method", "route", "status"]
+)
+REQUEST_ERRORS = Counter(
+    "detection_http_errors_total", "HTTP requests that returned a 5xx status or raised", ["method", "route"]
+)
+REQUEST_LATENCY = Histogram(
+    "detection_http_request_seconds", "HTTP request latency", ["method", "route"], buckets=LATENCY_BUCKETS
+)
+STAGE_LATENCY = Histogram(
+    "detection_stage_seconds", "Latency of individual detection pipeline stages", ["stage"], buckets=LATENCY_BUCKETS
+)
+MODEL_LOADED = Gauge(
+    "detection_model_loaded", "Whether a model is loaded (1) or unavailable (0)", ["model"],
+    multiprocess_mode="liveall"
+)
+MODEL_MEMORY = Gauge(
+    "detection_model_memory_bytes", "Estimated memory held by a resident model", ["model"],
+    multiprocess_mode="liveall"
+)
+MODEL_LOAD_LATENCY = Histogram(
+    "detection_model_load_seconds", "Model cold-start latency by source (loader or offloaded state)",
+    ["model", "source"], buckets=LATENCY_BUCKETS
+)
+MODEL_EVICTIONS = Counter(
+    "detection_model_evictions_total", "Models evicted to stay within the memory budget", ["model"]
+)
+CACHE_REQUESTS = Counter(
+    "detection_cache_requests_total", "Cache lookups by outcome", ["cache", "result"]
+)
+FEED_ITEMS = Counter(
+    "detection_feed_items_total", "Feed consumer items by outcome", ["outcome"]
+)
+QUEUE_DEPTH = Gauge(
+    "detection_queue_depth", "Items waiting in background queues", ["queue"],
+    multiprocess_mode="livesum"
+)
+
+# Queue depth callbacks, sampled into QUEUE_DEPTH whenever metrics are collected
+_queue_depths: Dict[str, Callable[[], float]] = {}
+
+# Label children are resolved once per stage to keep timing overhead minimal
+_stage_children: Dict[str, Histogram] = {}
+
+def _stage_child(stage: str) -> Histogram:
+    child = _stage_children.get(stage)
+    if child is None:
+        child = _stage_children[stage] = STAGE_LATENCY.labels(stage)
+    return child
+
+def observe_stage(stage: str, seconds: float):
+    """Record the duration of a pipeline stage measured by the caller"""
+    _stage_child(stage).observe(seconds)
+    record_completed_span(stage, seconds)
+
+@contextmanager
+def stage_timer(stage: str):
+    """Time a block with the monotonic ``perf_counter`` and record it as ``stage``
+
+    The block also becomes a span when the request is being profiled.
+    """
+    start = time.perf_counter()
+    with span(stage):
+        try:
+            yield
+        finally:
+            _stage_child(stage).observe(time.perf_counter() - start)
+
+def record_cache(cache: str, hit: bool):
+    """Count a cache hit or miss; hit rate is hits / (hits + misses)"""
+    CACHE_REQUESTS.labels(cache, "hit" if hit else "miss").inc()
+
+def set_model_loaded(model: str, loaded: bool):
+    MODEL_LOADED.labels(model).set(1 if loaded else 0)
+
+def record_model_load(model: str, source: str, seconds: float, size: int):
+    """Record a model becoming resident and how long it took"""
+    MODEL_LOAD_LATENCY.labels(model, source).observe(seconds)
+    MODEL_MEMORY.labels(model).set(size)
+    set_model_loaded(model, True)
+
+def record_model_eviction(model: str):
+    MODEL_EVICTIONS.labels(model).inc()
+    MODEL_MEMORY.labels(model).set(0)
+    set_model_loaded(model, False)
+
+def track_queue_depth(queue: str, depth: Callable[[], float]):
+    """Report a queue's depth by calling ``depth`` at scrape time"""
+    _queue_depths[queue] = depth
+
+def collect_metrics() -> bytes:
+    """Metrics in the Prometheus text format
+
+    With ``PROMETHEUS_MULTIPROC_DIR`` set (as under gunicorn), every
+    worker writes its metrics to files there and the answer aggregates all
+    live workers, whichever one serves the scrape. Queue depths are only
+    sampled in the worker serving it; the others report their values from
+    their last scrape.
+    """
+    for queue, depth in list(_queue_depths.items()):
+        QUEUE_DEPTH.labels(queue).set(depth())
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest()
+
+def record_feed_items(outcome: str, count: int = 1):
+    """Count feed consumer items as consumed, duplicate, malformed, analyzed or failed"""
+    if count:
+        FEED_ITEMS.labels(outcome).inc(count)
@@ -0,0 +1,393 @@
+"""Process-wide model memory management
+
+Processors register a loader for each model with the manager instead of
+holding the weights for the life of the process. Models load on first use,
+their footprint counts against one memory budget, and when a load pushes the
+total over it the least recently used idle models are evicted. A model is
+idle when no request holds a lease on it (``use``); a pinned model is never
+evicted.
+
+An evicted model with an offloader keeps its weights on disk: the first
+eviction writes them out once, and the next use maps the file back instead of
+running the loader again, which skips downloading, parsing and initializing
+the checkpoint. Loads, restores and evictions are kept as events and exported
+as metrics, so cold-start latency can be compared with the loader's.
+"""
+import atexit
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+import numpy as np
+from utils.metrics import record_model_eviction, record_model_load, set_model_loaded
+
+def resident_bytes() -> int:
+    """Resident set size of this process (0 where ``/proc`` is unavailable)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return 0
+
+class TorchOffloader:
+    def __init__(self, module: Callable[[Any], Any]):
+        """Offload a torch module's weights to a file and restore them memory-mapped
+
+        ``module`` picks the ``nn.Module`` out of the managed value, e.g. the
+        model of a ``(model, tokenizer)`` pair or of a pipeline. Offloading
+        saves its tensors and moves it to the meta device, which frees the
+        weights but keeps the object, its config and tokenizer. Restoring
+        assigns the tensors of the memory-mapped file back without copying,
+        so pages are read from the page cache as the forward pass touches
+        them.
+        """
+        self.module = module
+
+    def offload(self, value: Any, path: str) -> Any:
+        import torch
+        module = self.module(value)
+        device = next(module.parameters()).device
+        if not os.path.exists(path):
+            tensors = dict(module.state_dict())
+            # Non-persistent buffers (e.g. position ids) are not in the state dict
+            tensors.update(module.named_buffers())
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            torch.save(tensors, tmp_path)
+            os.replace(tmp_path, path)
+        module.to("meta")
+        return value, device
+
+    def restore(self, stub: Any, path: str) -> Any:
+        import torch
+        value, device = stub
+        module = self.module(value)
+        tensors = torch.load(path, mmap=True, weights_only=True)
+        state_keys = set(module.state_dict())
+        module.load_state_dict({key: tensors[key] for key in state_keys}, assign=True)
+        for name, _ in list(module.named_buffers()):
+            if name not in state_keys:
+                owner, _, attribute = name.rpartition(".")
+                module.get_submodule(owner).register_buffer(attribute, tensors[name], persistent=False)
+        module.to(device)
+        return value
+
+class KerasOffloader:
+    def __init__(self, build: Callable[[], Any], model: Callable[[Any], Any]):
+        """Offload a Keras model's weights to ``.npy`` files and rebuild it around them
+
+        ``build`` creates the managed value without pretrained weights and
+        ``model`` picks the Keras model out of it. Offloading writes each
+        weight array once and drops the value; restoring builds the
+        architecture again and sets the weights from memory-mapped arrays
+        instead of reading the HDF5 checkpoint.
+        """
+        self.build = build
+        self.model = model
+
+    def offload(self, value: Any, path: str) -> Any:
+        weights = self.model(value).get_weights()
+        if not os.path.isdir(path):
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            os.makedirs(tmp_path, exist_ok=True)
+            for i, weight in enumerate(weights):
+                np.save(os.path.join(tmp_path, f"{i}.npy"), weight)
+            os.replace(tmp_path, path)
+        return len(weights)
+
+    def restore(self, stub: Any, path: str) -> Any:
+        value = self.build()
+        self.model(value).set_weights([np.load(os.path.join(path, f"{i}.npy"), mmap_mode="r") for i in range(stub)])
+        return value
+
+class ManagedModel:
+    """Registration and residency state of one model"""
+
+    def __init__(self, name: str, loader: Callable[[], Any], footprint: Optional[Callable[[Any], int]],
+                 offloader: Any, unload: Optional[Callable[[Any], None]], pinned: bool):
+        self.name = name
+        self.loader = loader
+        self.footprint = footprint
+        self.offloader = offloader
+        self.unload = unload
+        self.pinned = pinned
+        self.value: Any = None
+        # Footprint of the last load, kept after eviction to make room before the next one
+        self.size = 0
+        self.stub: Any = None
+        self.offload_path: Optional[str] = None
+        self.leases = 0
+        self.failed = False
+        self.loads = 0
+        self.restores = 0
+        self.evictions = 0
+        self.last_load_seconds: Optional[float] = None
+        self.last_used = 0.0
+        # Serializes loading, restoring and offloading this model
+        self.lock = threading.Lock()
+
+class ModelManager:
+    def __init__(self, budget_bytes: int, offload_dir: Optional[str] = None, max_events: int = 200):
+        """Keep registered models within ``budget_bytes`` (0 for no limit)
+
+        With ``offload_dir`` set, evicted models that have an offloader
+        keep their weights in a per-process directory below it, removed at
+        exit; without it they are dropped and loaded again from scratch.
+        The directory is created on the first eviction in each process, so
+        forked workers (which inherit the manager) never share one.
+        """
+        self.budget_bytes = budget_bytes
+        self.offload_root = offload_dir or None
+        # Directory of the process that created it; see _process_offload_dir
+        self.offload_dir: Optional[str] = None
+        self._offload_pid: Optional[int] = None
+        self.max_events = max_events
+        self.events: List[Dict] = []
+        self._models: Dict[str, ManagedModel] = {}
+        # Resident models, least recently used first
+        self._resident: "OrderedDict[str, ManagedModel]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def register(self, name: str, loader: Callable[[], Any], footprint: Optional[Callable[[Any], int]] = None,
+                 offloader: Any = None, unload: Optional[Callable[[Any], None]] = None, pinned: bool = False) -> bool:
+        """Register a model; an existing registration under the same name is kept
+
+        ``footprint`` measures the loaded value in bytes (by default the
+        growth of the resident set during the load). ``offloader`` (a
+        ``TorchOffloader`` or ``KerasOffloader``) enables disk offloading
+        and ``unload`` releases anything the manager's reference does not
+        cover when the model is evicted.
+        """
+        with self._lock:
+            if name in self._models:
+                return False
+            self._models[name] = ManagedModel(name, loader, footprint, offloader, unload, pinned)
+            return True
+
+    def available(self, name: str) -> bool:
+        """Whether the model is registered and has not failed to load (it may not be resident)"""
+        entry = self._models.get(name)
+        return entry is not None and not entry.failed
+
+    def get(self, name: str) -> Optional[Any]:
+        """The model, loading it if needed; None if it is unknown or failed to load
+
+        The value may be evicted once the caller is done with it; hold a
+        lease with ``use`` while running it.
+        """
+        return self._acquire(name, lease=False)
+
+    @contextmanager
+    def use(self, name: str) -> Iterator[Optional[Any]]:
+        """Lease a model for the duration of a block so it is not evicted while in use"""
+        value = self._acquire(name, lease=True)
+        try:
+            yield value
+        finally:
+            if value is not None:
+                with self._lock:
+                    self._models[name].leases -= 1
+
+    def _acquire(self, name: str, lease: bool) -> Optional[Any]:
+        entry = self._models.get(name)
+        if entry is None or entry.failed:
+            return None
+        if self._touch(entry, lease):
+            return entry.value
+
+        # Load outside the manager lock so other models stay available meanwhile
+        with entry.lock:
+            if self._touch(entry, lease):
+                return entry.value
+            if entry.size:
+                self._evict(self._select_victims(entry.size))
+            value, size, seconds, source = self._load(entry)
+            if value is None:
+                return None
+            with self._lock:
+                entry.value, entry.size = value, size
+                entry.last_used = time.time()
+                entry.last_load_seconds = seconds
+                entry.leases += 1 if lease else 0
+                self._resident[name] = entry
+                self._record(source, name, size, seconds)
+            victims = self._select_victims(0, keep=name)
+        record_model_load(name, source, seconds, size)
+        # Evict after releasing this model's lock: a victim's lock may be held by a thread waiting for it
+        self._evict(victims)
+        return value
+
+    def _touch(self, entry: ManagedModel, lease: bool) -> bool:
+        with self._lock:
+            if entry.value is None:
+                return False
+            self._resident.move_to_end(entry.name)
+            entry.last_used = time.time()
+            entry.leases += 1 if lease else 0
+            return True
+
+    def _load(self, entry: ManagedModel) -> Tuple[Any, int, float, str]:
+        """Restore the model from offloaded state if possible, otherwise run its loader"""
+        start = time.perf_counter()
+        if entry.stub is not None:
+            try:
+                value = entry.offloader.restore(entry.stub, entry.offload_path)
+                entry.stub = None
+                entry.restores += 1
+                return value, entry.size, time.perf_counter() - start, "restore"
+            except Exception as e:
+                print(f"Restoring model {entry.name} failed, loading it again: {e}")
+                entry.stub = None
+                start = time.perf_counter()
+
+        rss_before = resident_bytes()
+        try:
+            value = entry.loader()
+        except Exception as e:
+            print(f"Loading model {entry.name} failed: {e}")
+            entry.failed = True
+            with self._lock:
+                self._record("failed", entry.name, 0)
+            set_model_loaded(entry.name, False)
+            return None, 0, 0.0, "failed"
+        seconds = time.perf_counter() - start
+        size = entry.footprint(value) if entry.footprint else max(0, resident_bytes() - rss_before)
+        entry.loads += 1
+        return value, size, seconds, "load"
+
+    def _select_victims(self, needed: int, keep: Optional[str] = None) -> List[Tuple[ManagedModel, Any]]:
+        """Take idle models out of residency, least recently used first, until ``needed`` more bytes fit"""
+        with self._lock:
+            if not self.budget_bytes:
+                return []
+            victims = []
+            excess = self.loaded_bytes + needed - self.budget_bytes
+            for entry in list(self._resident.values()):
+                if excess <= 0:
+                    break
+                if entry.name == keep or entry.pinned or entry.leases:
+                    continue
+                victims.append((entry, entry.value))
+                entry.value = None
+                del self._resident[entry.name]
+                excess -= entry.size
+            if excess > 0 and keep is not None:
+                self._record("over_budget", keep, self.loaded_bytes)
+            return victims
+
+    def _evict(self, victims: List[Tuple[ManagedModel, Any]]):
+        for entry, value in victims:
+            start = time.perf_counter()
+            offloaded = False
+            with entry.lock:
+                # Skip offloading if the model was loaded again meanwhile; the old copy is simply dropped
+                if entry.value is None and entry.offloader is not None and self.offload_root:
+                    try:
+                        path = entry.offload_path or os.path.join(self._process_offload_dir(),
+                                                                  re.sub(r"[^\w.-]", "_", entry.name))
+                        entry.stub = entry.offloader.offload(value, path)
+                        entry.offload_path = path
+                        offloaded = True
+                    except Exception as e:
+                        print(f"Offloading model {entry.name} failed: {e}")
+                if entry.unload is not None:
+                    entry.unload(value)
+                entry.evictions += 1
+            with self._lock:
+                self._record("evict", entry.name, entry.size, time.perf_counter() - start, offloaded=offloaded)
+            record_model_eviction(entry.name)
+
+    def evict(self, name: str) -> bool:
+        """Evict a model now unless it is leased or pinned"""
+        with self._lock:
+            entry = self._resident.get(name)
+            if entry is None or entry.pinned or entry.leases:
+                return False
+            del self._resident[name]
+            victim = (entry, entry.value)
+            entry.value = None
+        self._evict([victim])
+        return True
+
+    def _process_offload_dir(self) -> str:
+        """This process's offload directory, created on first use
+
+        Files written before a fork stay valid for the children to restore
+        from, but each process writes its own, and only the process that
+        created a directory removes it at exit.
+        """
+        with self._lock:
+            if self._offload_pid != os.getpid():
+                os.makedirs(self.offload_root, exist_ok=True)
+                self.offload_dir = tempfile.mkdtemp(prefix=f"models-{os.getpid()}-", dir=self.offload_root)
+                self._offload_pid = os.getpid()
+                atexit.register(self._remove_offload_dir, self.offload_dir, self._offload_pid)
+            return self.offload_dir
+
+    @staticmethod
+    def _remove_offload_dir(path: str, pid: int):
+        # atexit handlers are inherited across fork; leave the directory to the process that made it
+        if os.getpid() == pid:
+            shutil.rmtree(path, True)
+
+    @property
+    def loaded_bytes(self) -> int:
+        return sum(entry.size for entry in self._resident.values())
+
+    def _record(self, event: str, name: str, size: int, seconds: Optional[float] = None, **details):
+        entry = {"event": event, "model": name, "bytes": size, "timestamp": time.time(), **details}
+        if seconds is not None:
+            entry["seconds"] = seconds
+        self.events = (self.events + [entry])[-self.max_events:]
+        timing = f" in {seconds:.2f}s" if seconds is not None else ""
+        print(f"Model {event}: {name} ({size / 2**20:.0f} MB){timing}")
+
+    def describe(self) -> Dict:
+        now = time.time()
+        with self._lock:
+            return {
+                "budget_bytes": self.budget_bytes,
+                "loaded_bytes": self.loaded_bytes,
+                "process_resident_bytes": resident_bytes(),
+                "offload_dir": self.offload_dir if self._offload_pid == os.getpid() else None,
+                "models": {
+                    name: {
+                        "resident": entry.value is not None,
+                        "bytes": entry.size,
+                        "pinned": entry.pinned,
+                        "leases": entry.leases,
+                        "offloaded": entry.stub is not None,
+                        "failed": entry.failed,
+                        "loads": entry.loads,
+                        "restores": entry.restores,
+                        "evictions": entry.evictions,
+                        "last_load_seconds": entry.last_load_seconds,
+                        "idle_seconds": now - entry.last_used if entry.last_used else None
+                    } for name, entry in self._models.items()
+                },
+                "events": list(self.events)
+            }
+
+_manager: Optional[ModelManager] = None
+_manager_lock = threading.Lock()
+
+def get_model_manager() -> ModelManager:
+    """Return the process-wide model manager
+
+    The budget comes from ``MODEL_BUDGET_MB`` (default 4096, 0 for no
+    limit) and offloaded weights go below ``MODEL_OFFLOAD_DIR`` (default
+    the system temp directory; empty disables offloading).
+    """
+    global _manager
+    if _manager is None:
+        with _manager_lock:
+            if _manager is None:
+                _manager = ModelManager(
+                    budget_bytes=int(os.getenv("MODEL_BUDGET_MB", "4096")) * 1024 * 1024,
+                    offload_dir=os.getenv("MODEL_OFFLOAD_DIR", tempfile.gettempdir())
+                )
+    return _manager
@@ -0,0 +1,344 @@
+import contextvars
+import cProfile
+import functools
+import hmac
+import io
+import itertools
+import json
+import os
+import pstats
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+# Profiling session of the request being handled in the current context (None when not profiling)
+_current_session: contextvars.ContextVar = contextvars.ContextVar("current_session", default=None)
+# Innermost open span in the current context; tasks and pool threads get their own copy
+_current_span: contextvars.ContextVar = contextvars.ContextVar("current_span", default=None)
+
+PROFILE_MODES = ("spans", "cprofile")
+
+# Held by the one session collecting a cProfile call profile; concurrent requests on the
+# event loop thread would otherwise replace each other's profiler
+_cprofile_lock = threading.Lock()
+
+# Profile ids are trace ids (hex), which also name their files in the shared store
+PROFILE_ID_PATTERN = re.compile(r"[0-9a-f]{32}")
+
+class Trace:
+    def __init__(self, name: str):
+        """Span tree for one request, exported in an OpenTelemetry-compatible layout
+
+        The open span is tracked per context rather than per trace, so spans
+        started concurrently (text and image on their pools, gathered
+        fetches) nest under the span that was open where they started.
+        """
+        self.trace_id = uuid.uuid4().hex
+        self.spans: List[Dict] = []
+        self.root = self.start_span(name)
+
+    def _parent_id(self) -> Optional[str]:
+        parent = _current_span.get()
+        return parent["spanId"] if parent is not None and parent["traceId"] == self.trace_id else None
+
+    def start_span(self, name: str) -> Dict:
+        """Open a span under the current context's span and make it the current one"""
+        span = {
+            "traceId": self.trace_id,
+            "spanId": uuid.uuid4().hex[:16],
+            "parentSpanId": self._parent_id(),
+            "name": name,
+            "startTimeUnixNano": time.time_ns(),
+            "endTimeUnixNano": None,
+            "attributes": {},
+            "_start": time.perf_counter()
+        }
+        span["_token"] = _current_span.set(span)
+        self.spans.append(span)
+        return span
+
+    def end_span(self, span: Dict):
+        """Close a span in the context that opened it, restoring its parent as the current span"""
+        # Durations come from the monotonic clock; the wall clock only anchors the start
+        duration = time.perf_counter() - span.pop("_start")
+        span["endTimeUnixNano"] = span["startTimeUnixNano"] + int(duration * 1e9)
+        span["attributes"]["duration_ms"] = duration * 1000
+        _current_span.reset(span.pop("_token"))
+
+    def add_completed_span(self, name: str, seconds: float):
+        """Record a span that has already finished, ending now"""
+        end = time.time_ns()
+        self.spans.append({
+            "traceId": self.trace_id,
+            "spanId": uuid.uuid4().hex[:16],
+            "parentSpanId": self._parent_id(),
+            "name": name,
+            "startTimeUnixNano": end - int(seconds * 1e9),
+            "endTimeUnixNano": end,
+            "attributes": {"duration_ms": seconds * 1000}
+        })
+
+    def tree(self) -> Dict:
+        """Nest spans under their parents for display"""
+        nodes = {span["spanId"]: {"name": span["name"],
+                                  "duration_ms": span["attributes"].get("duration_ms"),
+                                  "children": []}
+                 for span in self.spans}
+        root = None
+        for span in self.spans:
+            parent = nodes.get(span["parentSpanId"]) if span["parentSpanId"] else None
+            if parent is None:
+                root = root or nodes[span["spanId"]]
+            else:
+                parent["children"].append(nodes[span["spanId"]])
+        return root
+
+@contextmanager
+def span(name: str):
+    """Record a span in the active trace; does nothing when the request is not profiled"""
+    session = _current_session.get()
+    if session is None:
+        yield
+        return
+    trace = session.trace
+    current = trace.start_span(name)
+    try:
+        yield
+    finally:
+        trace.end_span(current)
+
+def traced(name: str):
+    """Decorator recording each call of the function as a span"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _current_session.get() is None:
+                return func(*args, **kwargs)
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def record_completed_span(name: str, seconds: float):
+    """Add an already measured stage to the active trace, if any"""
+    session = _current_session.get()
+    if session is not None:
+        session.trace.add_completed_span(name, seconds)
+
+def profile_call(func, *args, **kwargs):
+    """Call ``func``, adding it to the active session's call profile if it collects one
+
+    cProfile only sees the thread that enabled it, so the inference pools
+    run each call under a profiler of their own, merged into the request's
+    call profile when it is built.
+    """
+    session = _current_session.get()
+    if session is None or session.profiler is None:
+        return func(*args, **kwargs)
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Python 3.12+ allows one active profiler, and it already sees every thread
+        return func(*args, **kwargs)
+    try:
+        return func(*args, **kwargs)
+    finally:
+        profiler.disable()
+        session.add_call_profile(profiler)
+
+class ProfileSession:
+    def __init__(self, mode: str, name: str, sampled: bool):
+        self.mode = mode
+        self.sampled = sampled
+        self.trace = Trace(name)
+        self.profiler = cProfile.Profile() if mode == "cprofile" else None
+        self._thread_profilers: List[cProfile.Profile] = []
+        self._lock = threading.Lock()
+        self._token = None
+        # Why no call profile was collected in cprofile mode
+        self.unavailable: Optional[str] = None
+
+    def __enter__(self):
+        self._token = _current_session.set(self)
+        if self.profiler is not None:
+            if not _cprofile_lock.acquire(blocking=False):
+                self._skip_call_profile("profiler busy: another request is being profiled with cProfile")
+                return self
+            try:
+                self.profiler.enable()
+            except ValueError:
+                # Python 3.12+ allows one active profiler per process
+                _cprofile_lock.release()
+                self._skip_call_profile("profiler busy: another profiler is active")
+        return self
+
+    def _skip_call_profile(self, reason: str):
+        self.profiler = None
+        self.unavailable = reason
+
+    def __exit__(self, *exc):
+        if self.profiler is not None:
+            self.profiler.disable()
+            _cprofile_lock.release()
+        self.trace.end_span(self.trace.root)
+        _current_session.reset(self._token)
+        return False
+
+    def add_call_profile(self, profiler: cProfile.Profile):
+        """Merge a profile taken on another thread (see ``profile_call``) into the call profile"""
+        with self._lock:
+            self._thread_profilers.append(profiler)
+
+    def call_profile(self, limit: int = 40) -> Optional[str]:
+        """Top functions by cumulative time over the request and its pool calls, as pstats text"""
+        if self.profiler is None:
+            return self.unavailable
+        output = io.StringIO()
+        stats = pstats.Stats(self.profiler, stream=output)
+        with self._lock:
+            for profiler in self._thread_profilers:
+                stats.add(profiler)
+        stats.sort_stats("cumulative").print_stats(limit)
+        return output.getvalue()
+
+class RequestProfiler:
+    def __init__(self, admin_token: Optional[str] = None, sample_every: int = 0,
+                 export_path: Optional[str] = None, max_stored: int = 100, store_dir: Optional[str] = None):
+        """Decide which requests to profile, and store and export their profiles
+
+        A request is profiled on demand when it sends ``X-Profile: spans`` or
+        ``X-Profile: cprofile`` (or ``?profile=``) together with an
+        ``X-Profile-Token`` matching ``admin_token``; without a configured
+        token, on-demand profiling is disabled. Independently, one in every
+        ``sample_every`` requests is traced in the cheap ``spans`` mode.
+        Profiles are kept in memory (the last ``max_stored``) and appended
+        as JSON lines to ``export_path``, a stand-in for a trace collector.
+        With ``store_dir`` set, each profile is also written there as a
+        file, so it can be fetched from any worker process serving the app;
+        the directory keeps the last ``max_stored`` too.
+        """
+        self.admin_token = admin_token
+        self.sample_every = sample_every
+        self.export_path = export_path
+        self.max_stored = max_stored
+        self._counter = itertools.count(1)
+        self._stored: "OrderedDict[str, Dict]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.store_dir = store_dir
+
+        if export_path and os.path.dirname(export_path):
+            os.makedirs(os.path.dirname(export_path), exist_ok=True)
+        if store_dir:
+            os.makedirs(store_dir, exist_ok=True)
+
+    def is_admin(self, token: Optional[str]) -> bool:
+        return bool(self.admin_token) and token is not None and hmac.compare_digest(token, self.admin_token)
+
+    def session_for(self, headers, query_params, name: str) -> Optional[ProfileSession]:
+        """Return a profiling session if this request should be profiled"""
+        mode = headers.get("x-profile") or query_params.get("profile")
+        if mode in PROFILE_MODES and self.is_admin(headers.get("x-profile-token")):
+            return ProfileSession(mode, name, sampled=False)
+        if self.sample_every > 0 and next(self._counter) % self.sample_every == 0:
+            return ProfileSession("spans", name, sampled=True)
+        return None
+
+    def finish(self, session: ProfileSession, attributes: Dict) -> Dict:
+        """Build, store and export the profile of a finished session"""
+        session.trace.root["attributes"].update(attributes)
+        record = {
+            "id": session.trace.trace_id,
+            "mode": session.mode,
+            "sampled": session.sampled,
+            "timestamp": time.time(),
+            "tree": session.trace.tree(),
+            "spans": session.trace.spans,
+            "call_profile": session.call_profile()
+        }
+
+        with self._lock:
+            self._stored[record["id"]] = record
+            while len(self._stored) > self.max_stored:
+                self._stored.popitem(last=False)
+            if self.export_path:
+                try:
+                    with open(self.export_path, "a") as f:
+                        f.write(json.dumps(record, default=str) + "\n")
+                except OSError as e:
+                    print(f"Profile export failed: {e}")
+        if self.store_dir:
+            self._write_shared(record)
+        return record
+
+    def _write_shared(self, record: Dict):
+        """Write a profile to the shared store (atomically) and drop the oldest beyond ``max_stored``"""
+        path = os.path.join(self.store_dir, record["id"] + ".json")
+        try:
+            with open(path + f".{os.getpid()}.tmp", "w") as f:
+                json.dump(record, f, default=str)
+            os.replace(path + f".{os.getpid()}.tmp", path)
+            
+            stored = sorted(
+                (entry.stat().st_mtime, entry.path) for entry in os.scandir(self.store_dir) if entry.name.endswith(".json")
+            )
+            for _, old_path in stored[:max(0, len(stored) - self.max_stored)]:
+                os.remove(old_path)
+        except OSError as e:
+            print(f"Profile store failed: {e}")
+
+    def _read_shared(self, profile_id: str) -> Optional[Dict]:
+        if not self.store_dir or not PROFILE_ID_PATTERN.fullmatch(profile_id):
+            return None
+        try:
+            with open(os.path.join(self.store_dir, profile_id + ".json")) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def get(self, profile_id: str) -> Optional[Dict]:
+        with self._lock:
+            record = self._stored.get(profile_id)
+        return record if record is not None else self._read_shared(profile_id)
+
+    def list(self) -> List[Dict]:
+        if self.store_dir:
+            # Every worker's profiles, newest first
+            try:
+                entries = sorted(
+                    ((entry.stat().st_mtime, entry.name[:-len(".json")]) for entry in os.scandir(self.store_dir)
+                     if entry.name.endswith(".json")),
+                    reverse=True
+                )
+            except OSError:
+                entries = []
+            records = [self._read_shared(profile_id) for _, profile_id in entries[:self.max_stored]]
+        else:
+            with self._lock:
+                records = list(reversed(self._stored.values()))
+        return [
+            {"id": r["id"], "mode": r["mode"], "sampled": r["sampled"], "timestamp": r["timestamp"],
+             "duration_ms": r["tree"]["duration_ms"] if r["tree"] else None}
+            for r in records if r is not None
+        ]
+
+_profiler: Optional[RequestProfiler] = None
+_profiler_lock = threading.Lock()
+
+def get_request_profiler() -> RequestProfiler:
+    """Return the process-wide request profiler, configured from the environment"""
+    global _profiler
+    if _profiler is None:
+        with _profiler_lock:
+            if _profiler is None:
+                _profiler = RequestProfiler(
+                    admin_token=os.getenv("PROFILING_ADMIN_TOKEN") or None,
+                    sample_every=int(os.getenv("PROFILING_SAMPLE_EVERY", "0")),
+                    export_path=os.getenv("PROFILING_EXPORT_PATH", os.path.join("data", "profiles.jsonl")),
+                    store_dir=os.getenv("PROFILING_STORE_DIR") or None
+                )
+    return _profiler
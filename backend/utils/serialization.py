@@ -0,0 +1,42 @@
+from typing import Any, Dict, Iterable, Optional
+import orjson
+from fastapi.responses import ORJSONResponse
+
+class NumpyJSONResponse(ORJSONResponse):
+    """orjson response that serializes NumPy arrays and scalars natively"""
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+
+def parse_fields(fields: Optional[str]) -> Optional[list]:
+    """Parse a comma-separated ``fields=`` selector into dotted paths"""
+    if not fields:
+        return None
+    return [field.strip() for field in fields.split(",") if field.strip()]
+
+def select_fields(payload: Dict, fields: Iterable[str]) -> Dict:
+    """Keep only the selected (possibly dotted, e.g. ``explanation.key_factors``) fields"""
+    selected: Dict = {}
+    for path in fields:
+        source = payload
+        target = selected
+        parts = path.split(".")
+        for i, part in enumerate(parts):
+            if not isinstance(source, dict) or part not in source:
+                break
+            if i == len(parts) - 1:
+                target[part] = source[part]
+            else:
+                source = source[part]
+                target = target.setdefault(part, {})
+    return selected
+
+def shape_response(payload: Dict, fields: Optional[str] = None, lite: bool = False,
+                   lite_fields: Iterable[str] = ()) -> NumpyJSONResponse:
+    """Apply the ``fields=`` selector or lite mode and serialize with orjson"""
+    selected = parse_fields(fields)
+    if selected is None and lite:
+        selected = list(lite_fields)
+    if selected is not None:
+        payload = select_fields(payload, selected)
+    return NumpyJSONResponse(content=payload)
@@ -0,0 +1,103 @@
+import os
+import random
+import time
+from typing import Dict, List, Optional
+from utils.language import DEFAULT_LANGUAGE
+from utils.text_processor import TextProcessor, TextAnalysisContext
+from utils.image_processor import ImageProcessor
+from utils.metrics import stage_timer
+
+def _synthetic_delay(stage: str, milliseconds: float, jitter: float):
+    """Sleep for ``milliseconds`` (+/- ``jitter`` as a fraction) and record it as ``stage``
+
+    Sleeping releases the GIL like a real model forward pass does, so the
+    delay occupies the worker thread without starving the rest of the server.
+    """
+    if milliseconds <= 0:
+        return
+    if jitter > 0:
+        milliseconds *= 1 + random.uniform(-jitter, jitter)
+    with stage_timer(stage):
+        time.sleep(milliseconds / 1000.0)
+
+class StubTextProcessor(TextProcessor):
+    def __init__(self, latency_ms: float = 40.0, latency_per_chunk_ms: float = 25.0, jitter: float = 0.1, **kwargs):
+        """Initialize a text processor that replaces the transformers with synthetic latency
+
+        Text scanning, feature extraction and rule-based scoring run for real,
+        so request handling, serialization and analytics behave as in
+        production. Each prediction then sleeps ``latency_ms`` plus
+        ``latency_per_chunk_ms`` for every sliding window the text would span.
+        """
+        super().__init__(load_models=False, **kwargs)
+        self.latency_ms = latency_ms
+        self.latency_per_chunk_ms = latency_per_chunk_ms
+        self.jitter = jitter
+
+    def _estimated_chunks(self, text: str, sliding_window: bool = True) -> int:
+        """Number of windows the real model would score, estimated from word count"""
+        tokens = int(len(text.split()) * 1.3)
+        if not sliding_window or tokens <= self.max_length:
+            return 1
+        step = self.max_length - self.chunk_stride
+        return min(self.max_chunks, 1 + -(-(tokens - self.max_length) // step))
+
+    def score_texts(self, texts: List[str], language: str = DEFAULT_LANGUAGE) -> Dict:
+        result = super().score_texts(texts, language)
+        _synthetic_delay('stub_model', self.latency_ms + self.latency_per_chunk_ms * len(texts), self.jitter)
+        # Stands in for the model, so its scores are cached like the model's would be
+        result["model"] = True
+        return result
+
+    def predict(self, text: str, language: str = "en", sliding_window: bool = True,
+                context: Optional[TextAnalysisContext] = None, prefilter: bool = False) -> Dict:
+        start_time = time.perf_counter()
+        result = super().predict(text, language, sliding_window, context, prefilter)
+        if not result["prefiltered"]:
+            chunks = self._estimated_chunks(text, sliding_window)
+            _synthetic_delay('stub_model', self.latency_ms + self.latency_per_chunk_ms * chunks, self.jitter)
+            result["chunk_count"] = chunks
+        result["processing_time"] = time.perf_counter() - start_time
+        return result
+
+class StubImageProcessor(ImageProcessor):
+    def __init__(self, latency_ms: float = 60.0, latency_per_face_ms: float = 80.0, jitter: float = 0.1):
+        """Initialize an image processor that replaces Xception with synthetic latency
+
+        Decoding, face detection and artifact analysis run for real; each
+        prediction then sleeps ``latency_ms`` plus ``latency_per_face_ms``
+        for every detected face in place of the Xception and Grad-CAM passes,
+        unless the pre-filter decided the image.
+        """
+        super().__init__(load_models=False)
+        self.latency_ms = latency_ms
+        self.latency_per_face_ms = latency_per_face_ms
+        self.jitter = jitter
+
+    def predict(self, image_file, analyze_faces: bool = True, prefilter: bool = False) -> Dict:
+        start_time = time.perf_counter()
+        result = super().predict(image_file, analyze_faces, prefilter)
+        if not result["prefiltered"]:
+            _synthetic_delay('stub_model', self.latency_ms + self.latency_per_face_ms * result["face_count"], self.jitter)
+        result["processing_time"] = time.perf_counter() - start_time
+        return result
+
+def stub_models_enabled() -> bool:
+    """Whether ``STUB_MODELS=1`` asks for the stub processors"""
+    return os.getenv("STUB_MODELS", "0") == "1"
+
+def stub_text_processor_from_env() -> StubTextProcessor:
+    """Build a stub text processor configured from ``STUB_TEXT_*`` environment variables"""
+    return StubTextProcessor(
+        latency_ms=float(os.getenv("STUB_TEXT_LATENCY_MS", "40")),
+        latency_per_chunk_ms=float(os.getenv("STUB_TEXT_LATENCY_PER_CHUNK_MS", "25")),
+        jitter=float(os.getenv("STUB_LATENCY_JITTER", "0.1"))
+    )
+
+def stub_image_processor_from_env() -> StubImageProcessor:
+    """Build a stub image processor configured from ``STUB_IMAGE_*`` environment variables"""
+    return StubImageProcessor(
+        latency_ms=float(os.getenv("STUB_IMAGE_LATENCY_MS", "60")),
+        latency_per_face_ms=float(os.getenv("STUB_IMAGE_LATENCY_PER_FACE_MS", "80")),
+        jitter=float(os.getenv("STUB_LATENCY_JITTER", "0.1"))
+    )
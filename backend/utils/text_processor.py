@@ -1,13 +1,23 @@
 import time
 import re
+import hashlib
+import itertools
+import threading
+from collections import OrderedDict
+from contextlib import nullcontext
 import numpy as np
-from typing import Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple, Union
 from transformers import pipeline, AutoTokenizer, AutoModelForSequenceClassification
 import torch
 from textblob import TextBlob
 import nltk
 from nltk.corpus import stopwords
 from nltk.tokenize import word_tokenize
+from utils.metrics import stage_timer, record_cache
+from utils.profiling import traced
+from utils.language import (DEFAULT_LANGUAGE, LEXICONS, IndicatorMatcher, LanguageModelRegistry, Lexicon,
+                            get_language_identifier, language_model_settings, normalize_language)
+from utils.model_manager import ModelManager, TorchOffloader, get_model_manager
 
 # Download required NLTK data
 try:
@@ -20,30 +30,186 @@ try:
 except LookupError:
     nltk.download('stopwords')
 
+# Precompiled patterns shared by all processors
+NON_WORD_PATTERN = re.compile(r'[^\w\s]')
+# Sentence splitting when the punkt model cannot be loaded
+SENTENCE_PATTERN = re.compile(r'[^.!?\s][^.!?]*(?:[.!?]+|$)')
+
+def normalize_text(text: str) -> str:
+    """Lowercase text, remove special characters and collapse whitespace"""
+    return ' '.join(NON_WORD_PATTERN.sub('', text.lower()).split())
+
+Indicators = Union[List[str], IndicatorMatcher]
+
+def count_indicators(indicators: Indicators, text: str) -> int:
+    """Number of distinct indicator phrases present in text"""
+    if isinstance(indicators, IndicatorMatcher):
+        return indicators.count(text)
+    return sum(1 for indicator in indicators if indicator in text)
+
+def scan_text(text: str, fake_indicators: Indicators, credible_indicators: Indicators) -> Tuple[str, Dict]:
+    """Normalize text and compute its non-model features in a single scan
+
+    Returns the normalized text together with the features. Stylistic
+    features (exclamation marks, capitalization) are measured on the raw
+    text, indicator phrases are matched on the lowercased text before
+    punctuation is stripped (so phrases like "you won't believe" and
+    "peer-reviewed" match), and word statistics use the normalized words.
+    """
+    lowered = text.lower()
+    normalized = ' '.join(NON_WORD_PATTERN.sub('', lowered).split())
+    words = normalized.split()
+    phrase_text = ' '.join(lowered.split())
+    
+    stats = {}
+    stats['length'] = len(text)
+    stats['word_count'] = len(words)
+    stats['avg_word_length'] = sum(map(len, words)) / len(words) if words else 0
+    
+    # Lexical features
+    stats['fake_indicators'] = count_indicators(fake_indicators, phrase_text)
+    stats['credible_indicators'] = count_indicators(credible_indicators, phrase_text)
+    
+    # Stylistic features
+    stats['exclamation_count'] = text.count('!')
+    if not text:
+        stats['caps_ratio'] = 0
+    elif len(lowered) == len(text):
+        # Uppercase characters are exactly those changed by lowercasing
+        original = np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32)
+        lower = np.frombuffer(lowered.encode('utf-32-le'), dtype=np.uint32)
+        stats['caps_ratio'] = int(np.count_nonzero(original != lower)) / len(text)
+    else:
+        # Lowercasing changed the length (e.g. dotted capital I), count per character
+        stats['caps_ratio'] = sum(1 for c in text if c.isupper()) / len(text)
+    
+    return normalized, stats
+
+def rule_based_score(features: Dict) -> float:
+    """Unclipped score of the rule-based tier (positive leans fake)"""
+    score = 0.0
+    
+    if features['fake_indicators'] > 0:
+        score += 0.3 * features['fake_indicators']
+    
+    if features['credible_indicators'] > 0:
+        score -= 0.2 * features['credible_indicators']
+    
+    if features['exclamation_count'] > 2:
+        score += 0.1
+    
+    if features['caps_ratio'] > 0.3:
+        score += 0.1
+    
+    return score
+
+def model_footprint(loaded: Tuple[Any, Any]) -> int:
+    """Bytes held by the parameters and buffers of a (model, tokenizer) pair"""
+    model = loaded[0]
+    return sum(tensor.numel() * tensor.element_size() for tensor in itertools.chain(model.parameters(), model.buffers()))
+
+class TextAnalysisContext:
+    """Per-text cache of intermediate results shared across a single request
+
+    Holds the text's language, the preprocessed text, tokenizer outputs,
+    sentiment and features so that prediction, feature importance and
+    explanation each compute them at most once.
+    """
+
+    def __init__(self, text: str):
+        self.text = text
+        self.language = DEFAULT_LANGUAGE
+        self.language_confidence = 1.0
+        self.processed_text: Optional[str] = None
+        self.statistics: Optional[Dict] = None
+        self.encodings: Dict = {}
+        self.sentiment: Optional[Dict] = None
+        self.features: Optional[Dict] = None
+        self.chunk_result: Optional[Dict] = None
+
 class TextProcessor:
-    def __init__(self):
-        """Initialize the text processor with NLP models"""
+    def __init__(self, max_length: int = 512, chunk_stride: int = 128, max_chunks: int = 8,
+                 prefilter_fake_threshold: float = 0.9, prefilter_real_threshold: float = -0.4,
+                 load_models: bool = True, sentence_cache_size: int = 20000, sentence_batch_size: int = 64,
+                 language_models: Optional[LanguageModelRegistry] = None, min_language_confidence: float = 0.8,
+                 models: Optional[ModelManager] = None):
+        """Initialize the text processor with NLP models
+
+        Long documents are split into overlapping windows of ``max_length``
+        tokens (overlapping by ``chunk_stride`` tokens). At most ``max_chunks``
+        windows are scored per text to bound latency.
+
+        When prediction runs with the pre-filter enabled, texts whose
+        rule-based score is at least ``prefilter_fake_threshold`` or at most
+        ``prefilter_real_threshold`` are decided without the transformers.
+
+        The transformers are held by ``models`` (by default the process-wide
+        model manager), which may evict them when memory runs short; they
+        are loaded now and leased while in use. With ``load_models``
+        disabled they are not registered and every prediction uses the
+        rule-based fallback.
+
+        Sentence-level prediction keeps the scores of the last
+        ``sentence_cache_size`` distinct sentences and scores new sentences
+        ``sentence_batch_size`` at a time.
+
+        Texts in other languages are matched against that language's
+        indicator lexicon and scored by its model from ``language_models``
+        (by default configured from ``LANGUAGE_MODELS`` and loaded on first
+        use); without one they get the rule-based score. With ``language``
+        set to ``auto``, the language is identified from the text and
+        English is assumed below ``min_language_confidence``.
+        """
         self.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
         
-        # Initialize BERT model for fake news detection
-        try:
-            self.tokenizer = AutoTokenizer.from_pretrained('bert-base-uncased')
-            self.model = AutoModelForSequenceClassification.from_pretrained('bert-base-uncased', num_labels=2)
-            self.model.to(self.device)
-        except:
-            # Fallback to a simpler model if BERT is not available
-            self.model = None
-            self.tokenizer = None
-        
-        # Initialize sentiment analysis pipeline
-        try:
-            self.sentiment_analyzer = pipeline("sentiment-analysis", model="cardiffnlp/twitter-roberta-base-sentiment-latest")
-        except:
-            self.sentiment_analyzer = None
+        # Models this processor registered with the manager; anything else is unavailable
+        self.models = models or get_model_manager()
+        self.managed = set()
+        
+        if load_models:
+            # BERT for fake news detection and the sentiment pipeline, offloaded as torch state when evicted
+            self._register('bert', lambda: self._load_language_model('bert-base-uncased'), model_footprint,
+                           TorchOffloader(lambda loaded: loaded[0]))
+            self._register('sentiment', self._load_sentiment_analyzer,
+                           lambda analyzer: model_footprint((analyzer.model, None)),
+                           TorchOffloader(lambda analyzer: analyzer.model))
+            for name in ('bert', 'sentiment'):
+                self.models.get(name)
+        
+        # Other languages: lexicons are compiled and models loaded on first use
+        self.language_identifier = get_language_identifier()
+        self.min_language_confidence = min_language_confidence
+        self._lexicons: Dict[str, Lexicon] = {}
+        if language_models is None and load_models:
+            language_models = LanguageModelRegistry(language_model_settings(), self._load_language_model, self.models,
+                                                    model_footprint, TorchOffloader(lambda loaded: loaded[0]))
+        self.language_models = language_models
+        
+        # Token-based truncation and sliding-window settings
+        self.max_length = max_length
+        self.chunk_stride = chunk_stride
+        self.max_chunks = max(1, max_chunks)
+        
+        # Rule-based pre-filter thresholds
+        self.prefilter_fake_threshold = prefilter_fake_threshold
+        self.prefilter_real_threshold = prefilter_real_threshold
         
         # Load stopwords
         self.stop_words = set(stopwords.words('english'))
         
+        # Punkt sentence tokenizer (downloaded above), loaded once per processor
+        try:
+            self.sentence_tokenizer = nltk.data.load('tokenizers/punkt/english.pickle')
+        except Exception as e:
+            print(f"Punkt sentence tokenizer unavailable, splitting on punctuation: {e}")
+            self.sentence_tokenizer = None
+        
+        # Sentence scores by content hash, shared by all requests (boilerplate recurs across articles)
+        self.sentence_cache_size = sentence_cache_size
+        self.sentence_batch_size = max(1, sentence_batch_size)
+        self._sentence_cache: "OrderedDict[str, float]" = OrderedDict()
+        self._sentence_cache_lock = threading.Lock()
+        
         # Fake news indicators
         self.fake_indicators = [
             'fake', 'hoax', 'conspiracy', 'unverified', 'rumor', 'allegedly',
@@ -61,109 +227,390 @@ class TextProcessor:
 
     def preprocess_text(self, text: str) -> str:
         """Preprocess text for analysis"""
-        # Convert to lowercase
-        text = text.lower()
+        return normalize_text(text)
+
+    def lexicon(self, language: str) -> Lexicon:
+        """Compiled indicator matchers for a language (empty for languages without a lexicon)"""
+        lexicon = self._lexicons.get(language)
+        if lexicon is None:
+            if language == DEFAULT_LANGUAGE:
+                phrases = {"fake": self.fake_indicators, "credible": self.credible_indicators}
+            else:
+                phrases = LEXICONS.get(language, {"fake": [], "credible": []})
+            lexicon = self._lexicons[language] = Lexicon(language, phrases["fake"], phrases["credible"])
+        return lexicon
+
+    def detect_language(self, text: str, language: Optional[str] = None) -> Tuple[str, float]:
+        """Use the requested language, or identify it when it is ``auto`` or missing"""
+        requested = normalize_language(language)
+        if requested:
+            return requested, 1.0
+        with stage_timer('language_id'):
+            detected, confidence = self.language_identifier.identify(text)
+        if detected is None or confidence < self.min_language_confidence:
+            return DEFAULT_LANGUAGE, confidence
+        return detected, confidence
+
+    def _register(self, name: str, loader, footprint, offloader):
+        self.models.register(name, loader, footprint, offloader)
+        self.managed.add(name)
+
+    def _use(self, name: Optional[str]):
+        """Lease a managed model for a block; yields None if this processor has no such model or it failed"""
+        if name is None or name not in self.managed:
+            return nullcontext()
+        return self.models.use(name)
+
+    def model_available(self, language: str = DEFAULT_LANGUAGE) -> bool:
+        """Whether a model is configured for the language and has not failed to load"""
+        name = self._language_model_name(language)
+        return name is not None and name in self.managed and self.models.available(name)
+
+    def _language_model_name(self, language: str) -> Optional[str]:
+        """Manager key of the (model, tokenizer) pair for a language; None if there is none"""
+        if language == DEFAULT_LANGUAGE:
+            return 'bert'
+        if self.language_models is None:
+            return None
+        name = self.language_models.key(language)
+        if name is not None:
+            self.managed.add(name)
+        return name
+
+    def _load_language_model(self, name: str) -> Tuple[Any, Any]:
+        # Explicitly request the Rust-backed fast tokenizer (needed for sliding windows)
+        tokenizer = AutoTokenizer.from_pretrained(name, use_fast=True)
+        if not tokenizer.is_fast:
+            print("Fast tokenizer unavailable, falling back to the Python tokenizer")
+        model = AutoModelForSequenceClassification.from_pretrained(name, num_labels=2)
+        model.to(self.device)
+        return model, tokenizer
+
+    def _load_sentiment_analyzer(self):
+        return pipeline("sentiment-analysis", model="cardiffnlp/twitter-roberta-base-sentiment-latest", use_fast=True)
+
+    def create_context(self, text: str, language: Optional[str] = DEFAULT_LANGUAGE) -> TextAnalysisContext:
+        """Create an analysis context for text, resolving its language and scanning it once"""
+        context = TextAnalysisContext(text)
+        context.language, context.language_confidence = self.detect_language(text, language)
+        lexicon = self.lexicon(context.language)
+        with stage_timer('text_scan'):
+            context.processed_text, context.statistics = scan_text(text, lexicon.fake, lexicon.credible)
+        return context
+
+    def analyze_sentiment(self, text: str, context: Optional[TextAnalysisContext] = None) -> Dict:
+        """Run sentiment analysis, reusing the context result if available"""
+        if context is not None and context.sentiment is not None:
+            record_cache('text_context', True)
+            return context.sentiment
+        if context is not None:
+            record_cache('text_context', False)
         
-        # Remove special characters and extra whitespace
-        text = re.sub(r'[^\w\s]', '', text)
-        text = re.sub(r'\s+', ' ', text).strip()
+        with self._use('sentiment') as sentiment_analyzer:
+            if sentiment_analyzer:
+                try:
+                    with stage_timer('sentiment'):
+                        sentiment = sentiment_analyzer(text, truncation=True, max_length=self.max_length)[0]
+                    result = {'sentiment': sentiment['label'], 'sentiment_score': sentiment['score']}
+                except:
+                    result = {'sentiment': 'neutral', 'sentiment_score': 0.5}
+            else:
+                # Fallback sentiment analysis
+                blob = TextBlob(text)
+                result = {
+                    'sentiment': 'positive' if blob.sentiment.polarity > 0 else 'negative' if blob.sentiment.polarity < 0 else 'neutral',
+                    'sentiment_score': abs(blob.sentiment.polarity)
+                }
         
-        return text
+        if context is not None:
+            context.sentiment = result
+        return result
 
-    def extract_features(self, text: str) -> Dict:
-        """Extract linguistic and semantic features from text"""
-        features = {}
-        
-        # Basic text statistics
-        features['length'] = len(text)
-        features['word_count'] = len(text.split())
-        features['avg_word_length'] = np.mean([len(word) for word in text.split()]) if text.split() else 0
+    def extract_features(self, text: str, context: Optional[TextAnalysisContext] = None) -> Dict:
+        """Extract linguistic and semantic features from raw (unprocessed) text"""
+        if context is not None and context.features is not None:
+            return context.features
         
-        # Sentiment analysis
-        if self.sentiment_analyzer:
-            try:
-                sentiment = self.sentiment_analyzer(text[:512])[0]
-                features['sentiment'] = sentiment['label']
-                features['sentiment_score'] = sentiment['score']
-            except:
-                features['sentiment'] = 'neutral'
-                features['sentiment_score'] = 0.5
+        # Text statistics, indicators, exclamation marks and caps in one scan
+        if context is not None and context.statistics is not None:
+            stats = context.statistics
         else:
-            # Fallback sentiment analysis
-            blob = TextBlob(text)
-            features['sentiment'] = 'positive' if blob.sentiment.polarity > 0 else 'negative' if blob.sentiment.polarity < 0 else 'neutral'
-            features['sentiment_score'] = abs(blob.sentiment.polarity)
+            _, stats = scan_text(text, self.fake_indicators, self.credible_indicators)
         
-        # Fake news indicators
-        fake_count = sum(1 for indicator in self.fake_indicators if indicator in text.lower())
-        features['fake_indicators'] = fake_count
+        features = {
+            'length': stats['length'],
+            'word_count': stats['word_count'],
+            'avg_word_length': stats['avg_word_length']
+        }
         
-        # Credible source indicators
-        credible_count = sum(1 for indicator in self.credible_indicators if indicator in text.lower())
-        features['credible_indicators'] = credible_count
+        # Sentiment analysis
+        features.update(self.analyze_sentiment(text, context))
         
-        # Exclamation marks and caps
-        features['exclamation_count'] = text.count('!')
-        features['caps_ratio'] = sum(1 for c in text if c.isupper()) / len(text) if text else 0
+        for key in ('fake_indicators', 'credible_indicators', 'exclamation_count', 'caps_ratio'):
+            features[key] = stats[key]
         
+        if context is not None:
+            context.features = features
         return features
 
-    def predict(self, text: str, language: str = "en") -> Dict:
-        """Predict whether text is fake news"""
-        start_time = time.time()
+    def _encode_chunks(self, text: str, tokenizer: Any, sliding_window: bool = True,
+                       context: Optional[TextAnalysisContext] = None):
+        """Tokenize text into at most ``max_chunks`` windows of ``max_length`` tokens"""
+        if context is not None and sliding_window in context.encodings:
+            record_cache('text_context', True)
+            return context.encodings[sliding_window]
+        if context is not None:
+            record_cache('text_context', False)
+        
+        with stage_timer('tokenization'):
+            encoding = self._tokenize_chunks(text, tokenizer, sliding_window)
+        if context is not None:
+            context.encodings[sliding_window] = encoding
+        return encoding
+
+    def _tokenize_chunks(self, text: str, tokenizer: Any, sliding_window: bool = True):
+        """Tokenize text, splitting it into overlapping windows when requested"""
+        if not sliding_window:
+            return tokenizer(text, return_tensors="pt", truncation=True, max_length=self.max_length)
+        
+        encoding = tokenizer(
+            text,
+            return_tensors="pt",
+            truncation=True,
+            max_length=self.max_length,
+            stride=self.chunk_stride,
+            return_overflowing_tokens=True,
+            padding=True
+        )
+        encoding.pop('overflow_to_sample_mapping', None)
+        
+        # Keep evenly spaced windows so the budget still covers the whole document
+        n_chunks = encoding['input_ids'].shape[0]
+        if n_chunks > self.max_chunks:
+            keep = torch.from_numpy(np.linspace(0, n_chunks - 1, self.max_chunks).round().astype(np.int64))
+            encoding = {k: v[keep] for k, v in encoding.items()}
+        
+        return encoding
+
+    def _score_chunks(self, text: str, model: Any, tokenizer: Any, sliding_window: bool = True,
+                      context: Optional[TextAnalysisContext] = None) -> Dict:
+        """Score all windows of a text with a (model, tokenizer) pair in a single batched forward pass"""
+        inputs = self._encode_chunks(text, tokenizer, sliding_window, context)
+        inputs = {k: v.to(self.device) for k, v in inputs.items()}
+        
+        with stage_timer('bert_forward'), torch.no_grad():
+            outputs = model(**inputs)
+            probabilities = torch.softmax(outputs.logits, dim=1)[:, 1]
+        
+        # Weight each window by its number of real (non-padding) tokens
+        weights = inputs['attention_mask'].sum(dim=1).float()
+        fake_score = (probabilities * weights).sum() / weights.sum()
+        
+        return {
+            "fake_score": fake_score.item(),
+            "chunk_scores": probabilities.tolist(),
+            "chunk_count": int(probabilities.shape[0])
+        }
+
+    @traced("text_processor.score_texts")
+    def score_texts(self, texts: List[str], language: str = DEFAULT_LANGUAGE) -> Dict:
+        """Score many texts in a single batched forward pass
+
+        Each text is truncated to ``max_length`` tokens and scored by the
+        model for ``language``. Falls back to the rule-based score with that
+        language's lexicon when the model is unavailable. Returns the fake
+        probabilities, the number of tokens processed and whether the
+        scores came from the model.
+        """
+        with self._use(self._language_model_name(language)) as loaded:
+            if loaded is None:
+                lexicon = self.lexicon(language)
+                scores = [max(0.0, min(1.0, rule_based_score(scan_text(t, lexicon.fake, lexicon.credible)[1])))
+                          for t in texts]
+                return {"scores": np.array(scores, dtype=np.float32), "token_count": sum(len(t.split()) for t in texts),
+                        "model": False}
+            model, tokenizer = loaded
+            
+            with stage_timer('tokenization'):
+                inputs = tokenizer(texts, return_tensors="pt", truncation=True, max_length=self.max_length, padding=True)
+            inputs = {k: v.to(self.device) for k, v in inputs.items()}
+            
+            with stage_timer('bert_forward'), torch.no_grad():
+                outputs = model(**inputs)
+                probabilities = torch.softmax(outputs.logits, dim=1)[:, 1]
+        
+        return {
+            "scores": probabilities.cpu().numpy(),
+            "token_count": int(inputs['attention_mask'].sum().item()),
+            "model": True
+        }
+
+    @traced("text_processor.predict")
+    def predict(self, text: str, language: str = "en", sliding_window: bool = True,
+                context: Optional[TextAnalysisContext] = None, prefilter: bool = False) -> Dict:
+        """Predict whether text is fake news
+
+        With ``sliding_window`` enabled, texts longer than ``max_length`` tokens
+        are scored over overlapping windows that are aggregated into one score;
+        otherwise the text is truncated to its first ``max_length`` tokens.
+        Pass a context from ``create_context`` to share intermediate results
+        with ``get_feature_importance`` and the explainer. With ``prefilter``
+        enabled, texts the rule-based tier already decides skip the
+        sentiment and BERT models. ``language`` is an ISO 639-1 code or
+        ``auto``; a given context already carries the resolved language.
+        """
+        start_time = time.perf_counter()
         
         # Preprocess text
-        processed_text = self.preprocess_text(text)
+        if context is None:
+            context = self.create_context(text, language)
+        processed_text = context.processed_text
+        
+        # Simple rule-based prediction (fallback)
+        rule_score = rule_based_score(context.statistics)
+        fake_score = max(0.0, min(1.0, rule_score))
+        
+        prefiltered = prefilter and (
+            rule_score >= self.prefilter_fake_threshold or rule_score <= self.prefilter_real_threshold
+        )
         
         # Extract features
-        features = self.extract_features(processed_text)
+        if prefiltered:
+            features = dict(context.statistics)
+        else:
+            features = self.extract_features(text, context)
         
-        # Simple rule-based prediction (fallback)
-        fake_score = 0.0
+        # Use the BERT model for the text's language if available
+        chunk_count = 0
+        with self._use(None if prefiltered else self._language_model_name(context.language)) as loaded:
+            if loaded is not None:
+                try:
+                    chunk_result = self._score_chunks(processed_text, *loaded, sliding_window, context)
+                    context.chunk_result = chunk_result
+                    fake_score = chunk_result["fake_score"]
+                    chunk_count = chunk_result["chunk_count"]
+                except Exception as e:
+                    print(f"BERT prediction failed: {e}")
         
-        # Adjust score based on features
-        if features['fake_indicators'] > 0:
-            fake_score += 0.3 * features['fake_indicators']
+        processing_time = time.perf_counter() - start_time
+        
+        return {
+            "is_fake": fake_score > 0.5,
+            "confidence": fake_score if fake_score > 0.5 else 1 - fake_score,
+            "fake_score": fake_score,
+            "features": list(features.keys()),
+            "processing_time": processing_time,
+            "text_length": len(text),
+            "chunk_count": chunk_count,
+            "prefiltered": prefiltered,
+            "language": context.language,
+            "language_confidence": context.language_confidence
+        }
+
+    def split_sentences(self, text: str) -> List[Tuple[int, int]]:
+        """Character spans of the sentences in text"""
+        with stage_timer('sentence_split'):
+            if self.sentence_tokenizer is not None:
+                return list(self.sentence_tokenizer.span_tokenize(text))
+            return [match.span() for match in SENTENCE_PATTERN.finditer(text)]
+
+    def score_sentences(self, sentences: List[str], language: str = DEFAULT_LANGUAGE) -> List[Tuple[float, bool]]:
+        """Fake probability of each sentence and whether it came from the cache
+
+        Sentences are scored by the model for ``language`` and cached by that
+        model's key and a hash of their whitespace-normalized text, so the
+        same sentence scored by another language's model is not reused.
+        Sentences not in the cache are deduplicated and scored together in
+        batched forward passes of ``sentence_batch_size``. Rule-based
+        fallback scores (no model, or it failed to load) are not cached, so
+        they are replaced by model scores once the model is back.
+        """
+        prefix = self._language_model_name(language) or f"rules:{language}"
+        keys = [f"{prefix}:" + hashlib.sha1(' '.join(sentence.split()).encode('utf-8')).hexdigest()
+                for sentence in sentences]
+        scores: Dict[str, float] = {}
+        with self._sentence_cache_lock:
+            for key in keys:
+                if key in self._sentence_cache:
+                    self._sentence_cache.move_to_end(key)
+                    scores[key] = self._sentence_cache[key]
+        cached = set(scores)
         
-        if features['credible_indicators'] > 0:
-            fake_score -= 0.2 * features['credible_indicators']
+        missing = {key: sentence for key, sentence in zip(keys, sentences) if key not in scores}
+        missing_keys = list(missing)
+        modeled = []
+        for offset in range(0, len(missing_keys), self.sentence_batch_size):
+            batch = missing_keys[offset:offset + self.sentence_batch_size]
+            scored = self.score_texts([missing[key] for key in batch], language)
+            scores.update((key, float(score)) for key, score in zip(batch, scored["scores"]))
+            if scored["model"]:
+                modeled.extend(batch)
         
-        if features['exclamation_count'] > 2:
-            fake_score += 0.1
+        if modeled:
+            with self._sentence_cache_lock:
+                for key in modeled:
+                    self._sentence_cache[key] = scores[key]
+                while len(self._sentence_cache) > self.sentence_cache_size:
+                    self._sentence_cache.popitem(last=False)
         
-        if features['caps_ratio'] > 0.3:
-            fake_score += 0.1
+        for key in keys:
+            record_cache('sentence_scores', key in cached)
+        return [(scores[key], key in cached) for key in keys]
+
+    @traced("text_processor.predict_sentences")
+    def predict_sentences(self, text: str, context: Optional[TextAnalysisContext] = None,
+                          suspicious_threshold: float = 0.5) -> Dict:
+        """Score every sentence and aggregate them into a document verdict
+
+        The text is split once with the punkt tokenizer and all uncached
+        sentences are scored in batched forward passes, so highlighting
+        costs about one prediction rather than one per sentence. The
+        document score is the mean of the sentence scores weighted by
+        their word counts; ``sentences`` holds each sentence's character
+        span and score, in order.
+        """
+        start_time = time.perf_counter()
+        if context is None:
+            context = self.create_context(text)
+        features = self.extract_features(text, context)
         
-        # Normalize score
-        fake_score = max(0.0, min(1.0, fake_score))
+        spans = self.split_sentences(text)
+        scored = self.score_sentences([text[start:end] for start, end in spans], context.language)
         
-        # Use BERT model if available
-        if self.model and self.tokenizer:
-            try:
-                inputs = self.tokenizer(processed_text[:512], return_tensors="pt", truncation=True, padding=True)
-                inputs = {k: v.to(self.device) for k, v in inputs.items()}
-                
-                with torch.no_grad():
-                    outputs = self.model(**inputs)
-                    probabilities = torch.softmax(outputs.logits, dim=1)
-                    fake_score = probabilities[0][1].item()
-            except Exception as e:
-                print(f"BERT prediction failed: {e}")
+        sentences = []
+        total = weight_sum = 0.0
+        for (start, end), (score, cached) in zip(spans, scored):
+            weight = max(1, len(text[start:end].split()))
+            total += score * weight
+            weight_sum += weight
+            sentences.append({"start": start, "end": end, "fake_score": score, "cached": cached})
         
-        processing_time = time.time() - start_time
+        if sentences:
+            fake_score = total / weight_sum
+        else:
+            fake_score = max(0.0, min(1.0, rule_based_score(context.statistics)))
         
         return {
             "is_fake": fake_score > 0.5,
             "confidence": fake_score if fake_score > 0.5 else 1 - fake_score,
             "fake_score": fake_score,
             "features": list(features.keys()),
-            "processing_time": processing_time,
-            "text_length": len(text)
+            "processing_time": time.perf_counter() - start_time,
+            "text_length": len(text),
+            "chunk_count": 0,
+            "prefiltered": False,
+            "language": context.language,
+            "language_confidence": context.language_confidence,
+            "sentences": sentences,
+            "sentence_count": len(sentences),
+            "cached_sentences": sum(1 for sentence in sentences if sentence["cached"]),
+            "suspicious_sentences": [i for i, sentence in enumerate(sentences) if sentence["fake_score"] > suspicious_threshold]
         }
 
-    def get_feature_importance(self, text: str) -> Dict:
+    @traced("text_processor.get_feature_importance")
+    def get_feature_importance(self, text: str, context: Optional[TextAnalysisContext] = None) -> Dict:
         """Get importance of different features in the prediction"""
-        features = self.extract_features(text)
+        features = self.extract_features(text, context)
         
         importance = {}
         for feature, value in features.items():
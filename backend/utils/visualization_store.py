@@ -0,0 +1,313 @@
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Optional, Tuple
+import cv2
+import numpy as np
+from utils.metrics import stage_timer, record_cache, track_queue_depth
+
+# OpenCV encoder extension and quality flag for each supported output format
+IMAGE_FORMATS = {
+    "png": (".png", None, "image/png"),
+    "jpeg": (".jpg", cv2.IMWRITE_JPEG_QUALITY, "image/jpeg"),
+    "webp": (".webp", cv2.IMWRITE_WEBP_QUALITY, "image/webp"),
+}
+
+# Ids that may name files in the shared directory (content ids are "<kind>-<hex>")
+SHARED_ID_PATTERN = re.compile(r"[A-Za-z0-9_-]{1,128}")
+# A pending marker older than this was left by a worker that died mid-render
+STALE_PENDING_SECONDS = 60.0
+# Failure reason recorded for renders shed because the queue was full
+SKIPPED_REASON = "render queue full"
+
+class VisualizationStore:
+    def __init__(self, max_workers: int = 2, max_entries: int = 256, max_queued: int = 32,
+                 default_format: str = "png", default_max_size: Optional[int] = None, default_quality: int = 80,
+                 shared_dir: Optional[str] = None):
+        """Render explanation visualizations in background workers and cache them
+
+        Visualizations are keyed by a hash of the content they depict, so
+        identical inputs are rendered once and the same id is returned for
+        every request that asks for them. At most ``max_entries`` rendered
+        images (and as many render failures) are kept, evicting the least
+        recently used. Renders are kept as PNG and re-encoded on request
+        (JPEG/WebP, downscaled to ``max_size`` pixels on the longest side),
+        with encodings cached too.
+        
+        At most ``max_queued`` renders are queued or running; further ones
+        are skipped rather than holding their text or image bytes in an
+        unbounded queue, and are retried the next time they are submitted.
+        
+        With ``shared_dir`` set, renders, failures and in-progress markers
+        are also written there, so any worker process serving the app can
+        return a visualization another one rendered. The directory keeps
+        the ``max_entries`` most recent renders.
+        """
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="visualization")
+        self.max_entries = max_entries
+        self.max_queued = max_queued
+        self.default_format = default_format
+        self.default_max_size = default_max_size
+        self.default_quality = default_quality
+        self._encoded: "OrderedDict[Tuple, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._rendered: "OrderedDict[str, bytes]" = OrderedDict()
+        self._pending: Dict[str, Future] = {}
+        self._failed: "OrderedDict[str, str]" = OrderedDict()
+        self.shared_dir = shared_dir
+        if shared_dir:
+            os.makedirs(shared_dir, exist_ok=True)
+        track_queue_depth("visualization_renders", lambda: len(self._pending))
+
+    @staticmethod
+    def content_id(kind: str, *parts: bytes) -> str:
+        """Build a visualization id from the hash of its source content"""
+        digest = hashlib.sha256(kind.encode())
+        for part in parts:
+            digest.update(b"\0")
+            digest.update(part)
+        return f"{kind}-{digest.hexdigest()[:32]}"
+
+    def submit(self, visualization_id: str, render: Callable[..., bytes], *args) -> str:
+        """Schedule ``render(*args)`` unless the visualization is cached or in progress
+        
+        When ``max_queued`` renders are already pending the render is
+        skipped: its status becomes 'skipped' until it is submitted again.
+        """
+        with self._lock:
+            if visualization_id in self._rendered:
+                self._rendered.move_to_end(visualization_id)
+                record_cache("visualizations", True)
+                return visualization_id
+            if visualization_id in self._pending:
+                record_cache("visualizations", True)
+                return visualization_id
+        
+        # Rendered, or being rendered, by another worker
+        if self._shared_status(visualization_id) in ("ready", "pending"):
+            record_cache("visualizations", True)
+            return visualization_id
+        
+        self._write_shared(visualization_id, ".pending", b"")
+        with self._lock:
+            if visualization_id in self._pending or visualization_id in self._rendered:
+                return visualization_id
+            skipped = len(self._pending) >= self.max_queued
+            if skipped:
+                self._record_failure(visualization_id, SKIPPED_REASON)
+            else:
+                record_cache("visualizations", False)
+                self._failed.pop(visualization_id, None)
+                future = self.executor.submit(self._render, render, *args)
+                self._pending[visualization_id] = future
+        if skipped:
+            self._remove_shared(visualization_id, ".pending")
+            return visualization_id
+
+        future.add_done_callback(lambda f: self._on_done(visualization_id, f))
+        return visualization_id
+
+    def _record_failure(self, visualization_id: str, reason: str):
+        """Remember why a render failed (called with the lock held)"""
+        self._failed[visualization_id] = reason
+        self._failed.move_to_end(visualization_id)
+        while len(self._failed) > self.max_entries:
+            self._failed.popitem(last=False)
+
+    @staticmethod
+    def _render(render: Callable[..., bytes], *args) -> bytes:
+        with stage_timer("explanation_rendering"):
+            return render(*args)
+
+    def _on_done(self, visualization_id: str, future: Future):
+        """Move a finished render from pending to the cache"""
+        error = future.exception()
+        if error is not None:
+            print(f"Visualization rendering failed: {error}")
+            self._write_shared(visualization_id, ".failed", str(error).encode())
+        else:
+            self._write_shared(visualization_id, ".png", future.result())
+        self._remove_shared(visualization_id, ".pending")
+        
+        with self._lock:
+            self._pending.pop(visualization_id, None)
+            if error is not None:
+                self._record_failure(visualization_id, str(error))
+                return
+            self._cache_rendered(visualization_id, future.result())
+        if self.shared_dir:
+            self._prune_shared()
+
+    def _cache_rendered(self, visualization_id: str, content: bytes):
+        self._rendered[visualization_id] = content
+        self._rendered.move_to_end(visualization_id)
+        while len(self._rendered) > self.max_entries:
+            self._rendered.popitem(last=False)
+
+    def _shared_path(self, visualization_id: str, suffix: str) -> Optional[str]:
+        if not self.shared_dir or not SHARED_ID_PATTERN.fullmatch(visualization_id):
+            return None
+        return os.path.join(self.shared_dir, visualization_id + suffix)
+
+    def _write_shared(self, visualization_id: str, suffix: str, content: bytes):
+        """Write a file atomically, so other workers never read a partial render"""
+        path = self._shared_path(visualization_id, suffix)
+        if path is None:
+            return
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Visualization sharing failed: {e}")
+
+    def _remove_shared(self, visualization_id: str, suffix: str):
+        path = self._shared_path(visualization_id, suffix)
+        if path is not None:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _read_shared(self, visualization_id: str) -> Optional[bytes]:
+        path = self._shared_path(visualization_id, ".png")
+        if path is None:
+            return None
+        try:
+            with open(path, "rb") as f:
+                content = f.read()
+        except OSError:
+            return None
+        with self._lock:
+            self._cache_rendered(visualization_id, content)
+        return content
+
+    def _shared_status(self, visualization_id: str) -> str:
+        """Status of a visualization in the shared directory: 'ready', 'pending', 'failed' or 'unknown'"""
+        path = self._shared_path(visualization_id, "")
+        if path is None:
+            return "unknown"
+        if os.path.exists(path + ".png"):
+            return "ready"
+        try:
+            if time.time() - os.stat(path + ".pending").st_mtime < STALE_PENDING_SECONDS:
+                return "pending"
+        except OSError:
+            pass
+        if os.path.exists(path + ".failed"):
+            return "failed"
+        return "unknown"
+
+    def _prune_shared(self):
+        """Remove the oldest renders and failures beyond ``max_entries`` from the shared directory"""
+        entries = []
+        for name in os.listdir(self.shared_dir):
+            if name.endswith((".png", ".failed")):
+                try:
+                    entries.append((os.stat(os.path.join(self.shared_dir, name)).st_mtime, name))
+                except OSError:
+                    pass
+        entries.sort()
+        for _, name in entries[:max(0, len(entries) - self.max_entries)]:
+            try:
+                os.remove(os.path.join(self.shared_dir, name))
+            except OSError:
+                pass
+
+    def status(self, visualization_id: str) -> str:
+        """Return 'ready', 'pending', 'failed', 'skipped' or 'unknown'"""
+        with self._lock:
+            if visualization_id in self._rendered:
+                return "ready"
+            if visualization_id in self._pending:
+                return "pending"
+            if visualization_id in self._failed:
+                return "skipped" if self._failed[visualization_id] == SKIPPED_REASON else "failed"
+        return self._shared_status(visualization_id)
+
+    def get(self, visualization_id: str, timeout: float = 0.0) -> Optional[bytes]:
+        """Return the rendered image, waiting up to ``timeout`` seconds if pending"""
+        with self._lock:
+            if visualization_id in self._rendered:
+                self._rendered.move_to_end(visualization_id)
+                return self._rendered[visualization_id]
+            future = self._pending.get(visualization_id)
+
+        if future is None:
+            content = self._read_shared(visualization_id)
+            if content is not None or timeout <= 0:
+                return content
+            # Poll while another worker renders it
+            deadline = time.monotonic() + timeout
+            while self._shared_status(visualization_id) == "pending" and time.monotonic() < deadline:
+                time.sleep(0.05)
+            return self._read_shared(visualization_id)
+        if timeout <= 0:
+            return None
+
+        try:
+            return future.result(timeout=timeout)
+        except Exception:
+            return None
+
+    def get_encoded(self, visualization_id: str, image_format: str, max_size: Optional[int] = None,
+                    quality: Optional[int] = None, timeout: float = 0.0) -> Optional[bytes]:
+        """Return the visualization encoded as ``image_format`` and limited to ``max_size``"""
+        quality = self.default_quality if quality is None else quality
+        if image_format == "png":
+            quality = None
+        key = (visualization_id, image_format, max_size, quality)
+        with self._lock:
+            if key in self._encoded:
+                self._encoded.move_to_end(key)
+                record_cache("visualization_encodings", True)
+                return self._encoded[key]
+
+        content = self.get(visualization_id, timeout)
+        if content is None:
+            return None
+        if image_format == "png" and max_size is None:
+            return content
+
+        record_cache("visualization_encodings", False)
+        extension, quality_flag, _ = IMAGE_FORMATS[image_format]
+        img = cv2.imdecode(np.frombuffer(content, np.uint8), cv2.IMREAD_COLOR)
+        if max_size is not None and max(img.shape[:2]) > max_size:
+            scale = max_size / max(img.shape[:2])
+            size = (max(1, round(img.shape[1] * scale)), max(1, round(img.shape[0] * scale)))
+            img = cv2.resize(img, size, interpolation=cv2.INTER_AREA)
+        params = [quality_flag, int(quality)] if quality_flag is not None else []
+        ok, buffer = cv2.imencode(extension, img, params)
+        if not ok:
+            raise ValueError(f"Could not encode visualization as {image_format}")
+        encoded = buffer.tobytes()
+
+        with self._lock:
+            self._encoded[key] = encoded
+            while len(self._encoded) > self.max_entries:
+                self._encoded.popitem(last=False)
+        return encoded
+
+_store: Optional[VisualizationStore] = None
+_store_lock = threading.Lock()
+
+def get_visualization_store() -> VisualizationStore:
+    """Return the process-wide visualization store"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                max_size = os.getenv("VISUALIZATION_MAX_SIZE")
+                _store = VisualizationStore(
+                    default_format=os.getenv("VISUALIZATION_FORMAT", "png"),
+                    default_max_size=int(max_size) if max_size else None,
+                    default_quality=int(os.getenv("VISUALIZATION_QUALITY", "80")),
+                    max_queued=int(os.getenv("VISUALIZATION_MAX_QUEUED", "32")),
+                    shared_dir=os.getenv("VISUALIZATION_DIR") or None
+                )
+    return _store